@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of ``musicDL`` replaying a cassette.
+
+``synth`` builds a cassette from a fixture page in ``tests/test-pages``:
+the Saavn page, its ``api.php`` response and a media file per song, served
+with the given latency and bandwidth, optionally with an mp3 copy of each. ``run`` downloads the album or
+playlist from a cassette (synthetic, or recorded with ``--cassette-mode
+record``) and reports the wall time of each run.
+
+Usage::
+
+    $ python -m benchmarks.bench_cassette synth album.html album.cassette
+    $ python -m benchmarks.bench_cassette run album.cassette \\
+        https://www.jiosaavn.com/album/fixture/10496527 --no-lyrics --no-tags
+"""
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from urllib3 import HTTPResponse
+
+from musicDL.cassette import Cassette
+from musicDL.handle_requests import _extract_initial_data_with_soup
+from musicDL.utils import get_decrypted_url, get_media_url_variants, parse_size
+from musicDL.vendor.pyDes import ECB, PAD_PKCS5, des
+
+PAGES_DIR = Path(__file__).resolve().parent.parent.joinpath("tests", "test-pages")
+
+AUDIO = (".m4a", ".mp3")
+
+_CIPHER = des(b"38346591", ECB, b"\0\0\0\0\0\0\0\0", pad=None, padmode=PAD_PKCS5)
+
+
+def _record(  # type: ignore
+    cassette, url, body, content_type, latency, bandwidth, method="GET"
+):
+    response = HTTPResponse(
+        body=b"",
+        headers={
+            "Content-Type": content_type,
+            "Content-Length": str(len(body)),
+            "ETag": f'"{hashlib.sha256(url.encode()).hexdigest()[:16]}"',
+        },
+        status=200,
+        reason="OK",
+        preload_content=False,
+    )
+    duration = len(body) / bandwidth if bandwidth else 0.0
+    request = requests.Request(method, url).prepare()
+    if method == "HEAD":
+        body, duration = b"", 0.0
+    cassette.record(request, response, body, latency, duration)
+
+
+def synth(args: argparse.Namespace) -> None:
+    html_content = PAGES_DIR.joinpath(args.page).read_bytes()
+    data = _extract_initial_data_with_soup(html_content)
+    latency = args.latency_ms / 1000
+    bandwidth = parse_size(args.bandwidth)
+
+    if "albumView" in data:
+        entity = data["albumView"]["album"]
+        page_url = f"https://www.jiosaavn.com/album/fixture/{entity['id']}"
+        api_url = (
+            "https://www.jiosaavn.com/api.php?_format=json"
+            f"&__call=content.getAlbumDetails&albumid={entity['id']}"
+        )
+        api_data = {"title": entity["title"], "albumid": entity["id"], "songs": []}
+    else:
+        entity = data["playlist"]["playlist"]
+        page_url = f"https://www.jiosaavn.com/featured/fixture/{entity['id']}"
+        api_url = (
+            f"https://www.jiosaavn.com/api.php?listid={entity['id']}"
+            "&_format=json&__call=playlist.getDetails"
+        )
+        api_data = {
+            "listid": entity["id"],
+            "list_count": str(len(entity["songs"])),
+            "songs": [],
+        }
+
+    cassette = Cassette(args.cassette, mode="record")
+    if args.media_file:
+        media = Path(args.media_file).read_bytes()
+    else:
+        media = os.urandom(parse_size(args.media_size))
+    mp3_media = Path(args.mp3_file).read_bytes() if args.mp3_file else None
+
+    for number, song in enumerate(entity["songs"], start=1):
+        media_url = f"https://aac.saavncdn.com/{number:03}/{song['id']}_96.mp4"
+        encrypted = _CIPHER.encrypt(media_url.encode(), padmode=PAD_PKCS5)
+        api_song = {
+            "id": song["id"],
+            "song": song["title"],
+            "album": entity["title"],
+            "year": song["year"],
+            "language": song["language"],
+            "primary_artists": song["more_info"]["music"],
+            "encrypted_media_url": base64.b64encode(encrypted).decode(),
+            "image": song["image"],
+        }
+        api_data["songs"].append(api_song)
+        media_url = get_decrypted_url(api_song["encrypted_media_url"], "hd", False)
+        _record(cassette, media_url, media, "audio/mp4", latency, bandwidth)
+
+        if mp3_media is not None:
+            # The CDN's copy in mp3, found by format negotiation
+            for url in get_media_url_variants(media_url, "mp3")[:1]:
+                for method in ("HEAD", "GET"):
+                    _record(
+                        cassette,
+                        url,
+                        mp3_media,
+                        "audio/mpeg",
+                        latency,
+                        bandwidth,
+                        method,
+                    )
+
+    _record(cassette, page_url, html_content, "text/html", latency, bandwidth)
+    _record(
+        cassette,
+        api_url,
+        json.dumps(api_data).encode("utf-8"),
+        "application/json",
+        latency,
+        bandwidth,
+    )
+    cassette.close()
+
+    print(f"{len(entity['songs'])} songs recorded, replay with:\n{page_url}")
+
+
+def run(args: argparse.Namespace) -> None:
+    # Replays never reach Genius, but the client needs a token to start
+    os.environ.setdefault("GENIUS_ACCESS_TOKEN", "replay")
+    from musicDL.cli import main
+
+    timings = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = Path(tmp_dir, "config.json")
+            config_path.write_text(
+                json.dumps(
+                    {
+                        "quality": "hd",
+                        "output": tmp_dir,
+                        "output-format": "",
+                        "no-lyrics": args.no_lyrics,
+                        "no-tags": args.no_tags,
+                        "backup": False,
+                        "no-cache": True,
+                        "debug-file": str(Path(tmp_dir, "main.log")),
+                        "host-stats-file": str(Path(tmp_dir, "hosts.json")),
+                        "library-file": str(Path(tmp_dir, "library.sqlite3")),
+                        "cassette": str(Path(args.cassette).resolve()),
+                        "cassette-mode": "replay",
+                        "cassette-speed": args.speed,
+                    }
+                )
+            )
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(
+                SystemExit
+            ):
+                cwd = os.getcwd()
+                os.chdir(tmp_dir)
+                try:
+                    main(
+                        [args.url, "--config-file", str(config_path)] + args.extra,
+                        standalone_mode=False,
+                    )
+                finally:
+                    os.chdir(cwd)
+            timings.append(time.perf_counter() - start)
+
+            downloaded = len(
+                [path for path in Path(tmp_dir).iterdir() if path.suffix in AUDIO]
+            )
+            print(f"Run {len(timings)}: {timings[-1]:.2f} s, {downloaded} songs")
+
+    print(
+        f"{args.repeat} runs: median {statistics.median(timings):.2f} s,"
+        f" min {min(timings):.2f} s, max {max(timings):.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    synth_parser = commands.add_parser("synth", help="Build a cassette from a page")
+    synth_parser.add_argument("page", help="Fixture page in tests/test-pages")
+    synth_parser.add_argument("cassette")
+    synth_parser.add_argument("--media-size", default="1M")
+    synth_parser.add_argument(
+        "--media-file", help="Real audio served for every song, to convert and tag"
+    )
+    synth_parser.add_argument(
+        "--mp3-file", help="Served as the CDN's mp3 copy of every song"
+    )
+    synth_parser.add_argument("--latency-ms", type=float, default=50)
+    synth_parser.add_argument("--bandwidth", default="4M", help="Bytes per second")
+    synth_parser.set_defaults(func=synth)
+
+    run_parser = commands.add_parser("run", help="Replay a cassette")
+    run_parser.add_argument("cassette")
+    run_parser.add_argument("url")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--speed", type=float, default=1.0)
+    run_parser.add_argument("--no-lyrics", action="store_true")
+    run_parser.add_argument("--no-tags", action="store_true")
+    run_parser.set_defaults(func=run)
+
+    # Unknown options are passed on to musicDL, such as --segments 4
+    args, args.extra = parser.parse_known_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmark the pooled keep-alive session against bare ``requests.get``.
+
+A local HTTP/1.1 server stands in for Saavn and its CDN. Every request
+made with a bare ``requests.get`` opens a new connection, the shared
+session of :mod:`musicDL.handle_requests` reuses its pooled connections.
+
+Usage::
+
+    $ python -m benchmarks.bench_http_session --requests 500 --workers 4 --handshake-ms 30
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from musicDL.handle_requests import _get_headers, configure_session, http_get
+
+BODY = b'{"lyrics": "' + b"la " * 2000 + b'"}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        super().setup()
+        # Stand-in for the round trips of a TCP + TLS handshake
+        time.sleep(self.server.handshake_delay)  # type: ignore
+        with self.server.lock:  # type: ignore
+            self.server.connections += 1  # type: ignore
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+def _bare_get(url: str) -> bytes:
+    res = requests.get(url, headers=_get_headers(), timeout=20)
+    res.raise_for_status()
+    return res.content
+
+
+def _run(name: str, fetch, url: str, total: int, workers: int, server) -> None:  # type: ignore
+    server.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda _: fetch(url), range(total)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<12} {total / elapsed:>10.1f} req/s"
+        f" {elapsed:>8.3f} s {server.connections:>6} connections"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--handshake-ms",
+        type=float,
+        default=0.0,
+        help="Delay added to every new connection to mimic TCP/TLS handshakes",
+    )
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()  # type: ignore
+    server.handshake_delay = args.handshake_ms / 1000  # type: ignore
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api.php"
+
+    configure_session(pool_connections=10, pool_maxsize=args.workers)
+
+    print(f"{args.requests} requests, {args.workers} workers")
+    _run("bare", _bare_get, url, args.requests, args.workers, server)
+    _run("session", http_get, url, args.requests, args.workers, server)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Benchmark extracting ``window.__INITIAL_DATA__`` from saved Saavn pages.
+
+Compares the single-pass byte scanner with the BeautifulSoup fallback on
+the fixture pages in ``tests/test-pages``.
+
+Usage::
+
+    $ python -m benchmarks.bench_initial_data --repeat 20
+"""
+
+import argparse
+import timeit
+from pathlib import Path
+
+from musicDL.handle_requests import (
+    _extract_initial_data_with_soup,
+    extract_initial_data,
+)
+
+PAGES_DIR = Path(__file__).resolve().parent.parent.joinpath("tests", "test-pages")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'page':<16} {'size':>9} {'soup':>10} {'scanner':>10} {'speedup':>8}")
+    for page in sorted(PAGES_DIR.glob("*.html")):
+        html_content = page.read_bytes()
+        assert extract_initial_data(html_content) == _extract_initial_data_with_soup(
+            html_content
+        )
+
+        soup = timeit.timeit(
+            lambda: _extract_initial_data_with_soup(html_content), number=args.repeat
+        )
+        scanner = timeit.timeit(
+            lambda: extract_initial_data(html_content), number=args.repeat
+        )
+        print(
+            f"{page.name:<16} {len(html_content) // 1024:>6} KiB"
+            f" {soup / args.repeat * 1000:>7.2f} ms {scanner / args.repeat * 1000:>7.2f} ms"
+            f" {soup / scanner:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
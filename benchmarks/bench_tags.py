@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark of tagging throughput on a directory of fixture songs.
+
+Generates an mp3 and an m4a with ffmpeg, copies them into a directory of
+songs, then tags all of them with lyrics and a cover image, and tags them
+again (as ``--only-tagging`` does).
+
+Usage::
+
+    $ python -m benchmarks.bench_tags --files 50 --duration 180
+"""
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+FORMATS = {"mp3": ["-c:a", "libmp3lame", "-b:a", "320k"], "m4a": ["-c:a", "aac"]}
+
+
+def _make_fixture(path: Path, duration: float) -> None:
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"sine=duration={duration}"]
+        + FORMATS[path.suffix[1:]]
+        + [str(path)],
+        check=True,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=50, help="Songs per format")
+    parser.add_argument("--duration", type=float, default=180, help="Seconds")
+    parser.add_argument("--cover-size", type=int, default=150 * 1024)
+    args = parser.parse_args()
+
+    # Tagging never reaches Genius, but the client needs a token to start
+    os.environ.setdefault("GENIUS_ACCESS_TOKEN", "benchmark")
+    from musicDL.config import Config
+    from musicDL.metadata import set_tags
+    from musicDL.SongObj import SongObj
+    from musicDL.vendor.pyDes import ECB, PAD_PKCS5, des
+
+    cipher = des(b"38346591", ECB, b"\0\0\0\0\0\0\0\0", pad=None, padmode=PAD_PKCS5)
+    media_url = "https://aac.saavncdn.com/001/fixture_96.mp4"
+    encrypted_media_url = base64.b64encode(
+        cipher.encrypt(media_url.encode(), padmode=PAD_PKCS5)
+    ).decode()
+
+    cover = os.urandom(args.cover_size)
+
+    class FixtureSong(SongObj):
+        def get_cover_image(self) -> bytes:
+            return cover
+
+    song = FixtureSong(
+        {
+            "id": "fixture",
+            "song": "Fixture Song",
+            "album": "Fixture Album",
+            "primary_artists": "Fixture Artist",
+            "music": "Fixture Composer",
+            "year": "2021",
+            "release_date": "2021-01-01",
+            "language": "hindi",
+            "duration": str(int(args.duration)),
+            "label": "Fixture Label",
+            "encrypted_media_url": encrypted_media_url,
+        },
+        1,
+        10,
+        "hd",
+    )
+    song.set_lyrics("Fixture lyrics\n" * 40)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = Path(tmp_dir, "config.json")
+        config = Config.get_default_config()
+        config.update({"debug-file": str(Path(tmp_dir, "main.log"))})
+        config_path.write_text(json.dumps(config))
+        Config.set_config(str(config_path), {})
+
+        print(f"{'format':<8} {'files':>6} {'first tag':>12} {'retag':>12}")
+        for output_format in FORMATS:
+            fixture = Path(tmp_dir, f"fixture.{output_format}")
+            _make_fixture(fixture, args.duration)
+
+            songs = []
+            for number in range(args.files):
+                songs.append(Path(tmp_dir, f"song{number}.{output_format}"))
+                shutil.copyfile(fixture, songs[-1])
+
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                for path in songs:
+                    set_tags(str(path), song)
+                timings.append(time.perf_counter() - start)
+
+            print(
+                f"{output_format:<8} {args.files:>6}"
+                + "".join(f" {args.files / t:>8.1f} f/s" for t in timings)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,23 @@
 
 import logging
 from html import unescape
-from typing import Any, Type, TypeVar  # For static type checking
-
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Optional,
+    Type,
+    TypeVar,
+)  # For static type checking
+
+from requests.exceptions import RequestException
 from slugify import slugify
 
 from . import __version__
 from .config import Config
-from .handle_requests import http_get
-from .utils import get_decrypted_url, get_language_code
+from .cover_art import get_cover_image
+from .handle_requests import http_head_exists
+from .utils import get_decrypted_url, get_language_code, get_media_url_variants
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +27,19 @@ logger = logging.getLogger(__name__)
 # Create a generic variable that can be 'Parent', or any subclass.
 T = TypeVar("T", bound="SongObj")
 
+# Fields of a Saavn song that are the same for every track of its album
+ALBUM_FIELDS = (
+    "albumid",
+    "album",
+    "genre",
+    "year",
+    "release_date",
+    "copyright_text",
+    "language",
+    "label",
+    "image",
+)
+
 
 class SongObj:
     """Represents a Saavn song object."""
@@ -39,21 +61,22 @@ class SongObj:
         self.__track_number = track_number
         self.__total_tracks = total_tracks
         self.__quality = quality
+        # Decrypted when first needed, songs downloaded before never are
         self.__media_url = ""
-        self._set_media_url()
 
     @classmethod
     def from_raw_dict(
         cls: Type[T],
         raw_json_dict: dict[str, Any],
         obj_type: str,
+        quality: Optional[str] = None,
     ) -> list[T]:
         """Returns a list of :class:`SongObj` instances.
 
         Args:
             raw_json_dict: Song details.
             obj_type: The type of URL.
-            config: User configurations.
+            quality: Audio quality, the configured one by default.
 
         Returns:
             song_obj_list: A list of :class:`SongObj` instances.
@@ -76,7 +99,7 @@ class SongObj:
 
         total_tracks = len(song_obj_list)
 
-        quality = Config.get_config("quality")
+        quality = quality or Config.get_config("quality")
 
         song_obj_list = [
             cls(song_obj, index, total_tracks, quality)
@@ -85,6 +108,71 @@ class SongObj:
 
         return song_obj_list
 
+    @classmethod
+    def from_raw_stream(
+        cls: Type[T],
+        raw_json_items: Iterable[tuple[str, Any]],
+        obj_type: str,
+        quality: Optional[str] = None,
+    ) -> Iterator[T]:
+        """Yields :class:`SongObj` instances while the song details are parsed.
+
+        The total number of tracks is only known once every song was parsed,
+        it is set on all the yielded songs at the end.
+
+        Args:
+            raw_json_items: ``(key, value)`` of the song details, with the songs
+                of an album or a playlist yielded one at a time (see
+                :func:`musicDL.handle_requests.iter_json_data_from_api`).
+            obj_type: The type of URL.
+            quality: Audio quality, the configured one by default.
+
+        Yields:
+            :class:`SongObj` instances, in track order.
+        """
+
+        quality = quality or Config.get_config("quality")
+        tracking_key = {"album": "title", "playlist": "listid"}.get(obj_type)
+        has_tracking_file_path = False
+        total_tracks = 0
+
+        cls.__tracking_file_path = slugify(text="musicDL", max_length=150)
+
+        song_obj_list: list[T] = []
+        pending: list[dict[str, Any]] = []
+
+        for key, value in raw_json_items:
+            if obj_type == "song" or key == "songs":
+                if obj_type == "song" and not has_tracking_file_path:
+                    cls.__tracking_file_path = slugify(
+                        text=value["song"], max_length=150
+                    )
+                    has_tracking_file_path = True
+                pending.append(value)
+            elif key == tracking_key:
+                cls.__tracking_file_path = slugify(text=value, max_length=150)
+                has_tracking_file_path = True
+            elif key == "list_count" and str(value).isdigit():
+                total_tracks = int(value)
+
+            # Songs listed before the tracking file name wait for it
+            if has_tracking_file_path:
+                for song in pending:
+                    song_obj_list.append(
+                        cls(song, len(song_obj_list) + 1, total_tracks, quality)
+                    )
+                    yield song_obj_list[-1]
+                pending.clear()
+
+        for song in pending:
+            song_obj_list.append(
+                cls(song, len(song_obj_list) + 1, total_tracks, quality)
+            )
+            yield song_obj_list[-1]
+
+        for song_obj in song_obj_list:
+            song_obj.set_total_tracks(len(song_obj_list))
+
     @classmethod
     def get_tracking_file_path(cls: Type[T]) -> str:
         """Returns the tracking file path"""
@@ -102,6 +190,26 @@ class SongObj:
         is_320kbps = self.__song_obj.get("320kbps", False)
         self.__media_url = get_decrypted_url(url, quality, is_320kbps)
 
+    def negotiate_media_url(self, output_format: str) -> bool:
+        """Switch to a copy of the media in the output format, if the CDN has one.
+
+        Saves converting the media, the copies are probed with HEAD requests.
+
+        Args:
+            output_format: Format the media is converted to, such as ``mp3``.
+
+        Returns:
+            Whether the media URL was switched.
+        """
+
+        for url in get_media_url_variants(self.get_media_url(), output_format):
+            if http_head_exists(url):
+                logger.debug(f"Using {url} rather than {self.__media_url}")
+                self.__media_url = url
+                return True
+
+        return False
+
     def get_title(self) -> str:
         """Returns title of the song"""
         return unescape(self.__song_obj.get("song", ""))
@@ -122,6 +230,10 @@ class SongObj:
         """Returns a str for track number as (track_number/total_track)"""
         return f"{self.__track_number}/{self.__total_tracks}"
 
+    def set_total_tracks(self, total_tracks: int) -> None:
+        """Sets total number of tracks of the song's album or playlist"""
+        self.__total_tracks = total_tracks
+
     def get_disc_number(self) -> str:
         """Returns a str for disk number as (side/disc_number)"""
         return "1/1"
@@ -162,6 +274,10 @@ class SongObj:
         """Returns publisher of the song"""
         return unescape(self.__song_obj.get("label", ""))
 
+    def get_album_key(self) -> tuple[str, ...]:
+        """Returns the album fields of the song, equal for tracks of one album"""
+        return tuple(str(self.__song_obj.get(field, "")) for field in ALBUM_FIELDS)
+
     def get_song_id_saavn(self) -> str:
         """Returns Saavn id of the song"""
         return self.__song_obj.get("id", "")
@@ -188,11 +304,24 @@ class SongObj:
     #     """Returns sync-lyrics of the song"""
     #     return ""
 
-    def get_cover_image(self) -> str:
-        """Returns url of cover image of the song"""
-        url = self.__song_obj.get("image", "").replace("150x150", "500x500")
-        return http_get(url)
+    def get_cover_image_url(self) -> str:
+        """Returns url of the 500x500 cover image, empty if there is none"""
+        return self.__song_obj.get("image", "").replace("150x150", "500x500")
+
+    def get_cover_image(self) -> bytes:
+        """Returns cover image of the song, empty if it couldn't be fetched"""
+        url = self.get_cover_image_url()
+        if not url:
+            return b""
+        try:
+            return get_cover_image(url)
+        except RequestException as e:
+            logger.error(f"COVER IMAGE FAILED FOR: {self.get_title()}")
+            logger.exception(e)
+            return b""
 
     def get_media_url(self) -> str:
         """Returns url of the media"""
+        if not self.__media_url:
+            self._set_media_url()
         return self.__media_url
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+On-disk HTTP cache
+
+Keeps Saavn web pages and API responses between runs. Entries are keyed by
+URL, expire after a TTL and are then revalidated with ``If-None-Match`` /
+``If-Modified-Since``. The least recently used entries are evicted once
+the cache grows beyond its size limit.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional  # For static type checking
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """Represents a cached response."""
+
+    def __init__(self, meta: dict[str, Any], body: bytes) -> None:
+        self.url: str = meta["url"]
+        self.etag: str = meta.get("etag", "")
+        self.last_modified: str = meta.get("last_modified", "")
+        self.expires: float = meta.get("expires", 0.0)
+        self.body = body
+
+    def is_fresh(self) -> bool:
+        """Returns if the entry can be used without asking the server."""
+        return time.time() < self.expires
+
+    def get_validators(self) -> dict[str, str]:
+        """Returns the headers of a conditional request revalidating the entry."""
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+
+class HTTPCache:
+    """Represents an on-disk cache of HTTP responses."""
+
+    def __init__(self, cache_dir: str, ttl: float, max_size: int) -> None:
+        """Initialize `HTTPCache`.
+
+        Args:
+            cache_dir: Directory where the responses are stored.
+            ttl: Seconds a response is used without revalidating it.
+            max_size: Maximum size of all cached bodies in bytes.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # Sizes of the entries by key, least recently used first, and their total,
+        # loaded from the metadata files on first use
+        self._index: Optional[OrderedDict[str, int]] = None
+        self._size = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get_paths(self, url: str) -> tuple[Path, Path]:
+        """Returns the paths of the metadata and the body of a URL's entry."""
+
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir.joinpath(f"{key}.json"), self.cache_dir.joinpath(key)
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Returns the cached response of a URL, if any.
+
+        Args:
+            url: The requested URL.
+        """
+
+        meta_path, body_path = self._get_paths(url)
+
+        try:
+            meta = json.loads(meta_path.read_text(encoding="UTF-8"))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("url") != url:
+            return None
+
+        # Mark as recently used, on disk for the next runs too
+        os.utime(meta_path)
+        self._touch(meta_path.stem, meta.get("size", len(body)))
+
+        return CacheEntry(meta, body)
+
+    def put(self, url: str, body: bytes, headers: Any) -> None:
+        """Cache the response of a URL.
+
+        Args:
+            url: The requested URL.
+            body: Content of the response.
+            headers: Headers of the response.
+        """
+
+        meta = {
+            "url": url,
+            "etag": headers.get("etag", ""),
+            "last_modified": headers.get("last-modified", ""),
+            "expires": time.time() + self.ttl,
+            "size": len(body),
+        }
+
+        meta_path, body_path = self._get_paths(url)
+        _write_atomic(body_path, body)
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+        self._touch(meta_path.stem, len(body))
+        if self._size > self.max_size:
+            self.evict()
+
+    def refresh(self, url: str, entry: CacheEntry) -> None:
+        """Extend the lifetime of an entry the server confirmed unchanged.
+
+        Args:
+            url: The requested URL.
+            entry: The revalidated entry.
+        """
+
+        meta_path, _ = self._get_paths(url)
+        meta = {
+            "url": url,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "expires": time.time() + self.ttl,
+            "size": len(entry.body),
+        }
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        self._touch(meta_path.stem, len(entry.body))
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Returns the index of the entries, scanning the cache directory once.
+
+        Must be called with the lock held.
+        """
+
+        if self._index is not None:
+            return self._index
+
+        entries = []
+        for meta_path in self.cache_dir.glob("*.json"):
+            try:
+                stat = meta_path.stat()
+                size = json.loads(meta_path.read_text(encoding="UTF-8"))["size"]
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((stat.st_mtime, meta_path.stem, size))
+
+        self._index = OrderedDict()
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+        self._size = sum(self._index.values())
+
+        return self._index
+
+    def _touch(self, key: str, size: int) -> None:
+        """Record an entry as the most recently used one."""
+
+        with self._lock:
+            index = self._load_index()
+            self._size += size - index.pop(key, 0)
+            index[key] = size
+
+    def evict(self) -> None:
+        """Remove the least recently used entries beyond the size limit."""
+
+        with self._lock:
+            index = self._load_index()
+
+            while self._size > self.max_size and index:
+                key, size = index.popitem(last=False)
+                self._size -= size
+
+                logger.debug(f"Evicting cache entry {key}")
+                meta_path = self.cache_dir.joinpath(f"{key}.json")
+                for path in (meta_path, meta_path.with_suffix("")):
+                    if path.exists():
+                        path.unlink()
+
+    def clear(self) -> None:
+        """Remove all the cached responses."""
+
+        with self._lock:
+            for path in self.cache_dir.iterdir():
+                if path.is_file():
+                    path.unlink()
+
+            self._index = OrderedDict()
+            self._size = 0
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write a file so that readers never see it half written."""
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""
+Record and replay HTTP traffic
+
+A cassette holds the HTTP exchanges of a run: the Saavn pages and API, the
+CDN media and the Genius API. Once recorded, it is replayed offline with
+the original latency and bandwidth, or scaled, so that end-to-end runs are
+repeatable.
+
+The cassette is a zip file with an ``index.json`` and the response bodies,
+each distinct body stored once. Bodies are written as they are recorded, so
+that a recording isn't held in memory.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Optional  # For static type checking
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+
+# Request headers that ask for a different response from the same URL
+_MATCH_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+
+# Media is already compressed
+_STORED_TYPES = ("audio/", "video/", "image/")
+
+
+class CassetteError(RequestException):
+    """Raised when a replayed request wasn't recorded."""
+
+
+class Cassette:
+    """Represents the recorded HTTP exchanges of a run."""
+
+    def __init__(self, path: str, mode: str = "replay", speed: float = 1.0) -> None:
+        """Initialize `Cassette`.
+
+        Args:
+            path: Path of the cassette file.
+            mode: ``record`` the exchanges or ``replay`` them.
+            speed: Replay this many times faster than recorded, ``inf`` for no
+                delays at all.
+
+        Raises:
+            ValueError: Unknown mode.
+            OSError: The cassette can't be read in replay mode.
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._interactions: dict[str, list[dict[str, Any]]] = {}
+        self._stored: set[str] = set()
+        self._played: dict[str, int] = {}
+        self._zip: Optional[zipfile.ZipFile] = None
+        # Recorded into, replaces the cassette file once saved
+        self._tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+
+        if mode == "replay":
+            self._zip = zipfile.ZipFile(self.path)
+            index = json.loads(self._zip.read("index.json"))
+            self._interactions = index["interactions"]
+            logger.info(f"Replaying {len(self._interactions)} requests from {path}")
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._zip = zipfile.ZipFile(self._tmp_path, "w")
+
+    @staticmethod
+    def _get_key(request: PreparedRequest, exact: bool = True) -> str:
+        """Returns the key of the recorded responses to a request.
+
+        Args:
+            request: The request.
+            exact: Include the headers asking for a different response.
+        """
+
+        key = f"{request.method} {request.url}"
+        if exact:
+            for name in _MATCH_HEADERS:
+                if name in request.headers:
+                    key += f"\n{name}: {request.headers[name]}"
+
+        return key
+
+    def record(
+        self,
+        request: PreparedRequest,
+        response: HTTPResponse,
+        body: bytes,
+        latency: float,
+        duration: float,
+    ) -> None:
+        """Record an exchange.
+
+        Args:
+            request: The request.
+            response: The response, its body already read.
+            body: The body as sent, before any content decoding.
+            latency: Seconds until the response headers arrived.
+            duration: Seconds the body took to arrive.
+        """
+
+        digest = hashlib.sha256(body).hexdigest()
+        content_type = response.headers.get("content-type", "")
+        interaction = {
+            "status": response.status,
+            "reason": response.reason,
+            "headers": [
+                [name, value]
+                for name, value in response.headers.items()
+                if name.lower() != "set-cookie"
+            ],
+            "body": digest,
+            "size": len(body),
+            "latency": latency,
+            "duration": duration,
+        }
+
+        with self._lock:
+            if digest not in self._stored and self._zip is not None:
+                self._zip.writestr(
+                    f"bodies/{digest}",
+                    body,
+                    compress_type=(
+                        zipfile.ZIP_STORED
+                        if content_type.startswith(_STORED_TYPES)
+                        else zipfile.ZIP_DEFLATED
+                    ),
+                )
+                self._stored.add(digest)
+            self._interactions.setdefault(self._get_key(request), []).append(
+                interaction
+            )
+
+    def play(self, request: PreparedRequest) -> tuple[dict[str, Any], bytes]:
+        """Returns the next recorded response to a request and its body.
+
+        Responses recorded for the same request are played in order, the
+        last one again and again. Without a recording of the exact request
+        (such as a ``Range`` that wasn't asked for), the whole response is
+        played.
+
+        Args:
+            request: The request.
+
+        Raises:
+            CassetteError: The request wasn't recorded.
+        """
+
+        with self._lock:
+            key = self._get_key(request)
+            if key not in self._interactions:
+                key = self._get_key(request, exact=False)
+            if key not in self._interactions:
+                raise CassetteError(
+                    f"No recorded response for {request.method} {request.url}"
+                )
+
+            interactions = self._interactions[key]
+            played = self._played.get(key, 0)
+            self._played[key] = played + 1
+            interaction = interactions[min(played, len(interactions) - 1)]
+
+            body = b""
+            if self._zip is not None:
+                body = self._zip.read(f"bodies/{interaction['body']}")
+
+        return interaction, body
+
+    def save(self) -> None:
+        """Write the index of the recorded exchanges and the cassette file."""
+
+        with self._lock:
+            if self._zip is None:
+                return None
+
+            self._zip.writestr(
+                "index.json",
+                json.dumps({"version": 1, "interactions": self._interactions}),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            self._zip.close()
+            self._zip = None
+
+            os.replace(self._tmp_path, self.path)
+
+        logger.info(f"Recorded {len(self._interactions)} requests into {self.path}")
+
+    def close(self) -> None:
+        """Save a recording, or close the cassette file of a replay."""
+
+        if self.mode == "record":
+            self.save()
+        elif self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class _PacedBody(io.BytesIO):
+    """Represents a replayed body that is read at the recorded bandwidth."""
+
+    def __init__(self, body: bytes, rate: float) -> None:
+        super().__init__(body)
+        self.rate = rate
+        self._start: Optional[float] = None
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if self._start is None:
+            self._start = time.monotonic()
+
+        data = super().read(size)
+
+        if self.rate:
+            wait = self._start + self.tell() / self.rate - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+        return data
+
+
+class CassetteAdapter(HTTPAdapter):
+    """Transport adapter that records to or replays from a cassette."""
+
+    def __init__(self, cassette: Cassette, **kwargs: Any) -> None:
+        """Initialize `CassetteAdapter`.
+
+        Args:
+            cassette: The cassette.
+            kwargs: Arguments of ``requests.adapters.HTTPAdapter``.
+        """
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(  # type: ignore
+        self, request: PreparedRequest, stream: bool = False, **kwargs: Any
+    ) -> Response:
+        if self.cassette.mode == "replay":
+            return self._replay(request)
+
+        start = time.monotonic()
+        response = super().send(request, stream=True, **kwargs)
+        latency = time.monotonic() - start
+
+        with response:
+            body = response.raw.read(decode_content=False)
+        duration = time.monotonic() - start - latency
+
+        self.cassette.record(request, response.raw, body, latency, duration)
+
+        return self._build(
+            request, response.status_code, response.reason, response.raw.headers, body
+        )
+
+    def _replay(self, request: PreparedRequest) -> Response:
+        interaction, body = self.cassette.play(request)
+        speed = self.cassette.speed
+
+        time.sleep(interaction["latency"] / speed)
+
+        rate = 0.0
+        if interaction["duration"] > 0:
+            rate = interaction["size"] / interaction["duration"] * speed
+
+        return self._build(
+            request,
+            interaction["status"],
+            interaction["reason"],
+            HTTPHeaderDict(interaction["headers"]),
+            body,
+            rate,
+        )
+
+    def _build(
+        self,
+        request: PreparedRequest,
+        status: int,
+        reason: str,
+        headers: HTTPHeaderDict,
+        body: bytes,
+        rate: float = 0.0,
+    ) -> Response:
+        """Returns a response reading its body from memory."""
+
+        raw = HTTPResponse(
+            body=_PacedBody(body, rate),
+            headers=headers,
+            status=status,
+            reason=reason,
+            preload_content=False,
+            decode_content=True,
+            request_method=request.method,
+        )
+        return self.build_response(request, raw)
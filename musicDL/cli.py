@@ -5,13 +5,23 @@ import logging
 import os
 import sys
 from datetime import date
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Optional,
+    TextIO,
+    TypeVar,
+)  # For static type checking
 
 import click  # Creates beautiful command line interface
 
 from . import __version__
 from .config import Config
+from .constants import OUTPUT_FORMATS, QUALITIES
 from .log import configure_logger
-from .main import musicDL
+from .main import musicDL, serve
+from .store import LINK_METHODS
 
 logger = logging.getLogger(__name__)
 
@@ -37,147 +47,251 @@ def version_msg() -> str:
     return message.format(location, python_version, year)
 
 
-@click.command(context_settings=dict(help_option_names=["-h", "--help"]))
-@click.version_option(__version__, "--version", message=version_msg())
-@click.argument("request", default=None, required=True, type=click.STRING)
-@click.option(
-    "-q",
-    "--quality",
-    default="hd",
-    show_default=True,
-    type=click.Choice(["low", "medium", "high", "hd"], case_sensitive=False),
-    metavar="",
-    help="Audio Quality: low:96kbps, medium:128kbps, high:160kbps, or hd:320kbps",
-)
-@click.option(
-    "-o",
-    "--output",
-    default=".",
-    show_default=True,
-    type=click.Path(exists=True, file_okay=False),
-    metavar="",
-    help="Output directory path",
-)
-@click.option(
-    "--only-tagging",
-    is_flag=True,
-    help="No downloading, only Embed tags into existing files.",
-)
-@click.option(
-    "--no-lyrics",
-    is_flag=True,
-    help="Don't fetch lyrics.",
-)
-@click.option(
-    "--no-coverart",
-    is_flag=True,
-    help="Don't embed cover art.",
-)
-@click.option(
-    "--no-tags",
-    is_flag=True,
-    help="Don't embed tags.",
-)
-@click.option(
-    "--update-tags",
-    is_flag=True,
-    help="Update embed tags.",
-)
-@click.option(
-    "--save-lyrics",
-    is_flag=True,
-    help="Save lyrics as text files in the same output path.",
-)
-@click.option(
-    "--backup",
-    is_flag=True,
-    help="Backup the tracking file.",
-)
-@click.option(
-    "--output-format",
-    default="m4a",
-    show_default=True,
-    type=click.Choice(["mp3", "aac", "m4a"], case_sensitive=False),
-    metavar="",
-    help="Output audio format.",
-)
-@click.option(
-    "--ffmpeg",
-    default="ffmpeg",
-    type=click.Path(dir_okay=False),
-    metavar="",
-    help="Path to ffmpeg application.",
-)
-@click.option(
-    "--ignore-ffmpeg-version",
-    is_flag=True,
-    help="Ignore ffmpeg version is getting version error.",
-)
-@click.option(
-    "--log-level",
-    default="DEBUG",
-    show_default=True,
-    type=click.Choice(
-        ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], case_sensitive=False
+def read_requests(lines: Iterable[str]) -> list[str]:
+    """Returns the requests of a batch file, one per line.
+
+    Blank lines and lines starting with ``#`` are skipped.
+
+    Args:
+        lines: Lines of the batch file.
+    """
+
+    requests = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            requests.append(line)
+
+    return requests
+
+
+# Options of both the download and the serve commands, turned into the config
+_CONFIG_OPTIONS = [
+    click.option(
+        "-q",
+        "--quality",
+        default="hd",
+        show_default=True,
+        type=click.Choice(QUALITIES, case_sensitive=False),
+        metavar="",
+        help="Audio Quality: low:96kbps, medium:128kbps, high:160kbps, or hd:320kbps",
     ),
-    metavar="",
-    help="Set stream logging to verbose",
-)
-@click.option(
-    "--debug-file",
-    default="",
-    type=click.Path(dir_okay=False),
-    metavar="",
-    help="File to be used as a stream for DEBUG logging",
-)
-@click.option(
-    "--config-file",
-    default="",
-    type=click.Path(dir_okay=False),
-    metavar="",
-    help="User configuration file (JSON format)",
-)
-@click.option("-v", "--verbose", is_flag=True, help="Will print more logging messages.")
-def main(
-    request: str,
-    quality: str,
-    output: str,
-    only_tagging: bool,
-    no_lyrics: bool,
-    no_coverart: bool,
-    no_tags: bool,
-    update_tags: bool,
-    save_lyrics: bool,
-    backup: bool,
-    output_format: str,
-    ffmpeg: str,
-    ignore_ffmpeg_version: bool,
-    log_level: str,
-    debug_file: str,
-    config_file: str,
-    verbose: bool,
-) -> None:
-    """Pass URL of a song/album/playlist or trackingfile path."""
+    click.option(
+        "-o",
+        "--output",
+        default=".",
+        show_default=True,
+        type=click.Path(exists=True, file_okay=False),
+        metavar="",
+        help="Output directory path",
+    ),
+    click.option(
+        "--only-tagging",
+        is_flag=True,
+        help="No downloading, only Embed tags into existing files.",
+    ),
+    click.option(
+        "--no-lyrics",
+        is_flag=True,
+        help="Don't fetch lyrics.",
+    ),
+    click.option(
+        "--no-coverart",
+        is_flag=True,
+        help="Don't embed cover art.",
+    ),
+    click.option(
+        "--no-tags",
+        is_flag=True,
+        help="Don't embed tags.",
+    ),
+    click.option(
+        "--update-tags",
+        is_flag=True,
+        help="Update embed tags.",
+    ),
+    click.option(
+        "--save-lyrics",
+        is_flag=True,
+        help="Save lyrics as text files in the same output path.",
+    ),
+    click.option(
+        "--no-cache",
+        is_flag=True,
+        help="Don't use or update the cache of Saavn pages and API responses.",
+    ),
+    click.option(
+        "--backup",
+        is_flag=True,
+        help="Backup the tracking file.",
+    ),
+    click.option(
+        "--output-format",
+        default="m4a",
+        show_default=True,
+        type=click.Choice(OUTPUT_FORMATS, case_sensitive=False),
+        metavar="",
+        help="Output audio format.",
+    ),
+    click.option(
+        "--ffmpeg",
+        default="ffmpeg",
+        type=click.Path(dir_okay=False),
+        metavar="",
+        help="Path to ffmpeg application.",
+    ),
+    click.option(
+        "--ignore-ffmpeg-version",
+        is_flag=True,
+        help="Ignore ffmpeg version is getting version error.",
+    ),
+    click.option(
+        "--segments",
+        default=None,
+        type=click.IntRange(min=1),
+        metavar="",
+        help="Download each song over this many parallel connections (HTTP Range).",
+    ),
+    click.option(
+        "--max-concurrency",
+        default=None,
+        type=click.IntRange(min=1),
+        metavar="",
+        help="Maximum number of songs downloaded at the same time.",
+    ),
+    click.option(
+        "--limit-rate",
+        default=None,
+        type=click.STRING,
+        metavar="",
+        help="Cap the total download speed, in bytes per second (e.g. 512K, 2M).",
+    ),
+    click.option(
+        "--transcode-jobs",
+        default=None,
+        type=click.IntRange(min=1),
+        metavar="",
+        help="Maximum number of ffmpeg conversions at the same time (default: cores).",
+    ),
+    click.option(
+        "--retag-workers",
+        default=None,
+        type=click.IntRange(min=1),
+        metavar="",
+        help="Number of threads tagging songs with --only-tagging (default: cores).",
+    ),
+    click.option(
+        "--find-workers",
+        default=None,
+        type=click.IntRange(min=1),
+        metavar="",
+        help="Number of threads finding the files to tag with --only-tagging.",
+    ),
+    click.option(
+        "--no-stream-transcode",
+        is_flag=True,
+        help="Convert songs once downloaded, rather than while they download.",
+    ),
+    click.option(
+        "--no-format-negotiation",
+        is_flag=True,
+        help="Don't look for a copy of each song in the output format on the CDN.",
+    ),
+    click.option(
+        "--no-library",
+        is_flag=True,
+        help="Don't skip the songs in the library index, only those found on disk.",
+    ),
+    click.option(
+        "--sync",
+        is_flag=True,
+        help="Only download the album/playlist tracks added since the last sync.",
+    ),
+    click.option(
+        "--store-dir",
+        default=None,
+        type=click.Path(file_okay=False),
+        metavar="",
+        help="Download each song once into this store, linked into output directories.",
+    ),
+    click.option(
+        "--store-link",
+        default=None,
+        type=click.Choice(LINK_METHODS, case_sensitive=False),
+        metavar="",
+        help="Link stored songs as hardlink (default), reflink or copy.",
+    ),
+    click.option(
+        "--cassette",
+        default=None,
+        type=click.Path(dir_okay=False),
+        metavar="",
+        help="Record all HTTP traffic into this file, or replay it from there.",
+    ),
+    click.option(
+        "--cassette-mode",
+        default=None,
+        type=click.Choice(["record", "replay"], case_sensitive=False),
+        metavar="",
+        help="Record into the cassette or replay it (default).",
+    ),
+    click.option(
+        "--cassette-speed",
+        default=None,
+        type=click.FloatRange(min=0, min_open=True),
+        metavar="",
+        help="Replay this many times faster than recorded, inf for no delays.",
+    ),
+    click.option(
+        "--log-level",
+        default="DEBUG",
+        show_default=True,
+        type=click.Choice(
+            ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], case_sensitive=False
+        ),
+        metavar="",
+        help="Set stream logging to verbose",
+    ),
+    click.option(
+        "--debug-file",
+        default="",
+        type=click.Path(dir_okay=False),
+        metavar="",
+        help="File to be used as a stream for DEBUG logging",
+    ),
+    click.option(
+        "--config-file",
+        default="",
+        type=click.Path(dir_okay=False),
+        metavar="",
+        help="User configuration file (JSON format)",
+    ),
+    click.option(
+        "-v", "--verbose", is_flag=True, help="Will print more logging messages."
+    ),
+]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def config_options(func: F) -> F:
+    """Adds the config options to a command."""
+
+    for option in reversed(_CONFIG_OPTIONS):
+        func = option(func)
+    return func
+
+
+def configure(options: dict[str, Any]) -> None:
+    """Merge the default config, the user config and the CLI options, set up logging.
+
+    Args:
+        options: The CLI options, by parameter name.
+    """
 
     # CLI options
-    cli_config = {
-        "quality": quality,
-        "output": output,
-        "only-tagging": only_tagging,
-        "no-lyrics": no_lyrics,
-        "no-coverart": no_coverart,
-        "no-tags": no_tags,
-        "update-tags": update_tags,
-        "save-lyrics": save_lyrics,
-        "backup": backup,
-        "output-format": output_format,
-        "ffmpeg": ffmpeg,
-        "ignore-ffmpeg-version": ignore_ffmpeg_version,
-        "log-level": log_level,
-        "debug-file": debug_file,
-        "config-file": config_file,
-        "verbose": verbose,
-    }
+    cli_config = {name.replace("_", "-"): value for name, value in options.items()}
+    config_file = options["config_file"]
 
     # Merge default, user config, and CLI options
     Config.set_config(config_file, cli_config)
@@ -189,8 +303,81 @@ def main(
     else:
         logger.debug("Using CLI options along with default configs")
 
+
+class DefaultGroup(click.Group):
+    """Group running its ``download`` command unless another command is named."""
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if not args or (
+            args[0] not in self.commands
+            and args[0] not in ctx.help_option_names + ["--version"]
+        ):
+            args = ["download"] + args
+        return super().parse_args(ctx, args)
+
+
+@click.group(
+    cls=DefaultGroup, context_settings=dict(help_option_names=["-h", "--help"])
+)
+@click.version_option(__version__, "--version", message=version_msg())
+def main() -> None:
+    """Download songs, albums and playlists from Saavn.
+
+    Runs the download command unless another command is given.
+    """
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("request", nargs=-1, type=click.STRING)
+@click.option(
+    "--batch-file",
+    default=None,
+    type=click.File("r", encoding="utf-8"),
+    metavar="",
+    help="Also download the URLs/trackingfiles in this file, one per line (- for stdin).",
+)
+@config_options
+def download(
+    request: tuple[str, ...], batch_file: Optional[TextIO], **options: Any
+) -> None:
+    """Pass URLs of songs/albums/playlists or trackingfile paths, - for stdin."""
+
+    requests = [item for item in request if item != "-"]
+    if "-" in request or (not request and not batch_file and not sys.stdin.isatty()):
+        requests += read_requests(sys.stdin)
+    if batch_file:
+        requests += read_requests(batch_file)
+    if not requests:
+        raise click.UsageError("Missing argument 'REQUEST...'.")
+
+    configure(options)
+
     # Calling musicDL
-    musicDL(request)
+    musicDL(requests)
+
+
+@main.command("serve", context_settings=dict(help_option_names=["-h", "--help"]))
+@config_options
+@click.option(
+    "--serve-port",
+    default=None,
+    type=click.IntRange(min=1, max=65535),
+    metavar="",
+    help="Port of the job API of musicDL serve, on localhost.",
+)
+@click.option(
+    "--serve-token-file",
+    default=None,
+    type=click.Path(dir_okay=False),
+    metavar="",
+    help="Require the API token kept in this file, created if missing.",
+)
+def serve_command(**options: Any) -> None:
+    """Download the jobs submitted to a local HTTP API."""
+
+    configure(options)
+
+    serve()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+Adaptive download concurrency
+
+The number of songs downloaded at once from a host is adjusted at runtime
+(AIMD): it grows while the host's total throughput grows, steps back when
+more connections stop paying off and halves on errors. A token bucket caps
+the total bandwidth. What was learnt about each host is saved for the
+next run.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional  # For static type checking
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Represents a thread-safe token bucket limiting bytes per second."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        """Initialize `TokenBucket`.
+
+        Args:
+            rate: Bytes per second.
+            burst: Bytes that can be sent at once after being idle, ``rate``
+                by default.
+        """
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        """Take tokens for the given number of bytes, sleeping if there are too few.
+
+        The bucket may go into debt, so chunks larger than the burst size pass
+        and the following ones wait for the debt to be paid off.
+
+        Args:
+            amount: Number of bytes.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait:
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Represents an asyncio limit on concurrent downloads that adapts itself.
+
+    After every ``limit`` downloads the limit is re-evaluated:
+
+    #. any error halves the limit (multiplicative decrease)
+    #. total throughput at least as high as the previous round adds one (additive
+       increase)
+    #. a drop in total throughput takes one away, more connections only slow
+       each other down
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 8) -> None:
+        """Initialize `AdaptiveLimiter`.
+
+        Args:
+            initial: The starting limit.
+            minimum: The lowest limit.
+            maximum: The highest limit.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.best_throughput = 0.0
+
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+        self._window_bytes = 0
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_start = time.monotonic()
+        self._last_throughput = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for a free download slot."""
+
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        """Free a download slot."""
+
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.release()
+
+    def record_success(self, size: int) -> None:
+        """Count a finished download.
+
+        Args:
+            size: Number of bytes downloaded.
+        """
+
+        self._window_bytes += size
+        self._window_count += 1
+        self._evaluate()
+
+    def record_failure(self) -> None:
+        """Count a failed download."""
+
+        self._window_errors += 1
+        self._window_count += 1
+        self._evaluate()
+
+    def _evaluate(self) -> None:
+        """Adjust the limit at the end of a round of ``limit`` downloads."""
+
+        if self._window_count < self.limit:
+            return None
+
+        elapsed = max(time.monotonic() - self._window_start, 1e-6)
+        throughput = self._window_bytes / elapsed
+        old_limit = self.limit
+
+        if self._window_errors:
+            self.limit = max(self.minimum, self.limit // 2)
+        elif throughput >= self._last_throughput * 0.95:
+            self.limit = min(self.maximum, self.limit + 1)
+        else:
+            self.limit = max(self.minimum, self.limit - 1)
+
+        if throughput > self.best_throughput and not self._window_errors:
+            self.best_throughput = throughput
+
+        logger.debug(
+            f"Concurrency {old_limit} -> {self.limit}: {throughput / 1024:.0f} KiB/s,"
+            f" {self._window_errors} errors"
+        )
+
+        self._last_throughput = throughput
+        self._window_bytes = 0
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_start = time.monotonic()
+
+        # Let waiting downloads use the new slots
+        if self.limit > old_limit:
+            asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._condition:
+            self._condition.notify_all()
+
+
+class ConcurrencyController:
+    """Represents the per-host adaptive limiters and their saved statistics."""
+
+    def __init__(
+        self, stats_path: str, initial: int = 4, minimum: int = 1, maximum: int = 8
+    ) -> None:
+        """Initialize `ConcurrencyController`.
+
+        Args:
+            stats_path: JSON file with per-host statistics of earlier runs.
+            initial: Starting limit for hosts without statistics.
+            minimum: The lowest limit.
+            maximum: The highest limit.
+        """
+        self.stats_path = Path(stats_path)
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limiters: dict[str, AdaptiveLimiter] = {}
+
+        try:
+            self.stats = json.loads(self.stats_path.read_text(encoding="UTF-8"))
+        except (OSError, ValueError):
+            self.stats = {}
+
+    def get_limiter(self, host: str) -> AdaptiveLimiter:
+        """Returns the limiter of a host, starting where the last run left off.
+
+        Args:
+            host: Host of the media URL.
+        """
+
+        if host not in self.limiters:
+            initial = self.stats.get(host, {}).get("concurrency", self.initial)
+            logger.info(f"Starting with {initial} concurrent downloads from {host}")
+            self.limiters[host] = AdaptiveLimiter(initial, self.minimum, self.maximum)
+
+        return self.limiters[host]
+
+    def save(self) -> None:
+        """Save the per-host statistics for the next run."""
+
+        for host, limiter in self.limiters.items():
+            self.stats[host] = {
+                "concurrency": limiter.limit,
+                "throughput": limiter.best_throughput,
+            }
+
+        try:
+            self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+            self.stats_path.write_text(json.dumps(self.stats), encoding="UTF-8")
+        except OSError as e:
+            logger.warning(f"Couldn't save host statistics: {e}")
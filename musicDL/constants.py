@@ -11,6 +11,10 @@ LOG_LEVELS = {
     "CRITICAL": CRITICAL,
 }
 
+# Audio qualities and output formats
+QUALITIES = ("low", "medium", "high", "hd")
+OUTPUT_FORMATS = ("mp3", "aac", "m4a")
+
 # Logging format
 LOG_FORMAT = "[%(asctime)s] %(levelname)s in %(module)s: %(message)s"
 
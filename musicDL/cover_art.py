@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Album art cache
+
+Every track of an album has the same cover image. Images are kept in memory,
+the least recently used evicted beyond a size limit, over the on-disk HTTP
+cache. Tracks asking for an image that is being fetched wait for that fetch
+rather than starting their own. The covers of an album or playlist can be
+fetched in the background while its songs are still downloading.
+"""
+
+import concurrent.futures
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional  # For static type checking
+
+from .handle_requests import http_get_cached
+
+logger = logging.getLogger(__name__)
+
+
+class _Fetch:
+    """Represents a fetch of an image, shared by the tracks waiting for it."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.image = b""
+        self.error: Optional[Exception] = None
+
+
+class CoverArtCache:
+    """Represents the in-memory cache of cover images, by URL."""
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize `CoverArtCache`.
+
+        Args:
+            max_size: Maximum size of all cached images in bytes.
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.fetches = 0
+        self._images: OrderedDict[str, bytes] = OrderedDict()
+        self._fetching: dict[str, _Fetch] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        """Returns an image, fetching it unless cached or being fetched.
+
+        Raises:
+            RequestException: An error occurred fetching the image.
+        """
+
+        with self._lock:
+            image = self._images.get(url)
+            if image is not None:
+                self._images.move_to_end(url)
+                return image
+
+            fetch = self._fetching.get(url)
+            owner = fetch is None
+            if fetch is None:
+                fetch = self._fetching[url] = _Fetch()
+                self.fetches += 1
+
+        if not owner:
+            fetch.done.wait()
+            if fetch.error is not None:
+                raise fetch.error
+            return fetch.image
+
+        try:
+            fetch.image = http_get_cached(url)
+        except Exception as e:
+            # Not cached, the next track tries again
+            fetch.error = e
+            raise
+        else:
+            self._put(url, fetch.image)
+        finally:
+            with self._lock:
+                del self._fetching[url]
+            fetch.done.set()
+
+        return fetch.image
+
+    def _put(self, url: str, image: bytes) -> None:
+        if len(image) > self.max_size:
+            return None
+
+        with self._lock:
+            self._images[url] = image
+            self.size += len(image)
+
+            while self.size > self.max_size:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= len(evicted)
+
+
+# Cover images of the run, unless configured off
+_cover_cache: Optional[CoverArtCache] = None
+_cover_cache_lock = threading.Lock()
+_warm_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_warmed: set[str] = set()
+
+
+def configure_cover_cache(max_size: int) -> None:
+    """Keep cover images in memory, up to ``max_size`` bytes, ``0`` for none."""
+
+    global _cover_cache
+
+    _cover_cache = CoverArtCache(max_size) if max_size else None
+    _warmed.clear()
+
+
+def get_cover_image(url: str) -> bytes:
+    """Returns a cover image, from the cache if configured.
+
+    Raises:
+        RequestException: An error occurred fetching the image.
+    """
+
+    cache = _cover_cache
+    if cache is None:
+        return http_get_cached(url)
+
+    return cache.get(url)
+
+
+def warm_cover_cache(urls: Iterable[str]) -> None:
+    """Fetch cover images in the background, each URL once per run.
+
+    Args:
+        urls: URLs of the images, such as those of the tracks of an album.
+    """
+
+    global _warm_executor
+
+    cache = _cover_cache
+    if cache is None:
+        return None
+
+    def warm(url: str) -> None:
+        try:
+            cache.get(url)
+        except Exception as e:
+            logger.debug(f"Warming cover image failed: {e!r}")
+
+    with _cover_cache_lock:
+        for url in urls:
+            if not url or url in _warmed:
+                continue
+            _warmed.add(url)
+
+            if _warm_executor is None:
+                _warm_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="cover-art"
+                )
+            _warm_executor.submit(warm, url)
+
+
+def shutdown_cover_warming() -> None:
+    """Stop fetching cover images in the background, dropping pending fetches."""
+
+    global _warm_executor
+
+    with _cover_cache_lock:
+        executor, _warm_executor = _warm_executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
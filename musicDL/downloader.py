@@ -1,19 +1,36 @@
 import asyncio
+import collections
 import concurrent
+import contextlib
+import functools
 import logging
 import sys
+import threading
+import time
 import traceback
 from pathlib import Path
-from typing import Any  # For static type checking
-
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+)  # For static type checking
+from urllib.parse import urlsplit
+
+from .concurrency import ConcurrencyController
 from .config import Config
-from .handle_requests import http_get
+from .cover_art import shutdown_cover_warming, warm_cover_cache
+from .library import LibraryIndex
 from .metadata import set_tags
+from .pipeline import Pipeline, Stage
 from .progress_handlers import DisplayManager, DownloadTracker
 from .services import ffmpeg
 from .services.lyrics import get_lyrics
 from .SongObj import SongObj
-from .utils import get_file_name
+from .store import ContentStore
+from .transfer import download_media, set_bandwidth_limit, stream_media
+from .utils import get_bitrate_from_url, get_file_name, parse_size
 
 logger = logging.getLogger(__name__)
 
@@ -21,9 +38,6 @@ logger = logging.getLogger(__name__)
 class DownloadManager:
     """Represents a Download Manager."""
 
-    # Big pool sizes on slow connections will lead to more incomplete downloads
-    poolSize: int = 4
-
     def __init__(self) -> None:
         """Initialize DownloadManger with DisplayManger, DownloadTracker,
         and asyncio operations. Along with the output directory.
@@ -32,6 +46,10 @@ class DownloadManager:
             output_dir: Path where the downloaded files need to be saved.
         """
         self.output_dir = Config.get_config("output")
+        # Options a job of the job server can change, see job_options
+        self.quality: str = Config.get_config("quality")
+        self.output_format: str = Config.get_config("output-format")
+        self._job_lock = threading.Lock()
 
         # start a server for objects shared across processes
         self.displayManager = DisplayManager()
@@ -40,26 +58,163 @@ class DownloadManager:
         if sys.platform == "win32":
             # ProactorEventLoop is required on Windows to run subprocess asynchronously
             # it is default since Python 3.8 but has to be changed for previous versions
-            loop = asyncio.ProactorEventLoop()
-            asyncio.set_event_loop(loop)
+            self.loop = asyncio.ProactorEventLoop()
+        else:
+            # A loop of its own, the current one may have been closed by asyncio.run
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        # Big pool sizes on slow connections will lead to more incomplete downloads,
+        # so the number of concurrent downloads per host adapts to its throughput
+        self.concurrency = ConcurrencyController(
+            Config.get_config("host-stats-file"),
+            initial=Config.get_config("concurrency"),
+            minimum=Config.get_config("min-concurrency"),
+            maximum=Config.get_config("max-concurrency"),
+        )
 
-        self.loop = asyncio.get_event_loop()
-        # semaphore is required to limit concurrent asyncio executions
-        self.semaphore = asyncio.Semaphore(self.poolSize)
+        # Global bandwidth cap shared by all the downloads
+        set_bandwidth_limit(parse_size(Config.get_config("limit-rate")))
 
-        # thread pool executor is used to run blocking (CPU-bound) code from a thread
+        # Retagging is mutagen work, as many songs at once as cores. The
+        # workers are threads: mutagen mostly reads and writes the files,
+        # which releases the GIL, and set_tags shares its album tag and
+        # cover caches between the songs of a process
+        self.retag_workers = (
+            Config.get_config("retag-workers") or ffmpeg.get_cpu_count()
+        )
+        # Songs retagged by set_tags_for_songs, updated, skipped or failed
+        self.retag_counts: "collections.Counter[str]" = collections.Counter()
+
+        # thread pool executor is used to run blocking code (network I/O, file
+        # writes, mutagen) from a thread, so that songs really transfer concurrently
+        # (one thread per download or find, lyrics and tag worker)
         self.thread_executor = concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.poolSize
+            max_workers=max(
+                Config.get_config("max-concurrency"), Config.get_config("find-workers")
+            )
+            + Config.get_config("lyrics-workers")
+            + max(Config.get_config("tag-workers"), self.retag_workers)
         )
+        self.pipeline: Optional[Pipeline] = None
+        self._task: Optional[asyncio.Future[None]] = None
+
+        # Set while songs are still being listed, tagging waits for the total
+        # number of tracks
+        self.song_list_complete = asyncio.Event()
+        self.song_list_complete.set()
 
         # ffmpeg path
         self.ffmpeg_path = Config.get_config("ffmpeg")
 
+        # Conversions are CPU bound, no more ffmpeg processes than cores
+        self.transcoder = ffmpeg.TranscodeScheduler(
+            jobs=Config.get_config("transcode-jobs"),
+            nice=Config.get_config("transcode-nice"),
+            ionice=Config.get_config("transcode-ionice"),
+        )
+
+        # Songs downloaded before are skipped by song ID, not by file name
+        self.library: Optional[LibraryIndex] = None
+        if not Config.get_config("no-library"):
+            self.library = LibraryIndex(Config.get_config("library-file"))
+        # Looked up for all the songs of a list at once, or a batch of the songs
+        # of a stream at a time, see _load_indexed
+        self._indexed: Optional[dict[str, Path]] = None
+
+        # Songs shared by output directories are downloaded once into the
+        # store, found through the library index
+        self.store: Optional[ContentStore] = None
+        if Config.get_config("store-dir"):
+            if self.library is None:
+                logger.warning("The song store needs the library index, not used")
+            else:
+                self.store = ContentStore(
+                    Config.get_config("store-dir"), Config.get_config("store-link")
+                )
+
     def __enter__(self) -> Any:
         return self
 
     def __exit__(self, type, value, traceback):  # type: ignore
         self.displayManager.close()
+        self.thread_executor.shutdown(wait=False)
+        shutdown_cover_warming()
+        self.concurrency.save()
+        if self.library:
+            self.library.close()
+        if not self.loop.is_running():
+            self.loop.close()
+
+    @contextlib.contextmanager
+    def job_options(self, options: dict[str, Any]) -> Iterator[None]:
+        """Download with the ``output``, ``quality`` and ``output-format`` of a job.
+
+        The options are those of the download manager rather than of the
+        app's config, and restored once the job is done. Jobs run one after
+        another.
+
+        Args:
+            options: Options of the job, the others are left as they are.
+
+        Raises:
+            RuntimeError: Another job is running.
+        """
+
+        if not self._job_lock.acquire(blocking=False):
+            raise RuntimeError("Another job is running, jobs run one at a time")
+
+        previous = (self.output_dir, self.quality, self.output_format)
+        try:
+            self.output_dir = options.get("output", self.output_dir)
+            self.quality = options.get("quality", self.quality)
+            self.output_format = options.get("output-format", self.output_format)
+            yield None
+        finally:
+            self.output_dir, self.quality, self.output_format = previous
+            self._job_lock.release()
+
+    def _run(self, coro: Any) -> None:
+        """Run a download on the event loop until it is complete or cancelled.
+
+        Raises:
+            CancelledError: The download was cancelled.
+        """
+
+        self._task = asyncio.ensure_future(coro, loop=self.loop)
+        try:
+            self.loop.run_until_complete(self._task)
+        finally:
+            self._task = None
+
+    def cancel(self) -> None:
+        """Stop the running download, from another thread.
+
+        Songs not yet started are dropped, transfers already running in the
+        thread pool end in the background.
+        """
+
+        task = self._task
+        if task is not None:
+            self.loop.call_soon_threadsafe(task.cancel)
+
+    async def _run_blocking(
+        self, func: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        """Run a blocking function in the thread pool without blocking the event loop.
+
+        Args:
+            func: The blocking function.
+            args: Positional arguments for the function.
+            kwargs: Keyword arguments for the function.
+
+        Returns:
+            The return value of the function.
+        """
+
+        return await self.loop.run_in_executor(
+            self.thread_executor, functools.partial(func, *args, **kwargs)
+        )
 
     def _get_output_file_path(self, song_obj: SongObj) -> Path:
         """Returns the media file path.
@@ -78,6 +233,121 @@ class DownloadManager:
 
         return Path(self.output_dir, file_name)
 
+    def _get_library_key(self) -> tuple[str, str]:
+        """Returns the quality and the format songs are indexed under."""
+
+        return (
+            self.quality.lower(),
+            (self.output_format or "").lower(),
+        )
+
+    def _load_indexed(self, song_obj_list: list[SongObj]) -> None:
+        """Look up which songs of a list were downloaded before, in one query."""
+
+        self._indexed = {} if self.library else None
+        self._add_indexed(song_obj_list)
+
+    def _add_indexed(self, song_obj_list: list[SongObj]) -> None:
+        """Look up which songs of a batch were downloaded before, in one query.
+
+        The songs looked up before are kept, see :meth:`_load_indexed`.
+        """
+
+        if self.library is None or self._indexed is None or not song_obj_list:
+            return None
+
+        self._indexed.update(
+            self.library.get_many(
+                [song_obj.get_song_id_saavn() for song_obj in song_obj_list],
+                *self._get_library_key(),
+            )
+        )
+
+    def _get_indexed_path(self, song_obj: SongObj) -> Optional[Path]:
+        """Returns the path a song was downloaded to, ``None`` if it wasn't.
+
+        Without a store, only a file still there in the output directory
+        counts, songs deleted or downloaded into another directory are
+        downloaded again.
+        """
+
+        if self.library is None:
+            return None
+        if self._indexed is not None:
+            indexed_path = self._indexed.get(song_obj.get_song_id_saavn())
+        else:
+            indexed_path = self.library.get(
+                song_obj.get_song_id_saavn(), *self._get_library_key()
+            )
+
+        # Stored songs are materialised into every output directory
+        if indexed_path is None or self.store:
+            return indexed_path
+
+        output_dir = Path(self.output_dir).resolve()
+        if output_dir not in indexed_path.parents or not indexed_path.is_file():
+            logger.debug(f"{indexed_path} isn't in {output_dir}, not skipped")
+            return None
+
+        return indexed_path
+
+    def _add_to_library(self, song_obj: SongObj, output_file_path: Path) -> None:
+        """Record a completed download in the library index, and the store."""
+
+        if self.library is None:
+            return None
+
+        quality, output_format = self._get_library_key()
+        try:
+            # Indexed by its path in the store, shared by the output directories
+            if self.store:
+                output_file_path = self.store.add(
+                    song_obj.get_song_id_saavn(), quality, output_file_path
+                )
+
+            self.library.add(
+                song_obj.get_song_id_saavn(), quality, output_format, output_file_path
+            )
+        except Exception as e:
+            logger.warning(f"Indexing {output_file_path} failed: {e!r}")
+
+    def _warm_cover_art(self, song_obj_list: list[SongObj]) -> None:
+        """Fetch the cover images of songs in the background, to be tagged."""
+
+        if (
+            Config.get_config("no-tags")
+            or Config.get_config("no-coverart")
+            or Config.get_config("no-cover-warm")
+        ):
+            return None
+
+        warm_cover_cache(song.get_cover_image_url() for song in song_obj_list)
+
+    def _materialise(self, song_obj: SongObj, stored_path: Path) -> bool:
+        """Put a stored song into the output directory, unless it is there.
+
+        Returns:
+            Whether the song is in the output directory, ``False`` if it is
+            gone from the store too.
+        """
+
+        output_file_path = self._get_output_file_path(song_obj).with_suffix(
+            stored_path.suffix
+        )
+        if output_file_path.is_file():
+            return True
+
+        try:
+            self.store.materialise(stored_path, output_file_path)  # type: ignore
+        except FileNotFoundError:
+            logger.warning(f"{stored_path} is gone from the store, downloading")
+            self.library.remove(  # type: ignore
+                song_obj.get_song_id_saavn(), *self._get_library_key()
+            )
+            return False
+
+        return True
+
     def download_lyrics(
         self,
         song_obj: SongObj,
@@ -119,34 +389,41 @@ class DownloadManager:
 
     def embed_tags(
         self, song_obj: SongObj, output_file_path: str, displayProgressTracker: Any
-    ) -> None:
+    ) -> str:
         """Embed tags for the given song (:class:`musicDL.SongObj`).
 
         Args:
             song_obj: The song which needs to be embed with tags.
             output_file_path: Output path of the song.
             displayProgressTracker: Progress tracker for the song.
-        """
 
-        is_tagging_successful = False
+        Returns:
+            ``updated``, ``skipped`` if the tags were the same already,
+            ``failed``, or empty if tagging is disabled.
+        """
 
-        if not Config.get_config("no-tags"):
-            is_tagging_successful = set_tags(output_file_path, song_obj)
+        if Config.get_config("no-tags"):
+            if displayProgressTracker:
+                displayProgressTracker.notify_download_completion()
+            return ""
 
-        elif displayProgressTracker:
-            displayProgressTracker.notify_download_completion()
-            return None
+        tagging_result = set_tags(output_file_path, song_obj) or "failed"
 
         # Tagging completed
         if displayProgressTracker:
-            if is_tagging_successful:
+            if tagging_result != "failed":
                 displayProgressTracker.notify_download_completion()
             else:
                 displayProgressTracker.notify_error("Embedding tags failed", "Tagging")
 
+        return tagging_result
+
     def set_tags_for_songs(self, song_obj_list: list[SongObj]) -> None:
         """Set tags for the given list of songs (:class:`musicDL.SongObj`).
 
+        Songs are found and their lyrics fetched on the I/O workers, while
+        others are tagged on as many workers as cores.
+
         Args:
             song_obj_list: List of songs to be tagged.
         """
@@ -156,51 +433,136 @@ class DownloadManager:
         self.downloadTracker.load_song_list(song_obj_list)
 
         self.displayManager.set_song_count_to(len(song_obj_list))
+        self._load_indexed(song_obj_list)
+        self._warm_cover_art(song_obj_list)
+
+        start = time.monotonic()
+        self.retag_counts.clear()
+        self.pipeline = self._new_retag_pipeline()
+        self._run(self.pipeline.run(self._new_job(song) for song in song_obj_list))
+        elapsed = time.monotonic() - start
+
+        rate = len(song_obj_list) / elapsed if elapsed else 0.0
+        message = (
+            f"Retagged {len(song_obj_list)} songs in {elapsed:.1f}s"
+            f" ({rate:.1f} songs/s): {self.retag_counts['updated']} updated,"
+            f" {self.retag_counts['skipped']} skipped,"
+            f" {self.retag_counts['failed']} failed"
+        )
+        logger.info(message)
+        self.displayManager.print(message)
 
-        for song_obj in song_obj_list:
-            try:
-                displayProgressTracker = self.displayManager.new_progress_tracker(
-                    song_obj
-                )
+    def _find_tagged_file(self, song_obj: SongObj) -> Optional[Path]:
+        """Returns the downloaded file of a song, ``None`` if there is none."""
 
-                output_file_path = self._get_output_file_path(song_obj)
+        # Stored songs are retagged in the output directory
+        output_file_path = Path()
+        if not self.store:
+            output_file_path = self._get_indexed_path(song_obj) or Path()
+        if not output_file_path.is_file():
+            output_file_path = self._get_output_file_path(song_obj)
+        if not output_file_path.is_file():
+            # Converted, or downloaded in the output format
+            output_file_path = ffmpeg.get_output_path(
+                output_file_path, self.output_format
+            )
 
-                if not output_file_path.is_file():
-                    if displayProgressTracker:
-                        displayProgressTracker.notify_error("File not found", "Tagging")
-                else:
-                    if displayProgressTracker:
-                        displayProgressTracker.notify_saavn_download_completion()
+        return output_file_path if output_file_path.is_file() else None
+
+    def _new_retag_pipeline(self) -> Pipeline:
+        """Returns the pipeline of find, lyrics and tag stages of retagging."""
+
+        queue_size = Config.get_config("stage-queue-size")
+
+        return Pipeline(
+            [
+                Stage(
+                    "find",
+                    self._find_stage,
+                    Config.get_config("find-workers"),
+                    queue_size,
+                ),
+                Stage(
+                    "lyrics",
+                    self._lyrics_stage,
+                    Config.get_config("lyrics-workers"),
+                    queue_size,
+                ),
+                Stage("tag", self._retag_stage, self.retag_workers, queue_size),
+            ]
+        )
 
-                    self.download_lyrics(
-                        song_obj=song_obj,
-                        output_file_path=str(output_file_path),
-                        displayProgressTracker=displayProgressTracker,
-                    )
+    async def _find_stage(self, job: "_SongJob") -> Optional["_SongJob"]:
+        """Find the downloaded file of a song to be retagged."""
 
-                    self.embed_tags(
-                        song_obj=song_obj,
-                        output_file_path=str(output_file_path),
-                        displayProgressTracker=displayProgressTracker,
-                    )
+        try:
+            output_file_path = await self._run_blocking(
+                self._find_tagged_file, job.song_obj
+            )
+            if output_file_path is None:
+                self.retag_counts["failed"] += 1
+                if job.displayProgressTracker:
+                    job.displayProgressTracker.notify_error("File not found", "Tagging")
+                return None
 
-                    logger.info(f"Successfully tagged {str(output_file_path)}")
-            except Exception as e:
-                tb = traceback.format_exc()
-                if displayProgressTracker:
-                    displayProgressTracker.notify_error(e, tb)
-                else:
-                    raise e
+            if job.displayProgressTracker:
+                job.displayProgressTracker.notify_saavn_download_completion()
+
+            job.output_file_path = output_file_path
+            return job
+
+        except Exception as e:
+            self.retag_counts["failed"] += 1
+            self._notify_error(job, e)
+            return None
+
+    async def _retag_stage(self, job: "_SongJob") -> Optional["_SongJob"]:
+        """Embed the tags of a downloaded song again."""
+
+        try:
+            tagging_result = await self._run_blocking(
+                self.embed_tags,
+                song_obj=job.song_obj,
+                output_file_path=str(job.output_file_path),
+                displayProgressTracker=job.displayProgressTracker,
+            )
 
-    def download_songs(self, song_obj_list: list[SongObj]) -> None:
+            self.retag_counts[tagging_result or "skipped"] += 1
+            logger.info(f"Successfully tagged {str(job.output_file_path)}")
+            return job
+
+        except Exception as e:
+            self.retag_counts["failed"] += 1
+            self._notify_error(job, e)
+            return None
+
+    def download_songs(
+        self,
+        song_obj_list: Iterable[SongObj],
+        tracking_file_name: Optional[str] = None,
+    ) -> None:
         """Download the given list of songs (:class:`musicDL.SongObj`).
 
+        Songs of an iterator, such as :meth:`musicDL.SongObj.from_raw_stream`,
+        start downloading as soon as they are yielded.
+
         Args:
             song_obj_list: List of songs to be downloaded.
+            tracking_file_name: Name of the trackingfile, named after the
+                album, playlist or song by default.
         """
 
         logger.info("Downloading Initiated")
         self.downloadTracker.clear()
+        if tracking_file_name:
+            self.downloadTracker.saveFile = Path(
+                f"{tracking_file_name}.musicDLTrackingFile"
+            )
+
+        if not isinstance(song_obj_list, list):
+            self._run(self._download_song_stream(song_obj_list))
+            return None
+
         self.downloadTracker.load_song_list(song_obj_list)
 
         self.displayManager.set_song_count_to(len(song_obj_list))
@@ -223,51 +585,211 @@ class DownloadManager:
 
         self._download_asynchronously(songObjList)
 
-    async def download_song(self, song_obj: SongObj) -> None:
-        """Download the given song (:class:`musicDL.SongObj`).
+    def _download_media(
+        self, song_obj: SongObj, output_file_path: Path, displayProgressTracker: Any
+    ) -> None:
+        """Download the raw media of the given song (:class:`musicDL.SongObj`).
 
-        Download, Convert, embed metadata, album art and lyrics.
+        This is blocking, :meth:`download_song` runs it in the thread pool.
 
         Args:
             song_obj: Song to be downloaded.
+            output_file_path: Path where the media is saved.
+            displayProgressTracker: Progress tracker for the song.
+        """
+
+        download_media(
+            url=song_obj.get_media_url(),
+            output_file_path=output_file_path,
+            segments=Config.get_config("segments"),
+            segment_min_size=Config.get_config("segment-min-size"),
+            displayProgressTracker=displayProgressTracker,
+            preallocate=Config.get_config("preallocate"),
+            write_behind=Config.get_config("write-behind"),
+        )
+
+    def _stream_media(
+        self,
+        song_obj: SongObj,
+        output_file_path: Path,
+        displayProgressTracker: Any,
+    ) -> Path:
+        """Download the media of a song into ffmpeg, converting it on the way.
+
+        Falls back to downloading the media into a file, converted later, if
+        it can't be streamed or the stream breaks off.
+
+        Returns:
+            Path of the converted file, or of the downloaded file.
         """
 
-        # Since most errors are expected to happen within this function, we wrap in
+        url = song_obj.get_media_url()
+        transcoder = ffmpeg.StreamTranscoder(
+            output_format=self.output_format,
+            output_file_path=output_file_path,
+            bitrate=get_bitrate_from_url(url),
+            ffmpeg_path=self.ffmpeg_path,
+            scheduler=self.transcoder,
+        )
+
+        try:
+            if not stream_media(
+                url, transcoder.open, output_file_path, displayProgressTracker
+            ):
+                return output_file_path
+
+            return transcoder.close()
+        except Exception as e:
+            transcoder.abort()
+            logger.warning(f"Streaming into ffmpeg failed ({e!r}), retrying: {url}")
+
+        self._download_media(song_obj, output_file_path, displayProgressTracker)
+        return output_file_path
+
+    def _new_pipeline(self) -> Pipeline:
+        """Returns the pipeline of download, convert, lyrics and tag stages."""
+
+        queue_size = Config.get_config("stage-queue-size")
+
+        return Pipeline(
+            [
+                # Only as many transfers as the media host's current limit run
+                # at the same time, see _download_stage
+                Stage(
+                    "download",
+                    self._download_stage,
+                    Config.get_config("max-concurrency"),
+                    queue_size,
+                ),
+                # Downloaded songs wait on disk for a transcode slot, the
+                # CPU limit never holds back downloads, see _convert_stage
+                Stage(
+                    "convert",
+                    self._convert_stage,
+                    Config.get_config("max-concurrency"),
+                    0,
+                ),
+                Stage(
+                    "lyrics",
+                    self._lyrics_stage,
+                    Config.get_config("lyrics-workers"),
+                    queue_size,
+                ),
+                Stage(
+                    "tag", self._tag_stage, Config.get_config("tag-workers"), queue_size
+                ),
+            ]
+        )
+
+    def _new_job(self, song_obj: SongObj) -> "_SongJob":
+        return _SongJob(song_obj, self.displayManager.new_progress_tracker(song_obj))
+
+    def _notify_error(self, job: "_SongJob", e: Exception) -> None:
+        tb = traceback.format_exc()
+        if job.displayProgressTracker:
+            job.displayProgressTracker.notify_error(e, tb)
+        else:
+            raise e
+
+    async def _download_stage(self, job: "_SongJob") -> Optional["_SongJob"]:
+        """Download the raw media of a song, unless it was downloaded before."""
+
+        displayProgressTracker = job.displayProgressTracker
+
+        # Since most errors are expected to happen within the stages, we wrap in
         # exception catcher to prevent blocking on multiple downloads
         try:
-            displayProgressTracker = self.displayManager.new_progress_tracker(song_obj)
+            # Indexed before the media URL is even decrypted
+            indexed_path = self._get_indexed_path(job.song_obj)
+            indexed = indexed_path is not None
+
+            # Every output directory gets its own link to the stored song
+            if indexed_path is not None and self.store:
+                indexed = await self._run_blocking(
+                    self._materialise, job.song_obj, indexed_path
+                )
 
-            output_file_path = self._get_output_file_path(song_obj)
+            if not indexed:
+                job.output_file_path = self._get_output_file_path(job.song_obj)
+                converted_file_path = ffmpeg.get_output_path(
+                    job.output_file_path, self.output_format
+                )
+
+                # Downloaded before the library index, indexed from now on
+                for path in (job.output_file_path, converted_file_path):
+                    if path.is_file():
+                        await self._run_blocking(
+                            self._add_to_library, job.song_obj, path
+                        )
+                        indexed = True
+                        break
 
-            if output_file_path.is_file():
+            if indexed:
                 if self.displayManager:
                     displayProgressTracker.notify_download_skip()
                 if self.downloadTracker:
-                    self.downloadTracker.notify_download_completion(song_obj)
+                    self.downloadTracker.notify_download_completion(job.song_obj)
 
-                # None is the default return value of all functions, we just explicitly define
-                # it here as a continent way to avoid executing the rest of the function.
+                # Nothing left to do for this song
                 return None
 
-            url = song_obj.get_media_url()
-
-            with output_file_path.open("wb") as output_file:
-                response = http_get(url, stream=True)
-
-                total = int(response.headers.get("content-length", 0))
+            # A copy in the output format needs no conversion at all
+            if (
+                converted_file_path != job.output_file_path
+                and not Config.get_config("no-format-negotiation")
+                and await self._run_blocking(
+                    job.song_obj.negotiate_media_url,
+                    self.output_format,
+                )
+            ):
+                job.output_file_path = self._get_output_file_path(job.song_obj)
+                converted_file_path = ffmpeg.get_output_path(
+                    job.output_file_path, self.output_format
+                )
 
-                if not total:
-                    output_file.write(response.content)
-                else:
-                    for ch in response.iter_content(
-                        chunk_size=max(int(total / 1000), 1024 * 1024)
-                    ):
-                        if ch:
-                            output_file.write(ch)
-                            if displayProgressTracker:
-                                displayProgressTracker.update_progress_bar(total, ch)
+            # Converted while downloading, ffmpeg reading the media as it
+            # arrives. Only with a core to spare, a streamed conversion holds
+            # its slot as long as the download takes. Segments arrive out of
+            # order, they can't be streamed.
+            stream = (
+                converted_file_path != job.output_file_path
+                and not Config.get_config("no-stream-transcode")
+                and Config.get_config("segments") == 1
+                and self.transcoder.try_acquire()
+            )
 
-            if not output_file_path.exists():
+            try:
+                # tasks that cannot acquire a slot will wait here until one is free
+                host = urlsplit(job.song_obj.get_media_url()).netloc
+                limiter = self.concurrency.get_limiter(host)
+                async with limiter:
+                    # The transfer runs in the thread pool, so that other songs
+                    # are downloaded at the same time
+                    try:
+                        if stream:
+                            job.output_file_path = await self._run_blocking(
+                                self._stream_media,
+                                job.song_obj,
+                                job.output_file_path,
+                                displayProgressTracker,
+                            )
+                        else:
+                            await self._run_blocking(
+                                self._download_media,
+                                job.song_obj,
+                                job.output_file_path,
+                                displayProgressTracker,
+                            )
+                    except Exception:
+                        limiter.record_failure()
+                        raise
+
+                    limiter.record_success(job.output_file_path.stat().st_size)
+            finally:
+                if stream:
+                    self.transcoder.release()
+
+            if not job.output_file_path.exists():
                 if displayProgressTracker:
                     displayProgressTracker.notify_error(
                         "Download failed", "Downloading"
@@ -278,55 +800,199 @@ class DownloadManager:
             if displayProgressTracker:
                 displayProgressTracker.notify_saavn_download_completion()
 
-            output_format = Config.get_config("output-format")
+            return job
+
+        except Exception as e:
+            self._notify_error(job, e)
+            return None
+
+    async def _convert_stage(self, job: "_SongJob") -> Optional["_SongJob"]:
+        """Convert a downloaded song to the output format."""
+
+        try:
+            output_format = self.output_format
             if output_format:
-                if not str(output_file_path).endswith(output_format):
-                    output_file_path = await ffmpeg.convert(
+                if not str(job.output_file_path).endswith(output_format):
+                    job.output_file_path = await ffmpeg.convert(
                         output_format=output_format,
-                        downloaded_file_path=str(output_file_path),
+                        downloaded_file_path=str(job.output_file_path),
                         ffmpeg_path=self.ffmpeg_path,
+                        scheduler=self.transcoder,
+                        key=job.song_obj.get_album_title(),
                     )
 
-            if displayProgressTracker:
-                displayProgressTracker.notify_conversion_completion()
+            if job.displayProgressTracker:
+                job.displayProgressTracker.notify_conversion_completion()
+
+            return job
+
+        except Exception as e:
+            self._notify_error(job, e)
+            return None
+
+    async def _lyrics_stage(self, job: "_SongJob") -> Optional["_SongJob"]:
+        """Download the lyrics of a song."""
 
-            self.download_lyrics(
-                song_obj=song_obj,
-                output_file_path=str(output_file_path),
-                displayProgressTracker=displayProgressTracker,
+        try:
+            await self._run_blocking(
+                self.download_lyrics,
+                song_obj=job.song_obj,
+                output_file_path=str(job.output_file_path),
+                displayProgressTracker=job.displayProgressTracker,
             )
+            return job
+
+        except Exception as e:
+            self._notify_error(job, e)
+            return None
 
-            self.embed_tags(
-                song_obj=song_obj,
-                output_file_path=str(output_file_path),
-                displayProgressTracker=displayProgressTracker,
+    async def _tag_stage(self, job: "_SongJob") -> Optional["_SongJob"]:
+        """Embed the tags of a song, completing its download."""
+
+        try:
+            # The track number tag needs the total number of tracks
+            await self.song_list_complete.wait()
+
+            await self._run_blocking(
+                self.embed_tags,
+                song_obj=job.song_obj,
+                output_file_path=str(job.output_file_path),
+                displayProgressTracker=job.displayProgressTracker,
+            )
+
+            await self._run_blocking(
+                self._add_to_library, job.song_obj, job.output_file_path
             )
 
             # Download complete
             if self.downloadTracker:
-                self.downloadTracker.notify_download_completion(song_obj)
+                self.downloadTracker.notify_download_completion(job.song_obj)
 
-            logger.info(f"Downloaded file is {str(output_file_path)}")
+            logger.info(f"Downloaded file is {str(job.output_file_path)}")
+            return job
 
         except Exception as e:
-            tb = traceback.format_exc()
-            if displayProgressTracker:
-                displayProgressTracker.notify_error(e, tb)
-            else:
-                raise e
+            self._notify_error(job, e)
+            return None
+
+    async def download_song(self, song_obj: SongObj) -> None:
+        """Download the given song (:class:`musicDL.SongObj`).
 
-    async def _pool_download(self, song_obj: SongObj) -> Any:
-        # Run asynchronous task in a pool to make sure that all processes
-        # don't run at once.
+        Download, Convert, embed metadata, album art and lyrics. The stages
+        run one after another here, :meth:`download_songs` runs many songs
+        through them at once.
 
-        # tasks that cannot acquire semaphore will wait here until it's free
-        # only certain amount of tasks can acquire the semaphore at the same time
-        async with self.semaphore:
-            return await self.download_song(song_obj)
+        Args:
+            song_obj: Song to be downloaded.
+        """
+
+        job: Optional[_SongJob] = self._new_job(song_obj)
+
+        for stage in (
+            self._download_stage,
+            self._convert_stage,
+            self._lyrics_stage,
+            self._tag_stage,
+        ):
+            if job is None:
+                return None
+            job = await stage(job)
 
     def _download_asynchronously(self, song_obj_list: list[SongObj]) -> None:
         logger.info("Initiating Async Downloading")
         logger.info(f"Downloading files into {self.output_dir}")
-        tasks = [self._pool_download(song) for song in song_obj_list]
-        # call all task asynchronously, and wait until all are finished
-        self.loop.run_until_complete(asyncio.gather(*tasks))
+
+        self._load_indexed(song_obj_list)
+        self._warm_cover_art(song_obj_list)
+
+        # Songs flow through the stages, each with its own workers
+        self.pipeline = self._new_pipeline()
+        self._run(self.pipeline.run(self._new_job(song) for song in song_obj_list))
+
+    async def _download_song_stream(self, song_obj_iter: Iterable[SongObj]) -> None:
+        """Download the songs of an iterator while it is still yielding them.
+
+        Args:
+            song_obj_iter: Songs to be downloaded.
+        """
+
+        logger.info("Initiating Async Downloading")
+        logger.info(f"Downloading files into {self.output_dir}")
+
+        # Songs are looked up a batch at a time as they are listed
+        self._load_indexed([])
+        self.song_list_complete.clear()
+        self.pipeline = pipeline = self._new_pipeline()
+
+        # Listing never waits for the pipeline, tagging waits for the listing
+        listed: asyncio.Queue[Optional[SongObj]] = asyncio.Queue()
+        listing = asyncio.ensure_future(self._list_songs(song_obj_iter, listed))
+
+        async def feed() -> None:
+            while True:
+                # The songs listed while the pipeline was busy are looked up
+                # in the library in one query
+                batch = [await listed.get()]
+                while not listed.empty():
+                    batch.append(listed.get_nowait())
+                song_objs = [song_obj for song_obj in batch if song_obj is not None]
+                self._add_indexed(song_objs)
+
+                for song_obj in song_objs:
+                    await pipeline.stages[0].put(self._new_job(song_obj))
+                if batch[-1] is None:
+                    break
+
+            # Raise listing errors once the songs listed so far are queued
+            await listing
+
+        try:
+            await pipeline.run_from(feed())
+        finally:
+            # Cancelled, stop listing too
+            listing.cancel()
+
+    async def _list_songs(
+        self,
+        song_obj_iter: Iterable[SongObj],
+        listed: "asyncio.Queue[Optional[SongObj]]",
+    ) -> None:
+        """Put the songs of an iterator into a queue, ``None`` at the end.
+
+        Args:
+            song_obj_iter: Songs to be downloaded.
+            listed: Queue of the listed songs.
+        """
+
+        song_obj_iter = iter(song_obj_iter)
+        count = 0
+
+        try:
+            while True:
+                # Parsing waits on the network, so it runs in a thread too
+                song_obj = await self.loop.run_in_executor(
+                    None, next, song_obj_iter, None
+                )
+                if song_obj is None:
+                    break
+
+                self.downloadTracker.add_song(song_obj)
+                self._warm_cover_art([song_obj])
+                listed.put_nowait(song_obj)
+                count += 1
+        finally:
+            self.song_list_complete.set()
+            listed.put_nowait(None)
+
+            # Every song is listed, back up the ones still to be downloaded
+            self.downloadTracker.load_song_list(self.downloadTracker.get_song_list())
+            self.displayManager.set_song_count_to(count)
+
+
+class _SongJob:
+    """Represents a song on its way through the pipeline."""
+
+    def __init__(self, song_obj: SongObj, displayProgressTracker: Any) -> None:
+        self.song_obj = song_obj
+        self.displayProgressTracker = displayProgressTracker
+        self.output_file_path = Path()
@@ -8,14 +8,54 @@ Using the ``requests`` module.
 import json
 import logging
 import re
-from typing import Any  # For static type checking
+import threading
+import time
+from typing import Any, Iterator, Optional  # For static type checking
+from urllib.parse import urlsplit
 
 import requests
 from bs4 import BeautifulSoup
-from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (
+    ChunkedEncodingError,
+    ConnectionError,
+    HTTPError,
+    RequestException,
+    Timeout,
+)
+
+from .cache import HTTPCache
+from .cassette import Cassette, CassetteAdapter
+from .json_stream import iter_json_object
+from .retry import CircuitBreaker, RetryPolicy
 
 logger = logging.getLogger(__name__)
 
+# Shared session, all the requests go through it so that the TCP/TLS
+# connections to Saavn and its CDN hosts are kept alive and reused.
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# Cassette recording or replaying the requests of the shared session
+_cassette: Optional[Cassette] = None
+
+# Retry policy and per-host circuit breaker applied to every request
+_retry_policy = RetryPolicy()
+_circuit_breaker = CircuitBreaker()
+
+# Marks the script holding the page data in the Saavn web pages
+_INITIAL_DATA_MARKER = b"window.__INITIAL_DATA__"
+
+# JS-isms in the page data that aren't valid JSON
+_JS_ISMS = ("new Date(", "undefined", "//")
+
+# On-disk cache of Saavn pages and API responses, disabled unless configured
+_http_cache: Optional[HTTPCache] = None
+
+# Results of HEAD probes, so that a URL is probed once per run
+_head_results: dict[str, bool] = {}
+_head_lock = threading.Lock()
+
 
 def _get_headers() -> dict[str, str]:
     """Returns fake headers.
@@ -29,6 +69,7 @@ def _get_headers() -> dict[str, str]:
         "Accept-Charset": "UTF-8,*;q=0.5",
         "Accept-Encoding": "gzip,deflate,sdch",
         "Accept-Language": "en-US,en;q=0.8",
+        "Connection": "keep-alive",
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
             " AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.74"
@@ -39,44 +80,513 @@ def _get_headers() -> dict[str, str]:
     return headers
 
 
-def http_get(url: str, stream: bool = False) -> Any:
+def _new_session(pool_connections: int, pool_maxsize: int) -> requests.Session:
+    """Returns a new session with pooled keep-alive connections.
+
+    Args:
+        pool_connections: Number of per-host connection pools to keep.
+        pool_maxsize: Maximum number of connections kept alive per host.
+
+    Returns:
+        A new ``requests.Session``.
+    """
+
+    session = requests.Session()
+    session.headers.update(_get_headers())
+
+    if _cassette is not None:
+        adapter: HTTPAdapter = CassetteAdapter(
+            _cassette, pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+    else:
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    logger.debug(
+        f"HTTP session: {pool_connections} host pools, {pool_maxsize} connections each"
+    )
+    return session
+
+
+def configure_session(
+    pool_connections: int = 10, pool_maxsize: int = 10
+) -> requests.Session:
+    """Create the shared HTTP session used by all requests.
+
+    Connections are pooled per host (jiosaavn.com, the saavncdn hosts, ...)
+    and kept alive between requests. Any previously created session is closed.
+
+    Args:
+        pool_connections: Number of per-host connection pools to keep.
+        pool_maxsize: Maximum number of connections kept alive per host.
+
+    Returns:
+        The new shared ``requests.Session``.
+    """
+
+    global _session
+
+    session = _new_session(pool_connections, pool_maxsize)
+
+    with _session_lock:
+        old_session, _session = _session, session
+
+    if old_session is not None:
+        old_session.close()
+
+    return session
+
+
+def get_session() -> requests.Session:
+    """Returns the shared HTTP session, creating it with defaults if needed."""
+
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = _new_session(10, 10)
+
+        return _session
+
+
+def close_session() -> None:
+    """Close the shared HTTP session and all of its pooled connections."""
+
+    global _session
+
+    with _session_lock:
+        old_session, _session = _session, None
+
+    if old_session is not None:
+        old_session.close()
+
+
+def configure_cassette(
+    path: Optional[str], mode: str = "replay", speed: float = 1.0
+) -> Optional[Cassette]:
+    """Record the requests into a cassette, or replay them from it.
+
+    Sessions created from now on go through the cassette, so it has to be
+    configured before :func:`configure_session`. Other sessions, such as the
+    Genius client's, are added with :func:`mount_cassette`.
+
+    Args:
+        path: Path of the cassette file, ``None`` disables it.
+        mode: ``record`` or ``replay``.
+        speed: Replay this many times faster than recorded.
+
+    Returns:
+        The cassette, to be closed once all requests are done.
+    """
+
+    global _cassette
+
+    _cassette = Cassette(path, mode, speed) if path else None
+    return _cassette
+
+
+def mount_cassette(session: requests.Session) -> None:
+    """Send the requests of a session through the cassette, if one is configured.
+
+    Args:
+        session: A ``requests.Session``.
+    """
+
+    cassette = _cassette
+    if cassette is None:
+        return None
+
+    adapter = CassetteAdapter(cassette)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def configure_retries(
+    retries: int = 3,
+    backoff_factor: float = 0.5,
+    breaker_threshold: int = 5,
+    breaker_cooldown: float = 30.0,
+) -> None:
+    """Set the retry policy and circuit breaker used by :func:`http_get`.
+
+    Args:
+        retries: Number of retries after the first attempt.
+        backoff_factor: Base delay in seconds, doubled for every retry.
+        breaker_threshold: Consecutive failures that open a host's circuit.
+        breaker_cooldown: Seconds before a failing host is tried again.
+    """
+
+    global _retry_policy, _circuit_breaker
+
+    _retry_policy = RetryPolicy(retries=retries, backoff_factor=backoff_factor)
+    _circuit_breaker = CircuitBreaker(
+        threshold=breaker_threshold, cooldown=breaker_cooldown
+    )
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Returns the retry policy used by :func:`http_get`."""
+
+    return _retry_policy
+
+
+def http_get(
+    url: str,
+    stream: bool = False,
+    headers: Optional[dict[str, str]] = None,
+    retry: bool = True,
+) -> Any:
     """Get the content of a URL via sending a HTTP GET request.
 
+    The request goes through the shared session (see :func:`get_session`).
+    When ``stream`` is enabled the caller must consume or close the response,
+    otherwise its connection is not released back to the pool.
+
+    Connection errors, timeouts, throttling and 5xx responses are retried
+    with backoff (see :func:`configure_retries`). Hosts that keep failing
+    are not requested again until their cooldown has passed.
+
     Args:
         url: URL that needs to be requested.
         stream: Enable stream if ``True``.
+        headers: Extra headers for this request, such as ``Range``.
+        retry: Retry failed requests, ``False`` if the caller retries them.
 
     Returns:
         ``requests.Response`` if ``stream`` is enabled else returns Response content.
 
     Raises:
         RequestException: An error occurred requesting the URL.
+        CircuitOpenError: The host of the URL keeps failing.
+    """
+
+    host = urlsplit(url).netloc
+    attempt = 0
+
+    while True:
+        _circuit_breaker.before_request(host)
+
+        try:
+            logger.debug(f"REQUESTING URL: {url}")
+            res = get_session().get(url, headers=headers, stream=stream, timeout=20)
+
+            if retry and _retry_policy.should_retry(attempt, res.status_code):
+                delay = _retry_policy.get_delay(attempt, res)
+                logger.warning(
+                    f"HTTP {res.status_code}, retrying in {delay:.1f}s: {url}"
+                )
+
+                # Throttling isn't an outage
+                if res.status_code != 429:
+                    _circuit_breaker.record_failure(host)
+
+                res.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            # Raise a requests.exceptions.HTTPError exception
+            # If response status code is 4xx or 5xx.
+            res.raise_for_status()
+
+            content = res if stream else res.content
+
+        except HTTPError as e:
+            if e.response is not None and e.response.status_code >= 500:
+                _circuit_breaker.record_failure(host)
+            logger.error(f"FAILED URL: {url}")
+            raise
+
+        except (ConnectionError, Timeout, ChunkedEncodingError) as e:
+            _circuit_breaker.record_failure(host)
+
+            if not retry or not _retry_policy.should_retry(attempt):
+                logger.error(f"FAILED URL: {url}")
+                raise
+
+            delay = _retry_policy.get_delay(attempt)
+            logger.warning(f"{e!r}, retrying in {delay:.1f}s: {url}")
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        _circuit_breaker.record_success(host)
+        return content
+
+
+def configure_cache(cache_dir: Optional[str], ttl: float, max_size: int) -> None:
+    """Set the on-disk cache used by :func:`http_get_cached`.
+
+    Args:
+        cache_dir: Directory of the cache, ``None`` disables caching.
+        ttl: Seconds a response is used without revalidating it.
+        max_size: Maximum size of the cache in bytes.
+    """
+
+    global _http_cache
+
+    _http_cache = HTTPCache(cache_dir, ttl, max_size) if cache_dir else None
+
+
+def http_get_cached(url: str, revalidate: bool = False) -> bytes:
+    """Get the content of a URL, using the on-disk cache if configured.
+
+    A fresh cached response costs no request at all, an expired one is
+    revalidated with a conditional request.
+
+    Args:
+        url: URL that needs to be requested.
+        revalidate: Revalidate the cached response even if it is fresh.
+
+    Returns:
+        Response content.
+
+    Raises:
+        RequestException: An error occurred requesting the URL.
+    """
+
+    cache = _http_cache
+    if cache is None:
+        return http_get(url)
+
+    entry = cache.get(url)
+    if entry and not revalidate and entry.is_fresh():
+        logger.debug(f"CACHED URL: {url}")
+        return entry.body
+
+    headers = entry.get_validators() if entry else {}
+    with http_get(url, stream=True, headers=headers) as response:
+        if entry and response.status_code == 304:
+            logger.debug(f"REVALIDATED URL: {url}")
+            cache.refresh(url, entry)
+            return entry.body
+
+        content: bytes = response.content
+
+    cache.put(url, content, response.headers)
+    return content
+
+
+def http_head_exists(url: str) -> bool:
+    """Returns whether a URL exists, asking the server with a HEAD request.
+
+    Answers are kept for the run and in the on-disk cache if configured.
+    Errors count as missing, but aren't kept.
+
+    Args:
+        url: URL that needs to be probed.
+    """
+
+    with _head_lock:
+        exists = _head_results.get(url)
+    if exists is not None:
+        return exists
+
+    cache = _http_cache
+    key = f"HEAD {url}"
+    entry = cache.get(key) if cache else None
+
+    if entry and entry.is_fresh():
+        exists = entry.body == b"1"
+    else:
+        try:
+            logger.debug(f"PROBING URL: {url}")
+            res = get_session().head(url, timeout=10, allow_redirects=True)
+        except RequestException as e:
+            logger.debug(f"{e!r}, probe failed: {url}")
+            return False
+
+        if res.status_code >= 500 or res.status_code == 429:
+            return False
+
+        exists = res.ok
+        if cache:
+            cache.put(key, b"1" if exists else b"0", res.headers)
+
+    with _head_lock:
+        _head_results[url] = exists
+
+    return exists
+
+
+def http_iter_cached(
+    url: str, chunk_size: int = 64 * 1024, revalidate: bool = False
+) -> Iterator[bytes]:
+    """Get the content of a URL in chunks, using the on-disk cache if configured.
+
+    Like :func:`http_get_cached`, but the chunks are yielded as they arrive
+    instead of after the whole response was read.
+
+    Args:
+        url: URL that needs to be requested.
+        chunk_size: Number of bytes read at a time from the network.
+        revalidate: Revalidate the cached response even if it is fresh.
+
+    Yields:
+        Chunks of the response content.
+
+    Raises:
+        RequestException: An error occurred requesting the URL.
+    """
+
+    cache = _http_cache
+    entry = cache.get(url) if cache else None
+
+    if entry and not revalidate and entry.is_fresh():
+        logger.debug(f"CACHED URL: {url}")
+        yield entry.body
+        return None
+
+    headers = entry.get_validators() if entry else {}
+    with http_get(url, stream=True, headers=headers) as response:
+        if cache and entry and response.status_code == 304:
+            logger.debug(f"REVALIDATED URL: {url}")
+            cache.refresh(url, entry)
+            yield entry.body
+            return None
+
+        chunks = []
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if cache:
+                chunks.append(chunk)
+            yield chunk
+
+    if cache:
+        cache.put(url, b"".join(chunks), response.headers)
+
+
+def extract_initial_data(html_content: bytes) -> Optional[dict[str, Any]]:
+    """Extract the ``window.__INITIAL_DATA__`` object from a Saavn web page.
+
+    Scans the raw bytes for the assignment instead of parsing the whole
+    page, then replaces the JS-isms (``new Date(...)``, ``undefined`` and
+    comments) in a single pass. ``null`` values become empty strings, like
+    :func:`_extract_initial_data_with_soup` does.
+
+    Args:
+        html_content: The Saavn web page.
+
+    Returns:
+        The extracted json data, ``None`` if the assignment wasn't found.
+
+    Raises:
+        JSONDecodeError: An error occurred loading json data.
     """
 
-    try:
-        logger.debug(f"REQUESTING URL: {url}")
-        res = requests.get(url, headers=_get_headers(), stream=stream, timeout=20)
+    marker = html_content.find(_INITIAL_DATA_MARKER)
+    if marker == -1:
+        return None
+
+    start = html_content.find(b"=", marker + len(_INITIAL_DATA_MARKER)) + 1
+    end = html_content.find(b"</script>", start)
+    if not start or end == -1:
+        return None
+
+    script_string = _replace_js_isms(html_content[start:end].decode("utf-8"))
+
+    return json.loads(script_string.strip().rstrip(";"), object_hook=_null_to_empty)
+
+
+def _replace_js_isms(script_string: str) -> str:
+    """Returns the script with its JS-isms replaced by JSON.
+
+    ``new Date(...)`` and ``undefined`` values become ``""`` and comment lines
+    are dropped. Occurrences inside strings are left alone: a value follows a
+    ``:``, ``,`` or ``[`` and a comment starts its own line.
+
+    Args:
+        script_string: The object literal assigned to ``window.__INITIAL_DATA__``.
+    """
+
+    parts = []
+    copied = 0
+    found = {token: script_string.find(token) for token in _JS_ISMS}
+
+    while True:
+        positions = [(index, token) for token, index in found.items() if index != -1]
+        if not positions:
+            break
+
+        index, token = min(positions)
 
-        # Raise a requests.exceptions.HTTPError exception
-        # If response status code is 4xx or 5xx.
-        res.raise_for_status()
+        # Last character before the token that isn't blank
+        previous = index - 1
+        while previous >= 0 and script_string[previous] in " \t\r":
+            previous -= 1
+        before = script_string[previous] if previous >= 0 else "\n"
 
-        if not stream:
-            return res.content
+        if token == "//":
+            end = script_string.find("\n", index)
+            end = len(script_string) if end == -1 else end
+            replacement = ""
+            is_js_ism = before == "\n"
+        else:
+            end = index + len(token)
+            if token == "new Date(":
+                end = script_string.find(")", end) + 1
+            replacement = '""'
+            is_js_ism = before in ":,[\n" and end > index
 
-        return res
+        if is_js_ism:
+            parts.append(script_string[copied:index])
+            parts.append(replacement)
+            copied = end
 
-    except RequestException as e:
-        logger.exception(e)
+        found[token] = script_string.find(token, max(end, index + 1))
 
-    return None
+    parts.append(script_string[copied:])
+    return "".join(parts)
 
 
-def get_json_data_from_website(url: str) -> dict[str, Any]:
+def _null_to_empty(json_dict: dict[str, Any]) -> dict[str, Any]:
+    """Returns the dict with ``None`` values replaced by empty strings."""
+
+    for key, value in json_dict.items():
+        if value is None:
+            json_dict[key] = ""
+
+    return json_dict
+
+
+def _extract_initial_data_with_soup(html_content: bytes) -> dict[str, Any]:
+    """Extract the ``window.__INITIAL_DATA__`` object by parsing the whole page.
+
+    Slow fallback for pages :func:`extract_initial_data` can't handle.
+
+    Args:
+        html_content: The Saavn web page.
+
+    Returns:
+        The extracted json data.
+
+    Raises:
+        JSONDecodeError: An error occurred loading json data.
+    """
+
+    soup = BeautifulSoup(html_content, features="html.parser")
+
+    script_string = soup.find_all("script")[4].string
+    raw_object = (
+        re.sub(re.compile(r"//.*?\n"), "", script_string)
+        .replace("window.__INITIAL_DATA__ = ", "")
+        .replace("\n", "")
+        .replace("undefined", '""')
+        .replace("null", '""')
+    )
+    raw_object = re.sub(re.compile(r"new Date\(.*?\)"), '""', raw_object)
+
+    return json.loads(raw_object)
+
+
+def get_json_data_from_website(url: str, revalidate: bool = False) -> dict[str, Any]:
     """Extract the json data from the Saavn Website.
 
     Args:
         url: URL of a song, an album, or a playlist.
+        revalidate: Revalidate the cached page even if it is fresh.
 
     Returns:
         The extracted json data.
@@ -86,23 +596,22 @@ def get_json_data_from_website(url: str) -> dict[str, Any]:
     """
 
     # Get the HTML page
-    html_content = http_get(url)
+    html_content = http_get_cached(url, revalidate=revalidate)
 
     if html_content:
         logger.info("Extracting information from Saavn")
-        soup = BeautifulSoup(html_content, features="html.parser")
-
-        script_string = soup.find_all("script")[4].string
-        raw_object = (
-            re.sub(re.compile(r"//.*?\n"), "", script_string)
-            .replace("window.__INITIAL_DATA__ = ", "")
-            .replace("\n", "")
-            .replace("undefined", '""')
-            .replace("null", '""')
-        )
-        raw_object = re.sub(re.compile(r"new Date\(.*?\)"), '""', raw_object)
 
-        return json.loads(raw_object)
+        try:
+            json_data = extract_initial_data(html_content)
+        except ValueError as e:
+            logger.debug(f"Fast extraction failed: {e}")
+            json_data = None
+
+        if json_data is None:
+            logger.debug("Extracting information with BeautifulSoup")
+            json_data = _extract_initial_data_with_soup(html_content)
+
+        return json_data
 
     raise ValueError("Failed to fetch the Saavn web page")
 
@@ -117,22 +626,38 @@ def get_json_data_from_api(url: str) -> dict[str, Any]:
         The extracted json data.
 
     Raises:
-        JSONDecodeError: An error occurred loading json data.
-        ValueError: An error occurred getting songs information.
+        JSONDecodeError: An error occurred loading json data, or the response
+            has no json data.
     """
 
-    # Get the content from the URL
-    logger.info("Fetching songs details")
-    content = http_get(url)
+    return dict(iter_json_data_from_api(url, stream_keys=()))
 
-    if content:
-        # Extract JSON data from the content
-        raw_json_details = list(
-            filter(lambda x: x.startswith("{"), content.decode("utf-8").splitlines())
-        )
 
-        # Load the JSON data as a dict
-        if raw_json_details:
-            return json.loads(raw_json_details[0])
+def iter_json_data_from_api(
+    url: str, stream_keys: tuple[str, ...] = ("songs",), revalidate: bool = False
+) -> Iterator[tuple[str, Any]]:
+    """Get the json data from URL, yielding it as it is parsed.
+
+    The response is parsed while it is downloaded, and the songs of an album
+    or a playlist are yielded one at a time, so they can be downloaded before
+    the whole response was read.
+
+    Args:
+        url: URL of a song, an album, or a playlist.
+        stream_keys: Keys of arrays whose items are yielded one at a time.
+        revalidate: Revalidate the cached response even if it is fresh.
+
+    Yields:
+        ``(key, value)`` of each member of the json data, see
+        :func:`musicDL.json_stream.iter_json_object`.
+
+    Raises:
+        JSONDecodeError: An error occurred loading json data, or the response
+            has no json data.
+    """
 
-    raise ValueError("Failed in getting songs information")
+    # Get the content from the URL
+    logger.info("Fetching songs details")
+    yield from iter_json_object(
+        http_iter_cached(url, revalidate=revalidate), stream_keys
+    )
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+Incremental JSON parsing
+
+Walks the top-level JSON object of a byte stream and yields its members as
+soon as they are complete, so large API responses are neither decoded nor
+parsed in one go. The items of selected arrays (such as the songs of a
+playlist) are yielded one at a time.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator  # For static type checking
+
+_WHITESPACE = " \t\n\r"
+
+# Characters that start or end a string, an array or an object
+_DELIMITERS = re.compile(r'[][{}"\\]')
+
+
+class _JSONStream:
+    """Represents a buffer of decoded text that is refilled from byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read(self) -> bool:
+        """Append the next chunk to the buffer, ``False`` at the end of the stream."""
+
+        if self.eof:
+            return False
+
+        # Drop what was parsed already, so the buffer holds one member at most
+        if self.pos > len(self.buffer) // 2:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.buffer += self._decoder.decode(b"", final=True)
+            self.eof = True
+        else:
+            self.buffer += self._decoder.decode(chunk)
+
+        return True
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def seek_object(self) -> None:
+        """Skip to the first line starting with ``{``, the start of the JSON."""
+
+        while True:
+            if self.buffer.startswith("{", self.pos):
+                return None
+
+            index = self.buffer.find("\n{", self.pos)
+            if index != -1:
+                self.pos = index + 1
+                return None
+
+            # Keep a trailing newline, the next chunk may start with "{"
+            self.pos = max(self.pos, len(self.buffer) - 1)
+            if not self.read():
+                raise self.error("Expecting JSON object")
+
+    def peek(self) -> str:
+        """Returns the next character that isn't whitespace, without consuming it."""
+
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self.read():
+                raise self.error("Unexpected end of JSON")
+
+    def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of ``chars``."""
+
+        char = self.peek()
+        if char not in chars:
+            raise self.error(f"Expecting one of {chars!r}")
+
+        self.pos += 1
+        return char
+
+    def read_value(self) -> None:
+        """Read until the string, array or object at the position is complete.
+
+        The brackets and quotes are counted as the chunks arrive, so that a
+        value split over many chunks is decoded once rather than on every
+        chunk. Other values are short and read by :meth:`value`.
+        """
+
+        if self.peek() not in '"[{':
+            return None
+
+        depth = 0
+        in_string = False
+        # Offsets from the position, which moves when the buffer is refilled
+        scanned = 0
+        escaped_until = 0
+
+        while True:
+            for match in _DELIMITERS.finditer(self.buffer, self.pos + scanned):
+                index = match.start() - self.pos
+                char = match.group()
+                if index < escaped_until:
+                    continue
+
+                if char == "\\":
+                    escaped_until = index + 2
+                elif char == '"':
+                    in_string = not in_string
+                elif in_string:
+                    continue
+                elif char in "[{":
+                    depth += 1
+                else:
+                    depth -= 1
+
+                if depth <= 0 and not in_string:
+                    return None
+
+            scanned = len(self.buffer) - self.pos
+            # The decoder raises on the incomplete value
+            if not self.read():
+                return None
+
+    def value(self) -> Any:
+        """Parse the next complete JSON value."""
+
+        self.read_value()
+
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.read():
+                    raise
+                continue
+
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.read():
+                continue
+
+            self.pos = end
+            return value
+
+
+def iter_json_object(
+    chunks: Iterable[bytes], stream_keys: Iterable[str] = ()
+) -> Iterator[tuple[str, Any]]:
+    """Yields the members of the JSON object in a byte stream as they are parsed.
+
+    Anything before the first line starting with ``{`` is skipped.
+
+    Args:
+        chunks: The byte stream, such as ``requests.Response.iter_content()``.
+        stream_keys: Keys of arrays whose items are yielded one at a time, as
+            ``(key, item)``, instead of as a whole.
+
+    Yields:
+        ``(key, value)`` of each member of the object.
+
+    Raises:
+        JSONDecodeError: The stream isn't a valid JSON object.
+    """
+
+    stream_keys = frozenset(stream_keys)
+    stream = _JSONStream(chunks)
+    stream.seek_object()
+    stream.expect("{")
+
+    if stream.peek() == "}":
+        return None
+
+    while True:
+        key = stream.value()
+        if not isinstance(key, str):
+            raise stream.error("Expecting property name")
+        stream.expect(":")
+
+        if key in stream_keys and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield key, stream.value()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            yield key, stream.value()
+
+        if stream.expect(",}") == "}":
+            return None
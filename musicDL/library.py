@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Library index
+
+Records every completed download in a SQLite database: the Saavn song ID,
+quality and format it was downloaded in, with the path, size and SHA-256 of
+the file. Whether a song was downloaded before is then an indexed lookup,
+done for a whole album or playlist at once, rather than a ``stat`` of a
+file name that changes with the title, quality or format.
+
+The track lists of synced albums and playlists are kept too, so that the
+next sync only downloads the tracks added since.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional  # For static type checking
+
+logger = logging.getLogger(__name__)
+
+# SQLite's limit on the number of parameters of a query is 999 in old versions
+_MAX_QUERY_IDS = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    song_id TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    format TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    added REAL NOT NULL,
+    PRIMARY KEY (song_id, quality, format)
+);
+CREATE TABLE IF NOT EXISTS synced_tracks (
+    list_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    song_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    PRIMARY KEY (list_id, position)
+);
+"""
+
+
+def get_file_hash(path: Path) -> str:
+    """Returns the SHA-256 of a file, as hex."""
+
+    digest = hashlib.sha256()
+    with path.open("rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class LibraryIndex:
+    """Represents the index of the downloaded songs."""
+
+    def __init__(self, path: str) -> None:
+        """Initialize `LibraryIndex`.
+
+        Args:
+            path: Path of the SQLite database, created if missing.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Used from the event loop and from the thread pool
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get(self, song_id: str, quality: str, output_format: str) -> Optional[Path]:
+        """Returns the path a song was downloaded to, ``None`` if it wasn't."""
+
+        return self.get_many([song_id], quality, output_format).get(song_id)
+
+    def get_many(
+        self, song_ids: Iterable[str], quality: str, output_format: str
+    ) -> dict[str, Path]:
+        """Returns the paths of the songs that were downloaded, by song ID.
+
+        Args:
+            song_ids: Saavn IDs of the songs, such as those of a playlist.
+            quality: Quality the songs are downloaded in.
+            output_format: Format the songs are converted to, empty for none.
+        """
+
+        unique_ids = list(dict.fromkeys(song_ids))
+        paths: dict[str, Path] = {}
+
+        with self._lock:
+            for start in range(0, len(unique_ids), _MAX_QUERY_IDS):
+                batch = unique_ids[start : start + _MAX_QUERY_IDS]
+                rows = self._connection.execute(
+                    "SELECT song_id, path FROM songs"
+                    " WHERE quality = ? AND format = ?"
+                    f" AND song_id IN ({', '.join('?' * len(batch))})",
+                    [quality.lower(), output_format.lower(), *batch],
+                )
+                paths.update((song_id, Path(path)) for song_id, path in rows)
+
+        return paths
+
+    def add(self, song_id: str, quality: str, output_format: str, path: Path) -> None:
+        """Record a completed download.
+
+        Args:
+            song_id: Saavn ID of the song.
+            quality: Quality the song was downloaded in.
+            output_format: Format the song was converted to, empty for none.
+            path: Path of the downloaded file.
+        """
+
+        size = path.stat().st_size
+        sha256 = get_file_hash(path)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    song_id,
+                    quality.lower(),
+                    output_format.lower(),
+                    str(path.resolve()),
+                    size,
+                    sha256,
+                    time.time(),
+                ],
+            )
+
+        logger.debug(f"Indexed {song_id} ({quality}, {output_format}): {path}")
+
+    def remove(self, song_id: str, quality: str, output_format: str) -> None:
+        """Forget a download, such as one whose file is gone."""
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM songs WHERE song_id = ? AND quality = ? AND format = ?",
+                [song_id, quality.lower(), output_format.lower()],
+            )
+
+    def get_synced_tracks(self, list_id: str) -> Optional[list[tuple[str, str]]]:
+        """Returns the tracks of an album or playlist seen by the last sync.
+
+        Args:
+            list_id: ID of the album or playlist, see
+                :func:`musicDL.services.saavn.extract_saavn_list_id`.
+
+        Returns:
+            Song IDs and titles in track order, ``None`` if it was never synced.
+        """
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT position, song_id, title FROM synced_tracks"
+                " WHERE list_id = ? ORDER BY position",
+                [list_id],
+            ).fetchall()
+
+        # The marker row at position -1 is there once the list was synced
+        if not rows:
+            return None
+        return [(song_id, title) for position, song_id, title in rows if position >= 0]
+
+    def set_synced_tracks(self, list_id: str, tracks: list[tuple[str, str]]) -> None:
+        """Record the tracks of an album or playlist seen by a sync.
+
+        Args:
+            list_id: ID of the album or playlist.
+            tracks: Song IDs and titles in track order.
+        """
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM synced_tracks WHERE list_id = ?", [list_id]
+            )
+            # Marks the list as synced, even with no tracks
+            self._connection.executemany(
+                "INSERT INTO synced_tracks VALUES (?, ?, ?, ?)",
+                [(list_id, -1, "", "")]
+                + [
+                    (list_id, position, song_id, title)
+                    for position, (song_id, title) in enumerate(tracks)
+                ],
+            )
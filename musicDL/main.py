@@ -2,41 +2,169 @@
 """
 Main entry point for the `musicDL` command.
 
-Download music.
+Download music. Any number of URLs and trackingfiles are downloaded by one
+download manager, the songs of all the URLs going through one pipeline.
+``serve`` keeps the download manager running for the jobs submitted to the
+job server.
 """
 
 import logging
 import signal
 import sys
-from typing import Any  # For static type checking
+import time
+from contextlib import nullcontext
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Optional,
+    Union,
+)  # For static type checking
 
+from .cassette import Cassette
 from .config import Config
+from .cover_art import configure_cover_cache
 from .downloader import DownloadManager
-from .handle_requests import get_json_data_from_api, get_json_data_from_website
+from .handle_requests import (
+    close_session,
+    configure_cache,
+    configure_cassette,
+    configure_retries,
+    configure_session,
+    get_json_data_from_website,
+    iter_json_data_from_api,
+    mount_cassette,
+)
 from .services import ffmpeg
-from .services.saavn import extract_saavn_api_url, parse_request
+from .services.lyrics import genius
+from .server import JobServer, JobStore, load_token
+from .services.saavn import (
+    extract_saavn_api_url,
+    extract_saavn_list_id,
+    parse_request,
+)
 from .SongObj import SongObj
+from .sync import PlaylistSync
 
 logger = logging.getLogger(__name__)
 
 
-def musicDL(request: str) -> None:
+def _iter_songs(
+    requests: list[tuple[str, str]],
+    sync: Optional[PlaylistSync] = None,
+    quality: Optional[str] = None,
+) -> Iterator[SongObj]:
+    """Yields the songs of song/album/playlist URLs, each song once.
+
+    Args:
+        requests: URLs and their types.
+        sync: Only yield the album and playlist tracks added since the last sync.
+        quality: Audio quality, the configured one by default.
+    """
+
+    song_ids = set()
+
+    for request, request_type in requests:
+        # A fresh cached track list may miss the tracks added since, so the
+        # listing being synced is always revalidated with the server
+        revalidate = bool(sync) and request_type in ("album", "playlist")
+
+        # Ger JSON data from the Saavn web page
+        raw_json_data = get_json_data_from_website(request, revalidate=revalidate)
+
+        # Extract API URL from the extracted JSON data
+        api_url = extract_saavn_api_url(request_type, raw_json_data)
+
+        # Get the songs data from the API, parsed while it is downloaded
+        raw_songs_items = iter_json_data_from_api(api_url, revalidate=revalidate)
+
+        # Get songObjs based on URL type and audio quality, the first
+        # songs start downloading before the rest are parsed
+        song_objs = SongObj.from_raw_stream(raw_songs_items, request_type, quality)
+        if sync and request_type in ("album", "playlist"):
+            song_objs = sync.filter(
+                extract_saavn_list_id(request_type, raw_json_data), song_objs
+            )
+
+        for song_obj in song_objs:
+            # The same song on two albums or playlists is downloaded once
+            song_id = song_obj.get_song_id_saavn()
+            if song_id in song_ids:
+                logger.info(f"Skipping duplicate song {song_obj.get_title()}")
+                continue
+
+            song_ids.add(song_id)
+            yield song_obj
+
+
+def _configure() -> Optional[Cassette]:
+    """Set up ffmpeg, the HTTP session and the caches from the config.
+
+    Returns:
+        The cassette recording or replaying the HTTP traffic, if any.
+    """
+
+    if Config.get_config("output-format"):
+        if not ffmpeg.has_correct_version(
+            Config.get_config("ignore-ffmpeg-version"), Config.get_config("ffmpeg")
+        ):
+            sys.exit(1)
+
+    # Record or replay all the HTTP traffic, Saavn, its CDN and Genius
+    cassette = configure_cassette(
+        Config.get_config("cassette") or None,
+        mode=Config.get_config("cassette-mode"),
+        speed=Config.get_config("cassette-speed"),
+    )
+    mount_cassette(genius._session)
+
+    # One pooled keep-alive session is shared by every request, with enough
+    # connections per CDN host for every segment of every song in flight
+    configure_session(
+        Config.get_config("pool-connections"),
+        max(
+            Config.get_config("pool-maxsize"),
+            Config.get_config("max-concurrency") * Config.get_config("segments"),
+        ),
+    )
+
+    # Retry transient failures, fail fast on hosts that are down
+    configure_retries(
+        retries=Config.get_config("retries"),
+        backoff_factor=Config.get_config("backoff-factor"),
+        breaker_threshold=Config.get_config("breaker-threshold"),
+        breaker_cooldown=Config.get_config("breaker-cooldown"),
+    )
+
+    # Repeated runs of the same URL reuse the cached pages and API responses
+    configure_cache(
+        None if Config.get_config("no-cache") else Config.get_config("cache-dir"),
+        ttl=Config.get_config("cache-ttl"),
+        max_size=Config.get_config("cache-size"),
+    )
+
+    # Tracks of one album share their cover image
+    configure_cover_cache(Config.get_config("cover-cache-size"))
+
+    return cassette
+
+
+def musicDL(requests: Union[str, Iterable[str]]) -> None:
     """Download songs from Saavn.
 
     Args:
-        request: URL of song/album/playlist or trackingfile path.
+        requests: URLs of songs/albums/playlists or trackingfile paths.
     """
 
-    try:
+    if isinstance(requests, str):
+        requests = [requests]
 
-        if Config.get_config("output-format"):
-            if not ffmpeg.has_correct_version(
-                Config.get_config("ignore-ffmpeg-version"), Config.get_config("ffmpeg")
-            ):
-                sys.exit(1)
+    try:
+        cassette = _configure()
 
-        # The download manager takes output path as argument
-        with DownloadManager() as downloader:
+        # The download manager takes output path as argument, the cassette is
+        # saved even if the download fails or is interrupted
+        with cassette or nullcontext(), DownloadManager() as downloader:
 
             def gracefulExit(signal: int, frame: Any) -> None:
                 downloader.displayManager.close()
@@ -45,31 +173,52 @@ def musicDL(request: str) -> None:
             signal.signal(signal.SIGINT, gracefulExit)
             signal.signal(signal.SIGTERM, gracefulExit)
 
-            request_type = parse_request(request)
-            logger.info(f"Type: {request_type}")
+            # Invalid requests fail before anything is downloaded
+            batch = [
+                (request, parse_request(request)) for request in dict.fromkeys(requests)
+            ]
 
-            if request_type == "trackingfile":
-                print("Preparing to resume download...")
-                downloader.resume_download_from_tracking_file(request)
-            else:
-                print(f"Fetching {request_type.capitalize()}...")
+            urls = []
+            for request, request_type in batch:
+                logger.info(f"Type: {request_type}")
 
-                # Ger JSON data from the Saavn web page
-                raw_json_data = get_json_data_from_website(request)
-
-                # Extract API URL from the extracted JSON data
-                api_url = extract_saavn_api_url(request_type, raw_json_data)
+                if request_type == "trackingfile":
+                    print("Preparing to resume download...")
+                    downloader.resume_download_from_tracking_file(request)
+                else:
+                    print(f"Fetching {request_type.capitalize()}...")
+                    urls.append((request, request_type))
 
-                # Get the songs data from the API
-                raw_songs_dict = get_json_data_from_api(api_url)
+            if urls and Config.get_config("only-tagging"):
+                downloader.set_tags_for_songs(list(_iter_songs(urls)))
+            elif urls:
+                sync = None
+                if Config.get_config("sync"):
+                    if downloader.library is None:
+                        print("Syncing needs the library index, downloading all")
+                    else:
+                        sync = PlaylistSync(downloader.library)
 
-                # Get songObj list based on URL type and audio quality
-                songs_obj_list = SongObj.from_raw_dict(raw_songs_dict, request_type)
+                songs_obj_iter = _iter_songs(urls, sync)
 
-                if Config.get_config("only-tagging"):
-                    downloader.set_tags_for_songs(songs_obj_list)
+                if len(urls) > 1:
+                    # One trackingfile for all the songs still to be downloaded
+                    downloader.download_songs(
+                        songs_obj_iter,
+                        tracking_file_name=f"musicDL-batch-{int(time.time())}",
+                    )
                 else:
-                    downloader.download_songs(songs_obj_list)
+                    downloader.download_songs(songs_obj_iter)
+
+                if sync:
+                    # Failed songs are tried again by the next sync
+                    sync.save(
+                        song_obj.get_song_id_saavn()
+                        for song_obj in downloader.downloadTracker.get_song_list()
+                    )
+                    print(f"Synced: {sync.added} songs added")
+                    for title in sync.removed:
+                        print(f"Removed: {title}")
 
         logger.info("Downloading Completed")
         sys.exit(0)
@@ -79,3 +228,75 @@ def musicDL(request: str) -> None:
         logger.exception(e)
 
         sys.exit(3)
+    finally:
+        # Also when failed or interrupted, the pooled connections are closed
+        close_session()
+
+
+def serve() -> None:
+    """Download the jobs submitted to the job server until stopped."""
+
+    try:
+        cassette = _configure()
+
+        with cassette or nullcontext(), DownloadManager() as downloader:
+            store = JobStore(Config.get_config("jobs-file"))
+
+            def run_job(job: dict[str, Any]) -> dict[str, Any]:
+                request_type = parse_request(job["url"])
+
+                # Each job has its own quality, format and output directory,
+                # those of the download manager, the config is left as it is
+                downloader.pipeline = None
+                with downloader.job_options(job["options"]):
+                    if request_type == "trackingfile":
+                        downloader.resume_download_from_tracking_file(job["url"])
+                    else:
+                        downloader.download_songs(
+                            _iter_songs(
+                                [(job["url"], request_type)],
+                                quality=downloader.quality,
+                            )
+                        )
+
+                if downloader.pipeline is None:
+                    return {}
+                metrics = downloader.pipeline.get_metrics()
+                return {
+                    "completed": metrics[-1].processed,
+                    "dropped": sum(stage.dropped for stage in metrics),
+                }
+
+            server = JobServer(
+                store,
+                run_job,
+                downloader.cancel,
+                host=Config.get_config("serve-host"),
+                port=Config.get_config("serve-port"),
+                token=(
+                    load_token(Config.get_config("serve-token-file"))
+                    if Config.get_config("serve-token-file")
+                    else ""
+                ),
+            )
+
+            def gracefulExit(signal: int, frame: Any) -> None:
+                server.shutdown()
+
+            signal.signal(signal.SIGINT, gracefulExit)
+            signal.signal(signal.SIGTERM, gracefulExit)
+
+            print(f"Serving jobs on {server.address}, Ctrl+C to stop")
+            server.run()
+
+        logger.info("Job server stopped")
+        sys.exit(0)
+    except Exception as e:
+        if not Config.get_config("verbose"):
+            print(str(e))
+        logger.exception(e)
+
+        sys.exit(3)
+    finally:
+        # Also when failed or interrupted, the pooled connections are closed
+        close_session()
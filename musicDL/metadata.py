@@ -2,19 +2,41 @@
 """
 Set song metadata
 
-Using EasyID3, ID3 and MP4 modules.
+Using the ID3 and MP4 modules. The complete set of frames/atoms is built in
+memory and saved with a single write, leaving padding for later retagging.
+
+The frames/atoms shared by the tracks of an album, such as its cover, are
+built once per album into a template and merged with those of each track.
+
+Files whose tags already match are not saved at all.
 """
 
+import copy
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from typing import Any  # For static type checking
 
-from mutagen.easyid3 import EasyID3
-from mutagen.easymp4 import EasyMP4
-from mutagen.id3 import ID3
+from mutagen import PaddingInfo
+from mutagen.id3 import ID3, ID3NoHeaderError
 from mutagen.id3._frames import (
     APIC,
     COMM,
     PCNT,
     SYLT,
+    TALB,
+    TCOM,
+    TCON,
+    TCOP,
+    TDOR,
+    TDRC,
+    TENC,
+    TIT2,
+    TLAN,
+    TLEN,
+    TPE1,
+    TPE2,
     TPOS,
     TPUB,
     TRCK,
@@ -30,13 +52,183 @@ from musicDL.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Albums whose templates are kept, the least recently tagged are dropped
+MAX_ALBUM_TEMPLATES = 16
+
+# Tag values longer than this, such as covers and lyrics, are compared by hash
+_MAX_COMPARED_SIZE = 256
+
+# Room left for the tag to grow, such as lyrics found later, without
+# rewriting the whole audio file
+TAG_PADDING = 16 * 1024
+
+
+def _get_padding(info: PaddingInfo) -> int:
+    """Returns the padding to leave after the tag.
+
+    A tag that fits the space of the old one is written in place, otherwise
+    the file is rewritten once with room to spare.
+    """
+
+    if info.padding >= 0:
+        return int(info.padding)
+
+    return TAG_PADDING
+
+
+def _get_number_pair(number: str) -> tuple[int, int]:
+    """Returns ``(3, 12)`` for a track or disc number ``3/12``."""
+
+    position, _, total = number.partition("/")
+    return int(position or 0), int(total or 0)
+
+
+class AlbumTags:
+    """Represents the tags shared by the tracks of an album."""
+
+    def __init__(self, meta_tags: SongObj) -> None:
+        """Initialize `AlbumTags` from any track of the album.
+
+        Args:
+            meta_tags: Meta-tags of a track of the album.
+        """
+        album_title = meta_tags.get_album_title()
+        genre = meta_tags.get_genre()
+        year = meta_tags.get_year()
+        copyright = meta_tags.get_copyright()
+        encoded_by = meta_tags.get_encoded_by()
+        publisher = meta_tags.get_publisher()
+
+        self.is_complete = True
+        album_art = b""
+        if not Config.get_config("no-coverart"):
+            album_art = meta_tags.get_cover_image()
+            # Not kept when the cover couldn't be fetched, the next track retries
+            self.is_complete = bool(album_art) or not meta_tags.get_cover_image_url()
+
+        self.id3_frames = [
+            # Album name [TALB]
+            TALB(encoding=3, text=album_title),
+            # Genres [TCON]
+            TCON(encoding=3, text=genre),
+            # Year [TDRC]
+            TDRC(encoding=3, text=year),
+            # Original release date [TDOR]
+            TDOR(encoding=3, text=meta_tags.get_release_date()),
+            # Copyright [TCOP]
+            TCOP(encoding=3, text=copyright),
+            # Name of the encoder [TENC]
+            TENC(encoding=3, text=encoded_by),
+            # Audio language [TLAN]
+            TLAN(encoding=3, text=meta_tags.get_lang_code()),
+            # Publisher
+            TPUB(encoding=3, text=publisher),
+            # Terms of use
+            USER(encoding=3, text="For Private Use Only", lang="eng"),
+        ]
+        self.mp4_atoms: dict[str, Any] = {
+            "\xa9alb": album_title,
+            "\xa9gen": genre,
+            "\xa9day": year,
+            "cprt": copyright,
+            "\xa9too": encoded_by,
+        }
+
+        if album_art:
+            self.id3_frames.append(
+                APIC(
+                    encoding=3,
+                    mime="image/jpeg",
+                    type=3,
+                    desc="Cover",
+                    data=album_art,
+                )
+            )
+            self.mp4_atoms["covr"] = [
+                MP4Cover(album_art, imageformat=MP4Cover.FORMAT_JPEG)
+            ]
+
+
+# Templates of the albums being tagged
+_album_tags: OrderedDict[tuple[Any, ...], AlbumTags] = OrderedDict()
+_album_tags_lock = threading.Lock()
+
+
+def get_album_tags(meta_tags: SongObj) -> AlbumTags:
+    """Returns the tags shared by the tracks of the song's album.
 
-def set_tags(file_path: str, meta_tags: SongObj) -> bool:
+    Built from the first track tagged, then reused by the others.
+
+    Args:
+        meta_tags: Meta-tags of the song.
+    """
+
+    key = (meta_tags.get_album_key(), Config.get_config("no-coverart"))
+
+    with _album_tags_lock:
+        album_tags = _album_tags.get(key)
+        if album_tags is not None:
+            _album_tags.move_to_end(key)
+            return album_tags
+
+    album_tags = AlbumTags(meta_tags)
+    if album_tags.is_complete:
+        with _album_tags_lock:
+            _album_tags[key] = album_tags
+            while len(_album_tags) > MAX_ALBUM_TEMPLATES:
+                _album_tags.popitem(last=False)
+
+    return album_tags
+
+
+def _get_value_state(value: Any) -> Any:
+    """Returns a comparable form of a frame's attribute or an atom's value."""
+
+    if isinstance(value, (list, tuple)):
+        return tuple([_get_value_state(item) for item in value])
+    if isinstance(value, (bytes, str)) and len(value) > _MAX_COMPARED_SIZE:
+        data = value.encode("utf-8") if isinstance(value, str) else value
+        # MP4Cover and MP4FreeForm are bytes with a format
+        value_format = getattr(value, "imageformat", getattr(value, "dataformat", 0))
+        return (type(value).__name__, value_format, hashlib.sha256(data).digest())
+    if type(value) in (bytes, str, int, float, bool):
+        return value
+
+    # Specs of ID3 frames (time stamps, encodings) and formatted MP4 values
+    return repr(value)
+
+
+def _get_tags_state(tags: Any) -> dict[str, Any]:
+    """Returns a comparable form of the ID3 frames or MP4 atoms of a file."""
+
+    state = {}
+    for key, value in tags.items():
+        if hasattr(value, "HashKey"):
+            # Empty text frames aren't kept when the file is loaded
+            text = getattr(value, "text", None)
+            if isinstance(text, list) and not any(str(item) for item in text):
+                continue
+            # An ID3 frame, compared by all its attributes
+            state[key] = (type(value).__name__,) + tuple(
+                [(name, _get_value_state(attr)) for name, attr in vars(value).items()]
+            )
+        else:
+            # Atoms are loaded as lists of values
+            state[key] = _get_value_state(value if isinstance(value, list) else [value])
+
+    return state
+
+
+def set_tags(file_path: str, meta_tags: SongObj) -> str:
     """Embed metadata into media files.
 
     Args:
         file_path: Path to the music file.
         meta_tags: Meta-tags of the song.
+
+    Returns:
+        ``updated``, ``skipped`` if the tags were the same already, empty if
+        the format isn't supported.
     """
 
     media_type = file_path.split(".")[-1]
@@ -46,10 +238,10 @@ def set_tags(file_path: str, meta_tags: SongObj) -> bool:
     elif media_type in ["aac", "m4a", "mp4"]:
         return set_mp4_tags(file_path, meta_tags)
 
-    return False
+    return ""
 
 
-def set_id3_tags(file_path: str, meta_tags: SongObj) -> bool:
+def set_id3_tags(file_path: str, meta_tags: SongObj) -> str:
     """Embed metadata into MP3 files.
 
     ID3v2.4 tag specification - see id3 docs:
@@ -62,110 +254,87 @@ def set_id3_tags(file_path: str, meta_tags: SongObj) -> bool:
 
     # Embed song details
     logger.info("Tagging MP3 file")
-    audiofile = EasyID3(file_path)
+    try:
+        audiofile = ID3(file_path)
+    except ID3NoHeaderError:
+        audiofile = ID3()
+    # Tags of other versions are converted to v2.4 as they are loaded
+    state = _get_tags_state(audiofile) if audiofile.version == (2, 4, 0) else None
     # Get rid of all existing ID3 tags (if any exist)
     if not Config.get_config("update-tags"):
-        audiofile.delete()
+        audiofile.clear()
+
+    # Album name, genre, year, copyright, language, publisher and cover
+    # are the album's
+    for frame in get_album_tags(meta_tags).id3_frames:
+        audiofile.add(copy.copy(frame))
 
     # Desc [MP3 tags]
     # Title [TIT2]
-    audiofile["title"] = meta_tags.get_title()
-
-    # Album name [TALB]
-    audiofile["album"] = meta_tags.get_album_title()
+    audiofile.add(TIT2(encoding=3, text=meta_tags.get_title()))
 
     # Artists [TPE1]
-    audiofile["artist"] = meta_tags.get_album_artists()
+    audiofile.add(TPE1(encoding=3, text=meta_tags.get_album_artists()))
     # Album artist (all of 'em) [TPE2]
-    audiofile["albumartist"] = meta_tags.get_album_artists()
+    audiofile.add(TPE2(encoding=3, text=meta_tags.get_album_artists()))
 
-    # Genres (pretty pointless if you ask me) [TCON]
-    audiofile["genre"] = meta_tags.get_genre()
     # Composer [TCOM] - [\xa9wrt]
-    audiofile["composer"] = meta_tags.get_composer()
-
-    # Year [TDRC]
-    audiofile["date"] = meta_tags.get_year()
-    # Original release date [TDOR]
-    audiofile["originaldate"] = meta_tags.get_release_date()
-
-    # Copyright [TCOP]
-    audiofile["copyright"] = meta_tags.get_copyright()
-    # Name of the encoder [TENC]
-    audiofile["encodedby"] = meta_tags.get_encoded_by()
+    audiofile.add(TCOM(encoding=3, text=meta_tags.get_composer()))
 
     # Length of song [TLEN]
-    audiofile["length"] = meta_tags.get_duration()
-    # Audio language [TLAN]
-    audiofile["language"] = meta_tags.get_lang_code()
-
-    # Save as ID3 V2.4
-    # As ID3 v2.3 isn't fully features
-    # But windows doesn't support v2.4 until later versions of Win10
-    audiofile.save(v2_version=4)
-
-    # For supported id3 tags
-    audiofile = ID3(file_path)
+    audiofile.add(TLEN(encoding=3, text=meta_tags.get_duration()))
 
     # Track number [TRCK]
-    audiofile["TRCK"] = TRCK(encoding=3, text=meta_tags.get_track_number())
+    audiofile.add(TRCK(encoding=3, text=meta_tags.get_track_number()))
     # Disc number [TPOS]
-    audiofile["TPOS"] = TPOS(encoding=3, text=meta_tags.get_disc_number())
+    audiofile.add(TPOS(encoding=3, text=meta_tags.get_disc_number()))
     # URL of the media file
-    audiofile["WOAF"] = WOAF(url=meta_tags.get_media_url())
+    audiofile.add(WOAF(url=meta_tags.get_media_url()))
     # Play count
-    audiofile["PCNT"] = PCNT(0)
-    # Publisher
-    audiofile["TPUB"] = TPUB(encoding=3, text=meta_tags.get_publisher())
-    # Terms of use
-    audiofile["USER"] = USER(encoding=3, text="For Private Use Only", lang="eng")
+    audiofile.add(PCNT(count=0))
     # Comment [COMM]
-    audiofile["COMM"] = COMM(
-        encoding=3,
-        text=f"Saavn ID: {meta_tags.get_song_id_saavn()}\nURL: {meta_tags.get_media_url()}",
-        lang="eng",
+    audiofile.add(
+        COMM(
+            encoding=3,
+            text=(
+                f"Saavn ID: {meta_tags.get_song_id_saavn()}\n"
+                f"URL: {meta_tags.get_media_url()}"
+            ),
+            lang="eng",
+        )
     )
 
     # Embed lyrics
     lyrics_txt = meta_tags.get_lyrics()
     if lyrics_txt:
-        audiofile["USLT"] = USLT(
-            encoding=3,
-            desc="Lyrics",
-            text=lyrics_txt,
-            lang="eng",
-        )
+        audiofile.add(USLT(encoding=3, desc="Lyrics", text=lyrics_txt, lang="eng"))
 
     # Embed sync-lyrics
     sync_lyrics = get_sync_lyrics_from_file(file_path)
     if sync_lyrics:
-        audiofile["SYLT"] = SYLT(
-            encoding=3,
-            lang="eng",
-            format=2,
-            type=1,
-            desc="Lyrics from MiniLyrics",
-            text=sync_lyrics,
+        audiofile.add(
+            SYLT(
+                encoding=3,
+                lang="eng",
+                format=2,
+                type=1,
+                desc="Lyrics from MiniLyrics",
+                text=sync_lyrics,
+            )
         )
 
-    audiofile.save(v2_version=4)
+    if _get_tags_state(audiofile) == state:
+        logger.info(f"Tags unchanged: {file_path}")
+        return "skipped"
 
-    # Embed cover image
-    if not Config.get_config("no-coverart"):
-        album_art = meta_tags.get_cover_image()
-        if album_art:
-            audiofile["APIC"] = APIC(
-                encoding=3,
-                mime="image/jpeg",
-                type=3,
-                desc="Cover",
-                data=album_art,
-            )
-        audiofile.save(v2_version=4)
-    return True
+    # Save as ID3 V2.4, once
+    # As ID3 v2.3 isn't fully features
+    # But windows doesn't support v2.4 until later versions of Win10
+    audiofile.save(file_path, v2_version=4, padding=_get_padding)
+    return "updated"
 
 
-def set_mp4_tags(file_path: str, meta_tags: SongObj) -> bool:
+def set_mp4_tags(file_path: str, meta_tags: SongObj) -> str:
     """Embed metadata to M4A/AAC/MP4 files.
 
     MP4 specific tags - see mutagen docs:
@@ -178,62 +347,48 @@ def set_mp4_tags(file_path: str, meta_tags: SongObj) -> bool:
 
     # Embed song details
     logger.info("Tagging M4A file")
-    audiofile = EasyMP4(file_path)
-    # Get rid of all existing ID3 tags (if any exist)
+    audiofile = MP4(file_path)
+    if audiofile.tags is None:
+        audiofile.add_tags()
+    state = _get_tags_state(audiofile.tags)
+    # Get rid of all existing tags (if any exist)
     if not Config.get_config("update-tags"):
-        audiofile.delete()
+        audiofile.tags.clear()  # type: ignore
+
+    # Album name, genre, year, copyright and cover are the album's
+    audiofile.update(get_album_tags(meta_tags).mp4_atoms)
 
     # Desc [MP4 tags]
     # Title [\xa9nam]
-    audiofile["title"] = meta_tags.get_title()
-
-    # Album name [\xa9alb]
-    audiofile["album"] = meta_tags.get_album_title()
+    audiofile["\xa9nam"] = meta_tags.get_title()
 
     # Artists [\xa9ART]
-    audiofile["artist"] = meta_tags.get_album_artists()
+    audiofile["\xa9ART"] = meta_tags.get_album_artists()
     # Album artist (all of 'em) [aART]
-    audiofile["albumartist"] = meta_tags.get_album_artists()
-
-    # Genres (pretty pointless if you ask me) [\xa9gen]
-    audiofile["genre"] = meta_tags.get_genre()
-
-    # Year [\xa9day]
-    audiofile["date"] = meta_tags.get_year()
-
-    # Copyright [cprt]
-    audiofile["copyright"] = meta_tags.get_copyright()
+    audiofile["aART"] = meta_tags.get_album_artists()
 
     # Track number [trkn]
-    audiofile["tracknumber"] = meta_tags.get_track_number()
+    audiofile["trkn"] = [_get_number_pair(meta_tags.get_track_number())]
     # Disc number [disk]
-    audiofile["discnumber"] = meta_tags.get_disc_number()
+    audiofile["disk"] = [_get_number_pair(meta_tags.get_disc_number())]
 
     # Comment [\xa9cmt]
-    audiofile[
-        "comment"
-    ] = f"Saavn ID: {meta_tags.get_song_id_saavn()}\nURL: {meta_tags.get_media_url()}"
-
-    # Ember basic meta-tags
-    audiofile.save()
-
-    audiofile = MP4(file_path)
+    audiofile["\xa9cmt"] = (
+        f"Saavn ID: {meta_tags.get_song_id_saavn()}\nURL: {meta_tags.get_media_url()}"
+    )
 
     # Writer [\xa9wrt]
     audiofile["\xa9wrt"] = meta_tags.get_composer()
-    # Name of the encoder []
-    audiofile["\xa9too"] = meta_tags.get_encoded_by()
 
     # Embed lyrics
     lyrics_txt = meta_tags.get_lyrics()
     if lyrics_txt:
         audiofile["\xa9lyr"] = lyrics_txt
 
-    # Embed cover image
-    if not Config.get_config("no-coverart"):
-        album_art = meta_tags.get_cover_image()
-        if album_art:
-            audiofile["covr"] = [MP4Cover(album_art, imageformat=MP4Cover.FORMAT_JPEG)]
+    if _get_tags_state(audiofile.tags) == state:
+        logger.info(f"Tags unchanged: {file_path}")
+        return "skipped"
 
-    audiofile.save()
-    return True
+    # Embed all the meta-tags, once
+    audiofile.save(padding=_get_padding)
+    return "updated"
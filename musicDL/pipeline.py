@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Staged song pipeline
+
+Songs flow through stages (download, convert, lyrics, tag) connected by
+bounded queues. Each stage has its own workers, so downloading a song
+overlaps with converting the previous one and tagging the one before. A
+full queue holds back the stage feeding it.
+"""
+
+import asyncio
+import logging
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    Optional,
+)  # For static type checking
+
+logger = logging.getLogger(__name__)
+
+
+class StageMetrics:
+    """Represents the queue depth and the worker usage of a stage."""
+
+    def __init__(self, name: str, workers: int) -> None:
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+
+        self._depth = 0
+        self._depth_area = 0.0
+        self._start = time.monotonic()
+        self._updated_at = self._start
+
+    def set_depth(self, depth: int) -> None:
+        """Record the number of songs waiting in the stage's queue."""
+
+        now = time.monotonic()
+        self._depth_area += self._depth * (now - self._updated_at)
+        self._depth = depth
+        self._updated_at = now
+        self.max_depth = max(self.max_depth, depth)
+
+    def get_mean_depth(self) -> float:
+        """Returns the average number of songs waiting, over time."""
+
+        self.set_depth(self._depth)
+        elapsed = self._updated_at - self._start
+        return self._depth_area / elapsed if elapsed else 0.0
+
+    def get_utilization(self) -> float:
+        """Returns the share of the time the workers were busy."""
+
+        elapsed = time.monotonic() - self._start
+        return self.busy_time / (elapsed * self.workers) if elapsed else 0.0
+
+    def __str__(self) -> str:
+        songs = self.processed + self.dropped
+        mean_wait = self.wait_time / songs if songs else 0.0
+        return (
+            f"{self.name}: {self.processed} songs, {self.dropped} dropped,"
+            f" queue depth max {self.max_depth} avg {self.get_mean_depth():.1f},"
+            f" wait avg {mean_wait:.2f}s,"
+            f" {self.workers} workers {self.get_utilization():.0%} busy"
+        )
+
+
+class Stage:
+    """Represents a pipeline stage: a bounded queue and the workers taking from it.
+
+    The stage function returns what is passed on to the next stage, or
+    ``None`` to drop the song (skipped or failed).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Awaitable[Optional[Any]]],
+        workers: int,
+        queue_size: int,
+    ) -> None:
+        """Initialize `Stage`.
+
+        Args:
+            name: Name of the stage, used in the metrics.
+            func: Coroutine function processing one song.
+            workers: Number of songs processed at the same time.
+            queue_size: Number of songs that can wait for a worker, ``0`` for
+                no limit.
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue: asyncio.Queue[tuple[float, Any]] = asyncio.Queue(
+            maxsize=max(0, queue_size)
+        )
+        self.metrics = StageMetrics(name, self.workers)
+
+    async def put(self, item: Any) -> None:
+        """Add a song to the stage's queue, waiting while it is full."""
+
+        await self.queue.put((time.monotonic(), item))
+        self.metrics.set_depth(self.queue.qsize())
+
+    async def work(self, next_stage: Optional["Stage"]) -> None:
+        """Process songs from the queue until cancelled."""
+
+        while True:
+            queued_at, item = await self.queue.get()
+            self.metrics.set_depth(self.queue.qsize())
+
+            start = time.monotonic()
+            self.metrics.wait_time += start - queued_at
+            try:
+                try:
+                    result = await self.func(item)
+                except Exception as e:
+                    logger.exception(e)
+                    result = None
+                self.metrics.busy_time += time.monotonic() - start
+
+                if result is None:
+                    self.metrics.dropped += 1
+                    continue
+
+                self.metrics.processed += 1
+                if next_stage is not None:
+                    await next_stage.put(result)
+            finally:
+                # Only done once passed on, so the next stage's queue is joined
+                # after everything reached it
+                self.queue.task_done()
+
+
+class Pipeline:
+    """Represents stages run one after another on every song."""
+
+    def __init__(self, stages: list[Stage]) -> None:
+        self.stages = stages
+
+    async def run(self, items: Iterable[Any]) -> None:
+        """Run every item through all the stages.
+
+        Args:
+            items: The songs, fed to the first stage as it has room for them.
+        """
+
+        await self.run_from(self._feed(items))
+
+    async def _feed(self, items: Iterable[Any]) -> None:
+        for item in items:
+            await self.stages[0].put(item)
+
+    async def run_from(self, feeder: Awaitable[None]) -> None:
+        """Run the items put into the first stage by a coroutine through all stages.
+
+        Args:
+            feeder: Coroutine putting the songs into ``stages[0]``.
+        """
+
+        workers = [
+            asyncio.ensure_future(stage.work(next_stage))
+            for stage, next_stage in zip(self.stages, self.stages[1:] + [None])
+            for _ in range(stage.workers)
+        ]
+
+        try:
+            error = None
+            try:
+                await feeder
+            except Exception as e:
+                # Finish the songs fed so far first
+                error = e
+
+            # A stage is done once its queue is empty and the stage before is done
+            for stage in self.stages:
+                await stage.queue.join()
+
+            if error is not None:
+                raise error
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+            for stage in self.stages:
+                logger.info(f"Pipeline {stage.metrics}")
+
+    def get_metrics(self) -> list[StageMetrics]:
+        """Returns the metrics of every stage."""
+
+        return [stage.metrics for stage in self.stages]
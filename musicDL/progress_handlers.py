@@ -211,6 +211,17 @@ class _ProgressTracker:
         self.progress = self.progress + iterFraction
         self.update("Downloading")
 
+    def notify_download_resume(self, file_size: float, downloaded: int) -> None:
+        """Update progress bar to reflect a partial download being resumed.
+
+        Args:
+            file_size: Total file size.
+            downloaded: The number of bytes downloaded earlier.
+        """
+
+        self.progress = downloaded / file_size * 90
+        self.update("Resuming")
+
     def notify_saavn_download_completion(self) -> None:
         """Update progressbar to reflect a audio download being completed"""
 
@@ -329,6 +340,17 @@ class DownloadTracker:
             )  # type: ignore
             shutil.copy(self.saveFile, backup_file)  # type: ignore
 
+    def add_song(self, song_obj: SongObj) -> None:
+        """Track the download of one more SongObj.
+
+        It is written to the .musicDLTrackingFile with the next backup.
+
+        Args:
+            song_obj: A song to be downloaded.
+        """
+
+        self.song_obj_list.append(song_obj)
+
     def get_song_list(self) -> list[SongObj]:
         """Returns list of SongObj's representing songs yet to be downloaded.
 
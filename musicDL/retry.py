@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Retry policy and circuit breaker for HTTP requests
+
+Transient failures are retried with exponential backoff and jitter,
+honouring ``Retry-After``. Hosts that keep failing are short-circuited
+for a while, so an outage fails fast instead of timing out on every song.
+"""
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional  # For static type checking
+
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth another try: throttling and server-side errors
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class CircuitOpenError(RequestException):
+    """Raised instead of sending a request to a host that keeps failing."""
+
+
+class RetryPolicy:
+    """Represents how often and after how long a failed request is retried."""
+
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        backoff_max: float = 30.0,
+        retry_after_max: float = 120.0,
+    ) -> None:
+        """Initialize `RetryPolicy`.
+
+        Args:
+            retries: Number of retries after the first attempt.
+            backoff_factor: Base delay in seconds, doubled for every retry.
+            backoff_max: Maximum delay in seconds between two attempts.
+            retry_after_max: Maximum delay in seconds accepted from ``Retry-After``.
+        """
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+
+    def should_retry(self, attempt: int, status_code: Optional[int] = None) -> bool:
+        """Returns if the request should be sent again.
+
+        Args:
+            attempt: Number of retries done so far.
+            status_code: Status code of the response, ``None`` for connection errors.
+        """
+
+        if attempt >= self.retries:
+            return False
+
+        return status_code is None or status_code in RETRY_STATUS_CODES
+
+    def get_delay(self, attempt: int, response: Optional[Any] = None) -> float:
+        """Returns seconds to wait before the next attempt.
+
+        Uses ``Retry-After`` of the response if present, else exponential
+        backoff with full jitter.
+
+        Args:
+            attempt: Number of retries done so far.
+            response: The failed ``requests.Response``, if any.
+        """
+
+        retry_after = _parse_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.retry_after_max)
+
+        backoff = min(self.backoff_max, self.backoff_factor * (2**attempt))
+        # Jitter spreads out the retries of concurrent downloads, not security related
+        return random.uniform(0, backoff)  # nosec B311
+
+
+def _parse_retry_after(response: Optional[Any]) -> Optional[float]:
+    """Returns the seconds given by the ``Retry-After`` header, if any.
+
+    Args:
+        response: A ``requests.Response``.
+    """
+
+    if response is None:
+        return None
+
+    value = response.headers.get("retry-after", "").strip()
+    if not value:
+        return None
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """Represents a per-host circuit breaker.
+
+    After ``threshold`` consecutive failures a host's circuit opens and
+    requests to it fail immediately. Once ``cooldown`` seconds have passed a
+    single trial request is let through; its success closes the circuit.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0) -> None:
+        """Initialize `CircuitBreaker`.
+
+        Args:
+            threshold: Consecutive failures that open a host's circuit.
+            cooldown: Seconds before a trial request is sent to the host.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._opened_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, host: str) -> None:
+        """Check if a request can be sent to the host.
+
+        Args:
+            host: Host of the URL.
+
+        Raises:
+            CircuitOpenError: The host's circuit is open.
+        """
+
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return None
+
+            remaining = opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(
+                    f"{host} is failing, not retrying for {remaining:.0f}s"
+                )
+
+            # Half-open: let this request through as a trial and keep the
+            # others out until it finishes
+            self._opened_at[host] = time.monotonic()
+
+    def record_success(self, host: str) -> None:
+        """Close the host's circuit."""
+
+        with self._lock:
+            self._failures.pop(host, None)
+            if self._opened_at.pop(host, None) is not None:
+                logger.info(f"Circuit closed for {host}")
+
+    def record_failure(self, host: str) -> None:
+        """Count a failure, opening the host's circuit at the threshold."""
+
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+
+            if failures >= self.threshold:
+                if host not in self._opened_at:
+                    logger.warning(f"Circuit opened for {host}: {failures} failures")
+                self._opened_at[host] = time.monotonic()
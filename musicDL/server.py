@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+"""
+Job server
+
+``musicDL serve`` keeps one download manager, its HTTP pool and caches warm
+and downloads the jobs submitted to a local HTTP/JSON API, one after
+another. Jobs are kept in a JSON file, queued jobs and the job that was
+running survive a restart.
+
+Only requests naming the bound address or ``localhost`` as their ``Host``
+are served, so that web pages can't reach the API through DNS rebinding,
+and jobs are submitted as ``application/json``, which a web page can't
+send to another origin without asking first. With a token file, requests
+also need an ``Authorization: Bearer <token>`` header.
+
+API::
+
+    POST   /jobs        Submit {"url": ..., "quality": ..., "output-format": ...,
+                        "output": ...}, only the URL is required
+    GET    /jobs        All the jobs
+    GET    /jobs/<id>   One job
+    DELETE /jobs/<id>   Cancel a job
+"""
+
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Any, Callable, Optional  # For static type checking
+
+from .constants import OUTPUT_FORMATS, QUALITIES
+from .services.saavn import parse_request
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+# Finished jobs kept in the jobs file, the oldest are dropped
+_MAX_FINISHED_JOBS = 1000
+
+
+class JobError(Exception):
+    """Raised when a job can't be submitted or cancelled."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def validate_job(request: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+    """Returns the URL and the config options of a job submission.
+
+    Args:
+        request: The submitted JSON object.
+
+    Raises:
+        JobError: The submission isn't valid.
+    """
+
+    if not isinstance(request, dict):
+        raise JobError("Expecting a JSON object")
+
+    url = request.get("url")
+    if not isinstance(url, str):
+        raise JobError("Missing url")
+    try:
+        parse_request(url)
+    except TypeError as e:
+        raise JobError(str(e))
+
+    options = {}
+    for key, value in request.items():
+        if key == "url":
+            continue
+        elif key == "quality" and str(value).lower() in QUALITIES:
+            options[key] = str(value).lower()
+        elif key == "output-format" and str(value).lower() in OUTPUT_FORMATS:
+            options[key] = str(value).lower()
+        elif key == "output" and isinstance(value, str) and Path(value).is_dir():
+            options[key] = value
+        else:
+            raise JobError(f"Invalid {key}: {value!r}")
+
+    return url, options
+
+
+def load_token(path: str) -> str:
+    """Returns the API token kept in a file, created with a new token if missing.
+
+    Args:
+        path: Path of the token file, only readable by the user.
+    """
+
+    token_path = Path(path)
+    try:
+        token = token_path.read_text(encoding="UTF-8").strip()
+    except FileNotFoundError:
+        token = ""
+    if token:
+        return token
+
+    token = secrets.token_urlsafe(32)
+    token_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="UTF-8") as token_file:
+        token_file.write(token)
+
+    logger.info(f"New job API token written to {token_path}")
+    return token
+
+
+class JobStore:
+    """Represents the queue of jobs, saved to a JSON file on every change."""
+
+    def __init__(self, path: str) -> None:
+        """Initialize `JobStore`.
+
+        Args:
+            path: Path of the jobs file, created if missing.
+        """
+        self.path = Path(path)
+        self._condition = threading.Condition()
+        self._jobs: dict[str, dict[str, Any]] = {}
+
+        if self.path.is_file():
+            try:
+                jobs = json.loads(self.path.read_text(encoding="UTF-8"))["jobs"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable jobs file {self.path}: {e!r}")
+                jobs = []
+
+            for job in jobs:
+                # Interrupted by the last shutdown
+                if job["status"] == "running":
+                    job["status"] = "queued"
+                    job["started"] = None
+                self._jobs[job["id"]] = job
+
+    def save(self) -> None:
+        """Write the jobs to the jobs file."""
+
+        with self._condition:
+            finished = [
+                job
+                for job in self._jobs.values()
+                if job["status"] in ("done", "failed", "cancelled")
+            ]
+            for job in finished[: max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+                del self._jobs[job["id"]]
+
+            data = json.dumps({"jobs": list(self._jobs.values())}, indent=1)
+
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(data, encoding="UTF-8")
+            os.replace(tmp_path, self.path)
+
+    def submit(self, url: str, options: dict[str, Any]) -> dict[str, Any]:
+        """Queue a job, returns it.
+
+        Args:
+            url: URL of the song/album/playlist or trackingfile path.
+            options: Config options of the job, such as its ``quality``.
+        """
+
+        job: dict[str, Any] = {
+            "id": uuid.uuid4().hex[:12],
+            "url": url,
+            "options": options,
+            "status": "queued",
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "error": "",
+            "completed": 0,
+            "dropped": 0,
+        }
+
+        with self._condition:
+            self._jobs[job["id"]] = job
+            self.save()
+            self._condition.notify_all()
+            submitted = dict(job)
+
+        logger.info(f"Job {job['id']} queued: {url}")
+        return submitted
+
+    def get(self, job_id: str) -> Optional[dict[str, Any]]:
+        """Returns a job, ``None`` if there is no such job."""
+
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def get_all(self) -> list[dict[str, Any]]:
+        """Returns all the jobs, in the order they were submitted."""
+
+        with self._condition:
+            return [dict(job) for job in self._jobs.values()]
+
+    def cancel(self, job_id: str) -> str:
+        """Cancel a job, returns its status before.
+
+        A queued job is cancelled at once, a running one is marked to be
+        stopped by the job server.
+
+        Raises:
+            JobError: No such job, or the job is finished already.
+        """
+
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise JobError(f"No such job: {job_id}", 404)
+
+            status = str(job["status"])
+            if status == "queued":
+                self._finish(job, "cancelled")
+            elif status == "running":
+                job["cancel"] = True
+                self.save()
+            else:
+                raise JobError(f"Job is {status} already", 409)
+
+        return status
+
+    def take_next(self, timeout: float) -> Optional[dict[str, Any]]:
+        """Mark the oldest queued job as running and return it.
+
+        Args:
+            timeout: Seconds to wait for a job to be submitted.
+
+        Returns:
+            The job, ``None`` if none was submitted in time.
+        """
+
+        with self._condition:
+            job = self._get_queued()
+            if job is None:
+                self._condition.wait(timeout)
+                job = self._get_queued()
+            if job is None:
+                return None
+
+            job["status"] = "running"
+            job["started"] = time.time()
+            self.save()
+            return dict(job)
+
+    def _get_queued(self) -> Optional[dict[str, Any]]:
+        for job in self._jobs.values():
+            if job["status"] == "queued":
+                return job
+        return None
+
+    def is_cancelled(self, job_id: str) -> bool:
+        """Returns whether a running job was asked to stop."""
+
+        with self._condition:
+            return bool(self._jobs[job_id].get("cancel"))
+
+    def finish(self, job_id: str, status: str, **fields: Any) -> None:
+        """Record the end of a running job.
+
+        Args:
+            job_id: ID of the job.
+            status: ``done``, ``failed``, ``cancelled`` or ``queued`` again.
+            fields: Results of the job, such as ``completed`` and ``error``.
+        """
+
+        with self._condition:
+            self._finish(self._jobs[job_id], status, **fields)
+
+    def _finish(self, job: dict[str, Any], status: str, **fields: Any) -> None:
+        job.update(fields)
+        job["status"] = status
+        job.pop("cancel", None)
+        if status == "queued":
+            job["started"] = None
+        else:
+            job["finished"] = time.time()
+        self.save()
+
+        logger.info(f"Job {job['id']} {status}")
+
+
+class JobServer:
+    """Represents the job API and the worker running the submitted jobs."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        run_job: Callable[[dict[str, Any]], dict[str, Any]],
+        cancel_job: Callable[[], None],
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        token: str = "",
+    ) -> None:
+        """Initialize `JobServer`.
+
+        Args:
+            store: The queue of jobs.
+            run_job: Downloads a job, returns its results such as the number
+                of ``completed`` songs.
+            cancel_job: Stops the job being downloaded, from another thread.
+            host: Address the API listens on.
+            port: Port the API listens on, ``0`` for any free port.
+            token: Token the requests must carry, ``""`` for none.
+        """
+        self.store = store
+        self.run_job = run_job
+        self.cancel_job = cancel_job
+        self.token = token
+        self._stopped = threading.Event()
+        self._running_id: Optional[str] = None
+
+        self.httpd = ThreadingHTTPServer((host, port), _JobHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.job_server = self  # type: ignore
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True
+        )
+
+        # Names the API is reached by
+        self.hosts = {host.lower(), self.host, "localhost"}
+
+    @property
+    def host(self) -> str:
+        return str(self.httpd.socket.getsockname()[0])
+
+    @property
+    def address(self) -> str:
+        port = self.httpd.socket.getsockname()[1]
+        return f"http://{self.host}:{port}"
+
+    def run(self) -> None:
+        """Serve the API and run the jobs until shut down."""
+
+        self._thread.start()
+        logger.info(f"Serving jobs on {self.address}")
+
+        try:
+            while not self._stopped.is_set():
+                job = self.store.take_next(timeout=0.5)
+                if job is not None:
+                    self._run(job)
+        finally:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def _run(self, job: dict[str, Any]) -> None:
+        self._running_id = job["id"]
+        logger.info(f"Job {job['id']} running: {job['url']}")
+
+        try:
+            # Cancelled before it could be stopped
+            if self.store.is_cancelled(job["id"]):
+                self.store.finish(job["id"], "cancelled")
+                return None
+
+            result = self.run_job(job)
+        except BaseException as e:
+            if self._stopped.is_set():
+                # Interrupted by the shutdown, run again after a restart
+                self.store.finish(job["id"], "queued")
+            elif self.store.is_cancelled(job["id"]):
+                self.store.finish(job["id"], "cancelled")
+            else:
+                logger.exception(e)
+                self.store.finish(job["id"], "failed", error=str(e) or repr(e))
+                if not isinstance(e, Exception):
+                    raise
+        else:
+            status = "cancelled" if self.store.is_cancelled(job["id"]) else "done"
+            self.store.finish(job["id"], status, **result)
+        finally:
+            self._running_id = None
+
+    def cancel(self, job_id: str) -> dict[str, Any]:
+        """Cancel a job, stopping it if it is running.
+
+        Raises:
+            JobError: No such job, or the job is finished already.
+        """
+
+        if self.store.cancel(job_id) == "running" and self._running_id == job_id:
+            self.cancel_job()
+
+        return self.store.get(job_id)  # type: ignore
+
+    def shutdown(self) -> None:
+        """Stop serving, the running job is queued again."""
+
+        self._stopped.set()
+        if self._running_id is not None:
+            self.cancel_job()
+
+
+class _JobHandler(BaseHTTPRequestHandler):
+    """Handles the requests to the job API."""
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"API {self.address_string()}: {format % args}")
+
+    def _send(self, status: int, data: Any) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorize(self) -> bool:
+        """Returns whether a request may use the API, refusing it otherwise."""
+
+        job_server: JobServer = self.server.job_server  # type: ignore
+
+        host = urlsplit(f"//{self.headers.get('Host', '')}").hostname
+        if host not in job_server.hosts:
+            self._send(403, {"error": f"Invalid Host: {self.headers.get('Host')}"})
+            return False
+
+        if job_server.token:
+            scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(
+                token.strip(), job_server.token
+            ):
+                self._send(401, {"error": "Invalid token"})
+                return False
+
+        return True
+
+    def _get_job_id(self) -> Optional[str]:
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs":
+            return parts[1]
+        return None
+
+    def do_GET(self) -> None:
+        job_server: JobServer = self.server.job_server  # type: ignore
+
+        if not self._authorize():
+            return None
+
+        if self.path.rstrip("/") == "/jobs":
+            self._send(200, {"jobs": job_server.store.get_all()})
+            return None
+
+        job_id = self._get_job_id()
+        job = job_server.store.get(job_id) if job_id else None
+        if job is None:
+            self._send(404, {"error": f"Not found: {self.path}"})
+        else:
+            self._send(200, job)
+
+    def do_POST(self) -> None:
+        job_server: JobServer = self.server.job_server  # type: ignore
+
+        if not self._authorize():
+            return None
+
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": f"Not found: {self.path}"})
+            return None
+
+        try:
+            if self.headers.get_content_type() != "application/json":
+                raise JobError("Expecting Content-Type: application/json", 415)
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                raise JobError("Invalid JSON")
+
+            url, options = validate_job(request)
+        except JobError as e:
+            self._send(e.status, {"error": str(e)})
+            return None
+
+        self._send(201, job_server.store.submit(url, options))
+
+    def do_DELETE(self) -> None:
+        job_server: JobServer = self.server.job_server  # type: ignore
+
+        if not self._authorize():
+            return None
+
+        job_id = self._get_job_id()
+        if job_id is None:
+            self._send(404, {"error": f"Not found: {self.path}"})
+            return None
+
+        try:
+            self._send(200, job_server.cancel(job_id))
+        except JobError as e:
+            self._send(e.status, {"error": str(e)})
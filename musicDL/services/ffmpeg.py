@@ -2,17 +2,35 @@
 """
 Contains all the ffmpeg related services
 
-Convert audio files from one format to another.
+Convert audio files from one format to another. Conversions are CPU bound,
+so a scheduler runs no more ffmpeg processes than there are cores, at a low
+priority, and takes turns between albums. Media can also be converted while
+it downloads, fed to the stdin of ffmpeg.
 """
 
+import asyncio
+import logging
+import os
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
+from collections import OrderedDict, deque
 from pathlib import Path
+from typing import IO, Any, Optional  # For static type checking
 
 from mutagen.mp3 import MP3
 from mutagen.mp4 import MP4
-import asyncio
+
+logger = logging.getLogger(__name__)
+
+# Lowest priority of the best-effort I/O class, ffmpeg still gets disk time
+# while downloads are written
+_IONICE_ARGS = ["-c", "2", "-n", "7"]
+
+# Output container of each output format, a stream's name doesn't tell
+_MUXERS = {"mp3": "mp3", "m4a": "ipod", "aac": "adts"}
 
 
 def has_correct_version(
@@ -53,16 +71,309 @@ def has_correct_version(
     return True
 
 
+def get_cpu_count() -> int:
+    """Returns the number of cores this process may run on."""
+
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+
+    return os.cpu_count() or 1
+
+
+class TranscodeScheduler:
+    """Represents a limit on the number of ffmpeg processes running at once.
+
+    Conversions waiting for a slot are queued per key (such as the album),
+    and the keys take turns, so one long album doesn't hold back the rest.
+    """
+
+    def __init__(self, jobs: int = 0, nice: int = 10, ionice: bool = True) -> None:
+        """Initialize `TranscodeScheduler`.
+
+        Args:
+            jobs: Maximum number of ffmpeg processes, ``0`` for one per core.
+            nice: Niceness added to ffmpeg processes, ``0`` to keep the
+                priority of musicDL.
+            ionice: Run ffmpeg in the lowest best-effort I/O class (Linux).
+        """
+        self.jobs = jobs or get_cpu_count()
+        self.nice = nice
+        self.ionice = ionice
+        self.running = 0
+        self._waiters: "OrderedDict[str, deque[asyncio.Future[None]]]" = OrderedDict()
+
+    def get_waiting(self) -> int:
+        """Returns the number of conversions waiting for a slot."""
+
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free and nobody is waiting, returns whether taken."""
+
+        if self.running < self.jobs and not self._waiters:
+            self.running += 1
+            return True
+
+        return False
+
+    async def acquire(self, key: str = "") -> None:
+        """Wait for a free slot.
+
+        Args:
+            key: Queue of the conversion, the queues are served in turns.
+        """
+
+        if self.try_acquire():
+            return None
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            else:
+                self._waiters[key].remove(waiter)
+                if not self._waiters[key]:
+                    del self._waiters[key]
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it over to the next queue in turn."""
+
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+
+            if not waiter.done():
+                # The slot stays taken, by the waiter now
+                waiter.set_result(None)
+                return None
+
+        self.running -= 1
+
+    def get_process_options(self, args: list[str]) -> tuple[list[str], dict[str, Any]]:
+        """Returns the command and the subprocess options to run it at a low priority.
+
+        Args:
+            args: The ffmpeg command.
+        """
+
+        options: dict[str, Any] = {}
+
+        if sys.platform == "win32":
+            if self.nice > 0:
+                options["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+            return args, options
+
+        # Prefixed commands, no preexec_fn: forking with other threads running
+        # can deadlock the child
+        if self.ionice and sys.platform.startswith("linux"):
+            ionice_path = shutil.which("ionice")
+            if ionice_path:
+                args = [ionice_path] + _IONICE_ARGS + args
+
+        if self.nice:
+            nice_path = shutil.which("nice")
+            if nice_path:
+                args = [nice_path, "-n", str(self.nice)] + args
+
+        return args, options
+
+
+def _get_codec(input_format: str, output_format: str) -> Optional[list[str]]:
+    """Returns the ffmpeg codec options of a conversion, ``None`` if there is none.
+
+    Args:
+        input_format: Suffix of the downloaded file, such as ``.m4a``.
+        output_format: Output format such as MP3, AAC, or M4A.
+    """
+
+    if input_format == ".mp3" and (output_format == "aac" or output_format == "m4a"):
+        return ["aac"]
+    elif (input_format == ".aac" or input_format == ".m4a") and output_format == "mp3":
+        return ["libmp3lame", "-abr", "true"]
+
+    return None
+
+
+def get_output_path(downloaded_file_path: Path, output_format: str) -> Path:
+    """Returns the path of a downloaded file once converted to the output format.
+
+    Args:
+        downloaded_file_path: Downloaded audio file path.
+        output_format: Output format such as MP3, AAC, or M4A.
+    """
+
+    if (
+        not output_format
+        or _get_codec(downloaded_file_path.suffix, output_format) is None
+    ):
+        return downloaded_file_path
+
+    return downloaded_file_path.with_suffix(f".{output_format}")
+
+
+def is_streamable(head: bytes, input_format: str) -> bool:
+    """Returns whether ffmpeg can decode a media from a pipe, given its first bytes.
+
+    An MP4 (m4a) needs its index (``moov`` atom) before the audio (``mdat``),
+    ffmpeg can't seek back to it in a pipe.
+
+    Args:
+        head: The first bytes of the media.
+        input_format: Suffix of the media file, such as ``.m4a``.
+    """
+
+    if input_format != ".m4a":
+        return True
+
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset : offset + 4], "big")
+        atom = head[offset + 4 : offset + 8]
+        if atom == b"moov":
+            return True
+        if atom == b"mdat" or size < 8:
+            # 64-bit sizes (1) and "to the end" (0) are only used for mdat
+            return False
+        offset += size
+
+    return False
+
+
+class StreamTranscoder:
+    """Represents an ffmpeg process converting the media written to its stdin.
+
+    ffmpeg writes into a partial file, moved into place once the conversion
+    succeeded.
+    """
+
+    def __init__(
+        self,
+        output_format: str,
+        output_file_path: Path,
+        bitrate: int,
+        ffmpeg_path: str,
+        scheduler: TranscodeScheduler,
+    ) -> None:
+        """Initialize `StreamTranscoder`.
+
+        Args:
+            output_format: Output format such as MP3, AAC, or M4A.
+            output_file_path: Path the downloaded file would have, its suffix
+                is the input format.
+            bitrate: Bitrate of the output in bits per second, ``0`` for the
+                encoder's default.
+            ffmpeg_path: Path of `ffmpeg` application.
+            scheduler: Scheduler giving the priority of ffmpeg, its slot is
+                taken by the caller.
+        """
+        self.input_format = output_file_path.suffix
+        self.output_format = output_format
+        self.output_file_path = get_output_path(output_file_path, output_format)
+        self.part_path = self.output_file_path.with_name(
+            self.output_file_path.name + ".part"
+        )
+        self.bitrate = bitrate
+        self.ffmpeg_path = ffmpeg_path or "ffmpeg"
+        self.scheduler = scheduler
+        self.process: Optional[subprocess.Popen[bytes]] = None
+        self._stderr: Optional[IO[bytes]] = None
+
+    def open(self, head: bytes) -> Optional[IO[bytes]]:
+        """Start ffmpeg, returns its stdin or ``None`` if the media can't be streamed.
+
+        Args:
+            head: The first bytes of the media.
+        """
+
+        codec = _get_codec(self.input_format, self.output_format)
+        if codec is None or not is_streamable(head, self.input_format):
+            return None
+
+        args = [self.ffmpeg_path, "-v", "error", "-y", "-vn", "-i", "pipe:0"]
+        args += ["-c:a"] + codec
+        if self.bitrate:
+            args += ["-b:a", str(self.bitrate)]
+        args += ["-f", _MUXERS[self.output_format], str(self.part_path)]
+
+        command, options = self.scheduler.get_process_options(args)
+
+        # A file rather than a pipe, that nobody reads while the media is written
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+            **options,
+        )
+
+        return self.process.stdin
+
+    def close(self) -> Path:
+        """Wait for ffmpeg to finish, returns the path of the converted file.
+
+        Raises:
+            RuntimeError: ffmpeg failed.
+        """
+
+        assert self.process is not None and self._stderr is not None
+
+        try:
+            self.process.stdin.close()  # type: ignore
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+
+        self._stderr.seek(0)
+        error = self._stderr.read().decode("utf-8", "replace")
+        self._stderr.close()
+
+        if returncode != 0:
+            self.part_path.unlink(missing_ok=True)
+            raise RuntimeError(f"ffmpeg returned an error ({returncode}): {error}")
+
+        os.replace(self.part_path, self.output_file_path)
+        return self.output_file_path
+
+    def abort(self) -> None:
+        """Stop ffmpeg and remove what it wrote."""
+
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            if self.process.stdin is not None:
+                try:
+                    self.process.stdin.close()
+                except BrokenPipeError:
+                    pass
+        if self._stderr is not None:
+            self._stderr.close()
+        self.part_path.unlink(missing_ok=True)
+
+
 async def convert(
-    output_format: str, downloaded_file_path: str, ffmpeg_path: str
+    output_format: str,
+    downloaded_file_path: str,
+    ffmpeg_path: str,
+    scheduler: Optional[TranscodeScheduler] = None,
+    key: str = "",
 ) -> Path:
     """Convert downloaded file to other formats.
 
     Using ffmpeg options such as:
 
-    #. ``-v quiet``: Show nothing at all; be silent
+    #. ``-v error``: Show errors only
     #. ``-i <INPUT>``: Input file path
-    #. ``-acodec <CODEC>``: Audio codec being used
+    #. ``-c:a <CODEC>``: Audio codec being used
     #. ``-abr true``: automatically determines
     #. and passes the audio encoding bitrate to the filters and encoder
     #. ``
@@ -72,6 +383,9 @@ async def convert(
         output_format: Output format such as MP3, AAC, or M4A.
         downloaded_file_path: Downloaded audio file path.
         ffmpeg_path: Path of `ffmpeg` application.
+        scheduler: Scheduler the conversion waits for a slot from, none to
+            start ffmpeg at once.
+        key: Queue of the conversion in the scheduler, such as the album.
     """
 
     if ffmpeg_path is None:
@@ -81,45 +395,45 @@ async def convert(
 
     input_format = downloaded_file_path.suffix
 
-    if input_format == ".mp3" and (output_format == "aac" or output_format == "m4a"):
+    codec = _get_codec(input_format, output_format)
+    if codec is None:
+        return downloaded_file_path
+    elif input_format == ".mp3":
         bitrate = MP3(str(downloaded_file_path)).info.bitrate
-        codec = "aac"
-    elif (input_format == ".aac" or input_format == ".m4a") and output_format == "mp3":
-        bitrate = MP4(str(downloaded_file_path)).info.bitrate
-        codec = "libmp3lame -abr true "
     else:
-        return downloaded_file_path
+        bitrate = MP4(str(downloaded_file_path)).info.bitrate
+
+    output_file = get_output_path(downloaded_file_path, output_format)
 
-    command = f'{ffmpeg_path} -v quiet -y -vn -i "%s" -c:a {codec} -b:a {bitrate}  "%s"'
+    # Arguments are passed as is, no shell quoting of special characters needed
+    args = (
+        [ffmpeg_path, "-v", "error", "-y", "-vn", "-i", str(downloaded_file_path)]
+        + ["-c:a"]
+        + codec
+        + ["-b:a", str(bitrate), str(output_file)]
+    )
 
-    # bash/ffmpeg on Unix systems need to have escape char (\) for special characters: \$
-    # alternatively the quotes could be reversed (single <-> double) in the command then
-    # the windows special characters needs escaping (^): ^\  ^&  ^|  ^>  ^<  ^^
-    output_file = downloaded_file_path.with_suffix(f".{output_format}")
+    if scheduler is None:
+        scheduler = TranscodeScheduler(jobs=1, nice=0, ionice=False)
 
-    if sys.platform == "win32":
-        formatted_command = command % (
-            str(downloaded_file_path),
-            str(output_file),
-        )
-    else:
-        formatted_command = command % (
-            str(downloaded_file_path).replace("$", r"\$"),
-            str(output_file).replace("$", r"\$"),
+    await scheduler.acquire(key)
+    try:
+        command, options = scheduler.get_process_options(args)
+        process = await asyncio.subprocess.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            **options,
         )
 
-    process = await asyncio.subprocess.create_subprocess_shell(
-        formatted_command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-
-    _, proc_err = await process.communicate()
+        _, proc_err = await process.communicate()
+    finally:
+        scheduler.release()
 
     if process.returncode != 0:
         message = (
             f"ffmpeg returned an error ({process.returncode})"
-            f'\nthe ffmpeg command was "{formatted_command}"'
+            f'\nthe ffmpeg command was "{subprocess.list2cmdline(command)}"'
             "\nffmpeg gave this output:"
             "\n=====\n"
             f"{proc_err.decode('utf-8')}"
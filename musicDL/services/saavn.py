@@ -116,3 +116,22 @@ def extract_saavn_api_url(type_of_request: str, raw_json_data: dict[str, Any]) -
         raise ValueError("Failed to extract API URL")
 
     return url
+
+
+def extract_saavn_list_id(type_of_request: str, raw_json_data: dict[str, Any]) -> str:
+    """Returns the ID of an album or playlist, such as ``album/10496527``.
+
+    Args:
+        type_of_request: Type of request: ``album`` or ``playlist``
+        raw_json_data: Raw details of the album/playlist.
+
+    Raises:
+        ValueError: The request isn't of an album or a playlist.
+    """
+
+    if type_of_request == "album":
+        return f"album/{raw_json_data['albumView']['album']['id']}"
+    elif type_of_request == "playlist":
+        return f"playlist/{raw_json_data['playlist']['playlist']['id']}"
+
+    raise ValueError(f"No list ID for a {type_of_request}")
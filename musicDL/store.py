@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Content-addressed song store
+
+Songs shared by many albums and playlists are downloaded, converted and
+tagged once into the store, keyed by Saavn song ID, quality and format, and
+materialised into every output directory as a hardlink or a reflink, or as
+a copy where neither works (across filesystems).
+
+A hardlinked song is one file, retagging it in one output directory retags
+it everywhere. Reflinks (copy-on-write clones, on Btrfs or XFS) and copies
+are independent files.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LINK_METHODS = ("hardlink", "reflink", "copy")
+
+# ioctl cloning a file on Linux, see ioctl_ficlone(2)
+_FICLONE = 0x40049409
+
+
+def _hardlink(source: Path, target: Path) -> None:
+    os.link(source, target)
+
+
+def _reflink(source: Path, target: Path) -> None:
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are only supported on Linux")
+
+    import fcntl
+
+    with source.open("rb") as source_handle, target.open("wb") as target_handle:
+        try:
+            fcntl.ioctl(target_handle.fileno(), _FICLONE, source_handle.fileno())
+        except OSError:
+            target_handle.close()
+            target.unlink()
+            raise
+
+
+def _copy(source: Path, target: Path) -> None:
+    shutil.copy2(source, target)
+
+
+_LINKERS = {"hardlink": _hardlink, "reflink": _reflink, "copy": _copy}
+
+
+def link_file(source: Path, target: Path, method: str = "hardlink") -> str:
+    """Materialise a file at another path, replacing what is there.
+
+    Falls back from hardlinks to reflinks to copies.
+
+    Args:
+        source: The existing file.
+        target: Path of the new file.
+        method: ``hardlink``, ``reflink`` or ``copy``.
+
+    Returns:
+        The method that worked.
+    """
+
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.link")
+    for fallback in LINK_METHODS[LINK_METHODS.index(method) :]:
+        try:
+            _LINKERS[fallback](source, tmp_path)
+        except FileNotFoundError:
+            raise
+        except OSError as e:
+            logger.debug(f"No {fallback} from {source} to {target}: {e!r}")
+            continue
+
+        os.replace(tmp_path, target)
+        return fallback
+
+    # Copies only fail for good reasons, such as a full disk
+    raise OSError(f"Failed to materialise {source} at {target}")
+
+
+class ContentStore:
+    """Represents the store of the downloaded songs."""
+
+    def __init__(self, store_dir: str, link_method: str = "hardlink") -> None:
+        """Initialize `ContentStore`.
+
+        Args:
+            store_dir: Directory of the stored songs, created if missing.
+            link_method: How songs are materialised, ``hardlink``,
+                ``reflink`` or ``copy``.
+        """
+        self.store_dir = Path(store_dir)
+        self.link_method = link_method
+
+    def get_path(self, song_id: str, quality: str, suffix: str) -> Path:
+        """Returns the path of a song in the store.
+
+        Args:
+            song_id: Saavn ID of the song.
+            quality: Quality the song was downloaded in.
+            suffix: Extension of the song's format, such as ``.mp3``.
+        """
+
+        return self.store_dir.joinpath(quality.lower(), f"{song_id}{suffix.lower()}")
+
+    def add(self, song_id: str, quality: str, path: Path) -> Path:
+        """Put a downloaded song into the store, returns its path there.
+
+        A song stored before is kept, it is the same song.
+
+        Args:
+            song_id: Saavn ID of the song.
+            quality: Quality the song was downloaded in.
+            path: The downloaded song.
+        """
+
+        stored_path = self.get_path(song_id, quality, path.suffix)
+        if not stored_path.is_file():
+            stored_path.parent.mkdir(parents=True, exist_ok=True)
+            method = link_file(path, stored_path, self.link_method)
+            logger.debug(f"Stored {path} as {stored_path} ({method})")
+
+        return stored_path
+
+    def materialise(self, stored_path: Path, target: Path) -> str:
+        """Put a stored song into an output directory, returns how.
+
+        Raises:
+            FileNotFoundError: The song isn't in the store anymore.
+        """
+
+        method = link_file(stored_path, target, self.link_method)
+        logger.info(f"Materialised {target} from {stored_path} ({method})")
+
+        return method
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Album and playlist sync
+
+Albums and playlists downloaded again and again only get their new tracks
+downloaded. The tracks seen by the last sync are kept in the library index,
+the fresh track list is diffed against them and the tracks that are gone
+are reported.
+"""
+
+import logging
+from typing import Iterable, Iterator  # For static type checking
+
+from .library import LibraryIndex
+from .SongObj import SongObj
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistSync:
+    """Represents a sync of albums and playlists against their last sync."""
+
+    def __init__(self, library: LibraryIndex) -> None:
+        """Initialize `PlaylistSync`.
+
+        Args:
+            library: Library index keeping the track lists.
+        """
+        self.library = library
+        # Track lists of this sync, recorded once the songs are downloaded
+        self._tracks: dict[str, list[tuple[str, str]]] = {}
+        self.added = 0
+        self.removed: list[str] = []
+
+    def filter(self, list_id: str, song_objs: Iterable[SongObj]) -> Iterator[SongObj]:
+        """Yields the songs added to an album or playlist since its last sync.
+
+        Args:
+            list_id: ID of the album or playlist, see
+                :func:`musicDL.services.saavn.extract_saavn_list_id`.
+            song_objs: The songs of the album or playlist now.
+        """
+
+        previous = self.library.get_synced_tracks(list_id) or []
+        seen = {song_id for song_id, _ in previous}
+        tracks = self._tracks.setdefault(list_id, [])
+        added = 0
+
+        for song_obj in song_objs:
+            song_id = song_obj.get_song_id_saavn()
+            tracks.append((song_id, song_obj.get_title()))
+            if song_id not in seen:
+                added += 1
+                yield song_obj
+        self.added += added
+
+        fresh = {song_id for song_id, _ in tracks}
+        removed = [title for song_id, title in previous if song_id not in fresh]
+        for title in removed:
+            logger.info(f"Removed from {list_id}: {title}")
+        self.removed.extend(removed)
+
+        logger.info(
+            f"Sync of {list_id}: {len(tracks)} tracks,"
+            f" {added} added,"
+            f" {len(removed)} removed"
+        )
+
+    def save(self, failed: Iterable[str] = ()) -> None:
+        """Record the track lists, so that the next sync starts from them.
+
+        Args:
+            failed: IDs of the songs that weren't downloaded, tried again by
+                the next sync.
+        """
+
+        failed = set(failed)
+        for list_id, tracks in self._tracks.items():
+            self.library.set_synced_tracks(
+                list_id,
+                [
+                    (song_id, title)
+                    for song_id, title in tracks
+                    if song_id not in failed
+                ],
+            )
@@ -0,0 +1,839 @@
+#!/usr/bin/env python
+"""
+Transfer media files
+
+Downloads into a ``.part`` file that is renamed once complete. Interrupted
+transfers are continued with ``Range`` requests, validated with the
+``ETag``/``Last-Modified`` of the first attempt. Media can also be streamed
+into another process, such as ffmpeg, as it arrives.
+
+The socket is read into reused buffers, sized after the measured throughput,
+and a writer thread writes them to disk behind it, so that a slow disk only
+holds back the transfer once a few chunks are waiting.
+"""
+
+import concurrent.futures
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Optional  # For static type checking
+
+from requests.exceptions import (
+    ChunkedEncodingError,
+    ConnectionError,
+    HTTPError,
+    Timeout,
+)
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from .concurrency import TokenBucket
+from .handle_requests import get_retry_policy, http_get
+
+logger = logging.getLogger(__name__)
+
+PART_SUFFIX = ".part"
+
+# Enough to hold the header of a media file, such as the index of an MP4
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Chunks are sized to take about this long to arrive, within these bounds
+CHUNK_TIME = 0.1
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 512 * 1024
+
+# A preallocated file records what was written every this many bytes, a
+# transfer killed midway resumes from there
+CHECKPOINT_SIZE = 1024 * 1024
+
+# Bandwidth cap shared by all transfers, unlimited unless set
+_bandwidth: Optional[TokenBucket] = None
+
+
+def set_bandwidth_limit(rate: int) -> None:
+    """Cap the total bandwidth of all transfers.
+
+    Args:
+        rate: Bytes per second, ``0`` for unlimited.
+    """
+
+    global _bandwidth
+
+    _bandwidth = TokenBucket(rate) if rate else None
+
+
+def _throttle(size: int) -> None:
+    """Wait until the bandwidth cap allows another chunk of the given size."""
+
+    bandwidth = _bandwidth
+    if bandwidth is not None:
+        bandwidth.consume(size)
+
+
+class _BufferPool:
+    """Represents buffers reused by the transfers, rather than a new bytes
+    object per chunk."""
+
+    def __init__(self, size: int, max_free: int) -> None:
+        """Initialize `_BufferPool`.
+
+        Args:
+            size: Size of a buffer in bytes.
+            max_free: Number of unused buffers kept for later transfers.
+        """
+        self.size = size
+        self.max_free = max_free
+        self.allocated = 0
+        self._free: list[bytearray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bytearray:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+
+        return bytearray(self.size)
+
+    def release(self, buffer: bytearray) -> None:
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+
+_buffers = _BufferPool(MAX_CHUNK_SIZE, max_free=16)
+
+
+class _ChunkSizer:
+    """Represents the chunk size of a transfer, tuned to its throughput."""
+
+    def __init__(self) -> None:
+        self.size = 64 * 1024
+        self._rate = 0.0
+
+    def update(self, size: int, elapsed: float) -> None:
+        """Record a chunk of the given size that took ``elapsed`` seconds."""
+
+        if size < self.size or elapsed <= 0:
+            return None
+
+        rate = size / elapsed
+        self._rate = rate if not self._rate else 0.7 * self._rate + 0.3 * rate
+        size = int(self._rate * CHUNK_TIME) // MIN_CHUNK_SIZE * MIN_CHUNK_SIZE
+        self.size = min(max(size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+
+class _WriteBehind:
+    """Represents a thread writing chunks to a file behind the transfer.
+
+    At most ``queue_size`` chunks wait to be written, ``0`` writes them
+    right away in the transfer's thread.
+    """
+
+    def __init__(
+        self,
+        output_file: IO[bytes],
+        queue_size: int,
+        checkpoint: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """Initialize `_WriteBehind`.
+
+        Args:
+            output_file: The file the chunks are written to.
+            queue_size: Number of chunks waiting to be written.
+            checkpoint: Called with the number of bytes written, once flushed
+                to the file, every ``CHECKPOINT_SIZE`` bytes.
+        """
+        self.output_file = output_file
+        self.written = 0
+        self._checkpoint = checkpoint
+        self._checkpointed = 0
+        self._error: Optional[BaseException] = None
+        self._queue: Optional[
+            queue.Queue[Optional[tuple[Any, Optional[bytearray]]]]
+        ] = None
+        self._thread: Optional[threading.Thread] = None
+
+        if queue_size > 0:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._write_queued, daemon=True)
+            self._thread.start()
+
+    def write(self, data: Any, buffer: Optional[bytearray] = None) -> None:
+        """Write a chunk, returning the buffer it is in to the pool once written.
+
+        Raises:
+            OSError: An earlier chunk couldn't be written.
+        """
+
+        if self._error is not None:
+            raise self._error
+
+        if self._queue is None:
+            self._write(data, buffer)
+        else:
+            self._queue.put((data, buffer))
+
+    def _write(self, data: Any, buffer: Optional[bytearray]) -> None:
+        try:
+            self.output_file.write(data)
+            self.written += len(data)
+
+            if (
+                self._checkpoint is not None
+                and self.written - self._checkpointed >= CHECKPOINT_SIZE
+            ):
+                self.output_file.flush()
+                self._checkpoint(self.written)
+                self._checkpointed = self.written
+        finally:
+            if buffer is not None:
+                _buffers.release(buffer)
+
+    def _write_queued(self) -> None:
+        while True:
+            item = self._queue.get()  # type: ignore
+            if item is None:
+                return None
+
+            # Keep draining after an error, so that the transfer never blocks
+            if self._error is None:
+                try:
+                    self._write(*item)
+                    continue
+                except BaseException as e:
+                    self._error = e
+            if item[1] is not None:
+                _buffers.release(item[1])
+
+    def close(self) -> None:
+        """Wait for the chunks to be written.
+
+        Raises:
+            OSError: A chunk couldn't be written.
+        """
+
+        if self._thread is not None:
+            self._queue.put(None)  # type: ignore
+            self._thread.join()
+            self._thread = None
+
+        if self._error is not None:
+            raise self._error
+
+
+def _read_into(response: Any, view: memoryview) -> int:
+    """Read the next bytes of a response body into a buffer.
+
+    Returns:
+        The number of bytes read, ``0`` at the end of the body.
+
+    Raises:
+        ChunkedEncodingError: The connection broke off, as ``iter_content``
+            raises it.
+        ConnectionError: The server stopped sending.
+    """
+
+    try:
+        return int(response.raw.readinto(view))
+    except ProtocolError as e:
+        raise ChunkedEncodingError(e)
+    except ReadTimeoutError as e:
+        raise ConnectionError(e)
+
+
+def _copy_response(
+    response: Any,
+    writer: _WriteBehind,
+    total: int,
+    displayProgressTracker: Optional[Any],
+    progress_lock: Optional[threading.Lock] = None,
+) -> None:
+    """Write the body of a response as it arrives.
+
+    Args:
+        response: A streamed ``requests.Response``.
+        writer: Writes the chunks to the file.
+        total: Size of the complete file, for the progress bar.
+        displayProgressTracker: Progress tracker for the song.
+        progress_lock: Held while updating the progress bar, if shared.
+    """
+
+    def update_progress(chunk: Any) -> None:
+        if displayProgressTracker and total:
+            if progress_lock is None:
+                displayProgressTracker.update_progress_bar(total, chunk)
+            else:
+                with progress_lock:
+                    displayProgressTracker.update_progress_bar(total, chunk)
+
+    # Compressed bodies need decoding, they are read in chunks of their own
+    if response.headers.get("content-encoding", "identity") != "identity":
+        for ch in response.iter_content(chunk_size=MAX_CHUNK_SIZE):
+            if ch:
+                _throttle(len(ch))
+                writer.write(ch)
+                update_progress(ch)
+        return None
+
+    sizer = _ChunkSizer()
+    while True:
+        buffer = _buffers.acquire()
+        start = time.monotonic()
+        try:
+            size = _read_into(response, memoryview(buffer)[: sizer.size])
+        except BaseException:
+            _buffers.release(buffer)
+            raise
+
+        if not size:
+            _buffers.release(buffer)
+            return None
+
+        sizer.update(size, time.monotonic() - start)
+        _throttle(size)
+        chunk = memoryview(buffer)[:size]
+        update_progress(chunk)
+        writer.write(chunk, buffer)
+
+
+def _check_length(response: Any, written: int, expected: int) -> None:
+    """Make sure the whole body was received, urllib3 1.x doesn't.
+
+    Args:
+        response: The streamed ``requests.Response``.
+        written: Number of bytes written from the body.
+        expected: Size of the body as announced.
+
+    Raises:
+        ChunkedEncodingError: The body was cut short, the transfer is resumed.
+    """
+
+    # The announced size of a compressed body isn't what is written
+    if response.headers.get("content-encoding", "identity") != "identity":
+        return None
+
+    if written != expected:
+        raise ChunkedEncodingError(f"Received {written} of {expected} bytes")
+
+
+def _preallocate(output_file: IO[bytes], offset: int, total: int) -> bool:
+    """Reserve the disk space of the rest of a file, where supported.
+
+    Returns:
+        Whether the space was reserved, the file is then ``total`` bytes.
+    """
+
+    if total <= offset or not hasattr(os, "posix_fallocate"):
+        return False
+
+    try:
+        os.posix_fallocate(output_file.fileno(), offset, total - offset)
+    except OSError as e:
+        logger.debug(f"Preallocating {output_file.name} failed: {e!r}")
+        return False
+
+    return True
+
+
+def get_part_path(output_file_path: Path) -> Path:
+    """Returns the path of the partial download of a file.
+
+    Args:
+        output_file_path: Path of the complete file.
+    """
+
+    return output_file_path.with_name(output_file_path.name + PART_SUFFIX)
+
+
+def _get_range_start(response: Any) -> int:
+    """Returns the first byte of a partial response, -1 if it isn't partial.
+
+    Args:
+        response: A ``requests.Response`` to a request with a ``Range`` header.
+    """
+
+    match = re.match(r"bytes (\d+)-", response.headers.get("content-range", ""))
+
+    if response.status_code != 206 or not match:
+        return -1
+
+    return int(match.group(1))
+
+
+def _get_range_total(response: Any) -> int:
+    """Returns the complete size from a partial response, 0 if it isn't partial.
+
+    Args:
+        response: A ``requests.Response`` to a request with a ``Range`` header.
+    """
+
+    match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("content-range", ""))
+
+    if response.status_code != 206 or not match:
+        return 0
+
+    return int(match.group(1))
+
+
+def _get_unsatisfied_total(response: Any) -> int:
+    """Returns the complete size from a 416 response, -1 if it isn't given.
+
+    Args:
+        response: A ``requests.Response`` to a request with a ``Range`` header.
+    """
+
+    match = re.match(r"bytes \*/(\d+)", response.headers.get("content-range", ""))
+
+    if response.status_code != 416 or not match:
+        return -1
+
+    return int(match.group(1))
+
+
+def _get_validator(response: Any) -> str:
+    """Returns the ``ETag`` or else the ``Last-Modified`` header of a response.
+
+    Weak ETags can't be used with ``If-Range``, so they are ignored.
+    """
+
+    etag = response.headers.get("etag", "")
+    if etag and not etag.startswith("W/"):
+        return str(etag)
+
+    return str(response.headers.get("last-modified", ""))
+
+
+class _PartFile:
+    """Represents a partial download and its sidecar state file.
+
+    The state file records the URL, the validator of the response and for
+    segmented downloads the size and the byte ranges already written.
+    """
+
+    def __init__(self, output_file_path: Path, url: str) -> None:
+        self.path = get_part_path(output_file_path)
+        self.state_path = self.path.with_name(self.path.name + ".json")
+        self.output_file_path = output_file_path
+        self.url = url
+        self.lock = threading.Lock()
+        self.state: dict[str, Any] = {}
+
+        if self.path.is_file() and self.state_path.is_file():
+            try:
+                state = json.loads(self.state_path.read_text(encoding="UTF-8"))
+            except ValueError:
+                state = {}
+
+            # Only continue a transfer of the same URL that can be validated
+            if state.get("url") == url and state.get("validator"):
+                self.state = state
+
+    @property
+    def validator(self) -> str:
+        return str(self.state.get("validator", ""))
+
+    def get_resume_offset(self) -> int:
+        """Returns the number of bytes at the start of the file already written."""
+
+        if not self.validator:
+            return 0
+
+        if "done" not in self.state:
+            return self.path.stat().st_size
+
+        # Contiguous bytes written from the start of a segmented download
+        offset = 0
+        for start, end in sorted(self.state["done"]):
+            if start > offset:
+                break
+            offset = max(offset, end + 1)
+
+        return offset
+
+    def get_missing_ranges(self, total: int, validator: str) -> list[tuple[int, int]]:
+        """Returns the byte ranges still to be downloaded.
+
+        Anything written earlier is discarded if the server's copy changed.
+
+        Args:
+            total: Size of the complete file.
+            validator: ``ETag`` or ``Last-Modified`` of the server's copy.
+        """
+
+        if validator != self.validator or self.state.get("total", total) != total:
+            self.state = {}
+
+        done = self.state.get("done")
+        if done is None:
+            done = [[0, self.get_resume_offset() - 1]] if self.validator else []
+
+        missing = []
+        offset = 0
+        for start, end in sorted(done):
+            if start > offset:
+                missing.append((offset, start - 1))
+            offset = max(offset, end + 1)
+        if offset < total:
+            missing.append((offset, total - 1))
+
+        self.state = {
+            "url": self.url,
+            "validator": validator,
+            "total": total,
+            "done": [list(span) for span in done if span[0] <= span[1]],
+        }
+
+        return missing
+
+    def start(self, validator: str) -> None:
+        """Record the validator of a transfer before its body is written."""
+
+        self.state = {"url": self.url, "validator": validator}
+        self.save_state()
+
+    def mark_done(self, start: int, end: int) -> None:
+        """Record a byte range as written to the file.
+
+        A range recorded before from the same start is extended.
+        """
+
+        with self.lock:
+            self.state["done"] = [
+                span for span in self.state["done"] if span[0] != start
+            ] + [[start, end]]
+            self.save_state()
+
+    def save_state(self) -> None:
+        self.state_path.write_text(json.dumps(self.state), encoding="UTF-8")
+
+    def complete(self) -> None:
+        """Move the complete file into place and drop the state file."""
+
+        os.replace(self.path, self.output_file_path)
+        if self.state_path.exists():
+            self.state_path.unlink()
+
+
+def download_media(
+    url: str,
+    output_file_path: Path,
+    segments: int = 1,
+    segment_min_size: int = 1024 * 1024,
+    displayProgressTracker: Optional[Any] = None,
+    preallocate: bool = False,
+    write_behind: int = 4,
+) -> None:
+    """Download a media file, continuing an earlier partial download if any.
+
+    A transfer that fails or breaks off midway is retried following the
+    retry policy of :mod:`musicDL.handle_requests`, continuing where it
+    stopped. The requests of the transfer aren't retried on their own, so
+    that the whole transfer has one retry budget.
+
+    Args:
+        url: URL of the media.
+        output_file_path: Path where the media is saved.
+        segments: Maximum number of parallel connections (HTTP Range).
+        segment_min_size: Minimum size of a segment in bytes.
+        displayProgressTracker: Progress tracker for the song.
+        preallocate: Reserve the disk space of the file before writing it.
+        write_behind: Number of chunks waiting to be written to disk before
+            the transfer waits, ``0`` to write them right away.
+    """
+
+    retry_policy = get_retry_policy()
+    attempt = 0
+
+    while True:
+        try:
+            return _download_media(
+                url,
+                output_file_path,
+                segments,
+                segment_min_size,
+                displayProgressTracker,
+                preallocate,
+                write_behind,
+            )
+        except (ConnectionError, Timeout, ChunkedEncodingError, HTTPError) as e:
+            response = e.response if isinstance(e, HTTPError) else None
+            status_code = None if response is None else response.status_code
+            if not retry_policy.should_retry(attempt, status_code):
+                raise
+
+            delay = retry_policy.get_delay(attempt, response)
+            logger.warning(f"{e!r}, resuming in {delay:.1f}s: {url}")
+            time.sleep(delay)
+            attempt += 1
+
+
+def _download_media(
+    url: str,
+    output_file_path: Path,
+    segments: int,
+    segment_min_size: int,
+    displayProgressTracker: Optional[Any],
+    preallocate: bool,
+    write_behind: int,
+) -> None:
+    """Download a media file once, see :func:`download_media`."""
+
+    part_file = _PartFile(output_file_path, url)
+
+    if segments > 1:
+        # Probe for Range support, the server answers with the first byte
+        # and the total size or ignores the header and sends the whole file
+        response = http_get(
+            url, stream=True, headers={"Range": "bytes=0-0"}, retry=False
+        )
+        total = _get_range_total(response)
+
+        if total:
+            response.close()
+            _download_segmented(
+                url,
+                part_file,
+                total,
+                _get_validator(response),
+                segments,
+                segment_min_size,
+                displayProgressTracker,
+                preallocate,
+                write_behind,
+            )
+            part_file.complete()
+            return None
+
+        logger.debug(f"Range not supported, downloading in one go: {url}")
+        offset = 0
+    else:
+        offset = part_file.get_resume_offset()
+        headers = {}
+        if offset:
+            headers = {"Range": f"bytes={offset}-", "If-Range": part_file.validator}
+        try:
+            response = http_get(url, stream=True, headers=headers, retry=False)
+        except HTTPError as e:
+            if not offset or e.response is None or e.response.status_code != 416:
+                raise
+            e.response.close()
+
+            # Nothing left after the offset: the body was written but not moved
+            # into place, or the partial download is bigger than the media
+            if _get_unsatisfied_total(e.response) == offset:
+                logger.debug(f"Partial download already complete: {url}")
+                part_file.complete()
+                return None
+
+            logger.debug(f"Partial download doesn't fit, starting over: {url}")
+            part_file.state = {}
+            offset = 0
+            response = http_get(url, stream=True, retry=False)
+
+    with response:
+        if offset and _get_range_start(response) == offset:
+            logger.debug(f"Resuming download at byte {offset}: {url}")
+            mode = "r+b"
+        else:
+            offset = 0
+            mode = "wb"
+
+        part_file.start(_get_validator(response))
+
+        with part_file.path.open(mode) as output_file:
+            output_file.seek(offset)
+            output_file.truncate()
+
+            total = int(response.headers.get("content-length", 0))
+            if total:
+                total += offset
+                if offset and displayProgressTracker:
+                    displayProgressTracker.notify_download_resume(total, offset)
+
+            # The preallocated file is as big as the complete one, what was
+            # written is recorded for resuming instead, before the file grows
+            preallocated = preallocate and total > offset
+            if preallocated:
+                part_file.state.update(
+                    total=total, done=[[0, offset - 1]] if offset else []
+                )
+                part_file.save_state()
+                _preallocate(output_file, offset, total)
+
+            def checkpoint(written: int) -> None:
+                part_file.mark_done(offset, offset + written - 1)
+
+            writer = _WriteBehind(
+                output_file, write_behind, checkpoint if preallocated else None
+            )
+            try:
+                try:
+                    _copy_response(response, writer, total, displayProgressTracker)
+                finally:
+                    writer.close()
+                if total:
+                    _check_length(response, writer.written, total - offset)
+            finally:
+                if preallocated and writer.written:
+                    part_file.mark_done(offset, offset + writer.written - 1)
+
+    part_file.complete()
+
+
+def _download_segmented(
+    url: str,
+    part_file: _PartFile,
+    total: int,
+    validator: str,
+    segments: int,
+    segment_min_size: int,
+    displayProgressTracker: Optional[Any],
+    preallocate: bool,
+    write_behind: int,
+) -> None:
+    """Download the media as byte ranges over parallel connections.
+
+    The file is created at its full size and each range is written at its
+    offset.
+
+    Args:
+        url: URL of the media.
+        part_file: The partial download.
+        total: Size of the media in bytes.
+        validator: ``ETag`` or ``Last-Modified`` of the media.
+        segments: Maximum number of parallel connections.
+        segment_min_size: Minimum size of a segment in bytes.
+        displayProgressTracker: Progress tracker for the song.
+        preallocate: Reserve the disk space of the file, rather than a sparse
+            file.
+        write_behind: Number of chunks of a segment waiting to be written.
+    """
+
+    missing = part_file.get_missing_ranges(total, validator)
+
+    # Small files aren't worth the extra connections
+    missing_size = sum(end - start + 1 for start, end in missing)
+    segment_size = max(-(-missing_size // segments), segment_min_size)
+    ranges = [
+        (start, min(start + segment_size - 1, end))
+        for span_start, end in missing
+        for start in range(span_start, end + 1, segment_size)
+    ]
+    logger.debug(f"Downloading {missing_size} bytes in {len(ranges)} segments: {url}")
+
+    mode = "r+b" if part_file.path.exists() else "wb"
+    with part_file.path.open(mode) as output_file:
+        if not (preallocate and _preallocate(output_file, 0, total)):
+            output_file.truncate(total)
+    part_file.save_state()
+
+    if missing_size < total and displayProgressTracker:
+        displayProgressTracker.notify_download_resume(total, total - missing_size)
+
+    progress_lock = threading.Lock()
+
+    def download_range(start: int, end: int) -> None:
+        headers = {"Range": f"bytes={start}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        with http_get(url, stream=True, headers=headers, retry=False) as response:
+            if _get_range_start(response) != start:
+                raise ValueError(f"Server ignored the byte range {start}-{end}")
+
+            with part_file.path.open("r+b") as output_file:
+                output_file.seek(start)
+                writer = _WriteBehind(
+                    output_file,
+                    write_behind,
+                    lambda written: part_file.mark_done(start, start + written - 1),
+                )
+                try:
+                    try:
+                        _copy_response(
+                            response,
+                            writer,
+                            total,
+                            displayProgressTracker,
+                            progress_lock,
+                        )
+                    finally:
+                        writer.close()
+                finally:
+                    # Resumed after what was written, also if cut short
+                    if writer.written:
+                        part_file.mark_done(start, start + writer.written - 1)
+                _check_length(response, writer.written, end - start + 1)
+
+        part_file.mark_done(start, end)
+
+    if not ranges:
+        return None
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(segments, len(ranges))
+    ) as segment_executor:
+        futures = [
+            segment_executor.submit(download_range, start, end) for start, end in ranges
+        ]
+        # Re-raise the first error, if any segment failed
+        for future in futures:
+            future.result()
+
+
+def stream_media(
+    url: str,
+    open_stream: Callable[[bytes], Optional[IO[bytes]]],
+    output_file_path: Path,
+    displayProgressTracker: Optional[Any] = None,
+) -> bool:
+    """Download a media file into a stream, such as the stdin of ffmpeg.
+
+    The stream is opened once the first chunk arrived. A media that can't be
+    streamed is saved to a file instead, as :func:`download_media` does but
+    in one go. Streams can't be resumed, a broken transfer raises.
+
+    Args:
+        url: URL of the media.
+        open_stream: Called with the first chunk, returns the stream to write
+            the media into or ``None`` to save it to a file.
+        output_file_path: Path where the media is saved, if it isn't streamed.
+        displayProgressTracker: Progress tracker for the song.
+
+    Returns:
+        Whether the media was streamed.
+    """
+
+    with http_get(url, stream=True) as response:
+        total = int(response.headers.get("content-length", 0))
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        head = next(chunks, b"")
+
+        stream = open_stream(head)
+        part_file = None
+        if stream is None:
+            logger.debug(f"Media can't be streamed, saving it first: {url}")
+            part_file = _PartFile(output_file_path, url)
+            part_file.start(_get_validator(response))
+            stream = part_file.path.open("wb")
+
+        try:
+            for ch in itertools.chain([head], chunks):
+                if ch:
+                    _throttle(len(ch))
+                    stream.write(ch)
+                    if displayProgressTracker and total:
+                        displayProgressTracker.update_progress_bar(total, ch)
+        finally:
+            if part_file is not None:
+                stream.close()
+
+    if part_file is not None:
+        part_file.complete()
+
+    return part_file is None
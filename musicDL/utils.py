@@ -3,9 +3,13 @@
 
 import base64
 import copy
+import functools
 import json
 import logging
+import re
+from pathlib import Path
 from typing import Any  # For static type checking
+from urllib.parse import urlsplit
 
 from .vendor.pyDes import ECB, PAD_PKCS5, des
 
@@ -95,6 +99,16 @@ def get_decrypted_url(encrypt_url: str, quality: str, is_320kbps: bool) -> str:
     return url.replace("_96.mp4", f"{bit_rate}.{extension}")
 
 
+@functools.lru_cache(maxsize=None)
+def _get_language_codes() -> dict[str, str]:
+    """Returns the ISO 639-2/B language codes by language name, loaded once."""
+
+    lang_codes_path = Path(__file__).with_name("lang_codes.json")
+    with lang_codes_path.open("r", encoding="UTF-8") as lang_codes_file:
+        return dict(json.load(lang_codes_file))
+
+
+@functools.lru_cache(maxsize=None)
 def get_language_code(lang: str) -> str:
     """Returns ISO 639-2/B language code of the language.
 
@@ -106,14 +120,64 @@ def get_language_code(lang: str) -> str:
         If the language was not passed or not found it will return ``eng``.
     """
 
-    # Load the language codes
-    lang_dict = json.load(open("lang_codes.json", "r", encoding="UTF-8"))
+    lang_dict = _get_language_codes()
     if lang in lang_dict.keys():
         logger.info(f"LANGUAGE: {lang}")
         return lang_dict[lang]
     return "eng"
 
 
+def get_media_url_variants(media_url: str, output_format: str) -> list[str]:
+    """Returns URLs of copies of a media in another format, best first.
+
+    The CDN keeps MP3 copies (``h.saavncdn.com``) of the MP4/AAC media
+    (``aac.saavncdn.com``), not necessarily of every bitrate. Copies of a
+    lower bitrate than the media aren't offered.
+
+    Args:
+        media_url: Decrypted media URL.
+        output_format: Format the media is converted to, such as ``mp3``.
+
+    Returns:
+        The URLs, none if the media is in the output format already.
+    """
+
+    match = re.fullmatch(r"(.*?)(_\d+)?\.(mp4|mp3)", media_url)
+    if match is None:
+        return []
+
+    base, bit_rate, extension = match.groups()
+    bit_rate = bit_rate or ""
+
+    if extension == "mp4" and output_format == "mp3":
+        base = base.replace("https://aac", "http://h")
+        variants = [f"{base}{bit_rate}.mp3"]
+        if bit_rate == "_96":
+            # The medium quality copy, of a higher bitrate
+            variants.append(f"{base}.mp3")
+        return variants
+    elif extension == "mp3" and output_format in ("aac", "m4a"):
+        base = base.replace("http://h", "https://aac")
+        return [f"{base}{bit_rate or '_160'}.mp4"]
+
+    return []
+
+
+def get_bitrate_from_url(url: str) -> int:
+    """Returns the bitrate of a media file from its URL, ``0`` if it doesn't tell.
+
+    Args:
+        url: Decrypted media URL, such as ``..._320.mp4`` for 320 kbps.
+
+    Returns:
+        The bitrate in bits per second.
+    """
+
+    match = re.search(r"_(\d+)\.mp4$", urlsplit(url).path)
+
+    return int(match.group(1)) * 1000 if match else 0
+
+
 def get_file_name(url: str, first_part: str, second_part: str) -> str:
     """Returns file name from given url, first and second part.
 
@@ -168,3 +232,28 @@ def get_milliseconds(timing: str) -> int:
     milliseconds = int(parts[1])
 
     return (minutes * 60 * 1000) + (seconds * 1000) + (milliseconds * 10)
+
+
+def parse_size(size: Any) -> int:
+    """Returns the number of bytes of a size such as ``512K`` or ``2M``.
+
+    Args:
+        size: A number of bytes, optionally with a ``K``, ``M`` or ``G`` suffix.
+
+    Returns:
+        The number of bytes, ``0`` if no size was given.
+
+    Raises:
+        ValueError: An error occurred parsing the size.
+    """
+
+    if not size:
+        return 0
+
+    size = str(size).strip().upper()
+    multipliers = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+
+    return int(size)
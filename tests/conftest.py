@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""Shared fixtures for musicDL tests."""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from musicDL.config import Config
+from musicDL.vendor.pyDes import ECB, PAD_PKCS5, des
+
+
+class _LocalHandler(BaseHTTPRequestHandler):
+    """Serves the routes registered on the local test server."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connection_count += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.request_count += 1
+            if "Range" in self.headers:
+                self.server.range_requests.append(self.headers["Range"])
+            failures = self.server.failures.get(self.path) or [None]
+            failure = failures.pop(0)
+
+        if isinstance(failure, int):
+            self.send_response(failure)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = self.server.routes.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        byte_range = self.headers.get("Range", "")
+        if self.headers.get("If-Range", etag) != etag:
+            # The client's copy is outdated, send the whole body
+            byte_range = ""
+
+        if byte_range and self.server.accept_ranges:
+            start, _, end = byte_range.replace("bytes=", "").partition("-")
+            start, end = int(start), int(end or len(body) - 1)
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            body = body[start : end + 1]
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+        if failure == "truncate":
+            # Drop the connection halfway through the body
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+
+        self._write_slowly(body)
+
+    def do_HEAD(self):
+        with self.server.lock:
+            self.server.head_requests.append(self.path)
+
+        body = self.server.routes.get(self.path)
+        self.send_response(404 if body is None else 200)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+
+    def _write_slowly(self, body):
+        """Write the body in pieces, spread over the server's response delay."""
+        pieces = 10 if self.server.delay else 1
+        size = -(-len(body) // pieces) or 1
+        for start in range(0, len(body), size):
+            time.sleep(self.server.delay / pieces)
+            self.wfile.write(body[start : start + size])
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. after a Range probe
+        pass
+
+
+class LocalServer:
+    """A local HTTP/1.1 keep-alive server standing in for Saavn and its CDN."""
+
+    def __init__(self, handler=_LocalHandler):
+        self.httpd = _QuietHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.routes = {}
+        self.httpd.connection_count = 0
+        self.httpd.request_count = 0
+        self.httpd.delay = 0.0
+        self.httpd.accept_ranges = True
+        self.httpd.range_requests = []
+        self.httpd.head_requests = []
+        self.httpd.failures = {}
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    @property
+    def routes(self):
+        return self.httpd.routes
+
+    @property
+    def delay(self):
+        return self.httpd.delay
+
+    @delay.setter
+    def delay(self, seconds):
+        """Time it takes the server to send every response body."""
+        self.httpd.delay = seconds
+
+    @property
+    def accept_ranges(self):
+        return self.httpd.accept_ranges
+
+    @accept_ranges.setter
+    def accept_ranges(self, value):
+        """Whether the server honours ``Range`` headers or sends the whole body."""
+        self.httpd.accept_ranges = value
+
+    @property
+    def range_requests(self):
+        return self.httpd.range_requests
+
+    @property
+    def head_requests(self):
+        return self.httpd.head_requests
+
+    @property
+    def failures(self):
+        """Failures to serve per path before its body: status codes or "truncate"."""
+        return self.httpd.failures
+
+    @property
+    def connection_count(self):
+        return self.httpd.connection_count
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def url(self, path):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def local_server():
+    """Fixture: That runs a local HTTP server for the duration of a test."""
+    server = LocalServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def download_config(tmp_path, monkeypatch):
+    """Fixture: That configures musicDL to download into a temp directory.
+
+    Lyrics, tags and backups are disabled. Returns a function that can be
+    used to override config options.
+    """
+    output = tmp_path.joinpath("output")
+    output.mkdir()
+    # Tracking files are written to the current directory
+    monkeypatch.chdir(tmp_path)
+
+    config = Config.get_default_config()
+    config.update(
+        {
+            "output": str(output),
+            "no-lyrics": True,
+            "no-tags": True,
+            "save-lyrics": False,
+            "backup": False,
+            "debug-file": str(tmp_path.joinpath("main.log")),
+            "host-stats-file": str(tmp_path.joinpath("hosts.json")),
+            "library-file": str(tmp_path.joinpath("library.sqlite3")),
+        }
+    )
+
+    def set_options(**options):
+        config.update({key.replace("_", "-"): value for key, value in options.items()})
+        config_path = tmp_path.joinpath("config.json")
+        config_path.write_text(json.dumps(config))
+        Config.set_config(str(config_path), {})
+        return config
+
+    set_options()
+    return set_options
+
+
+@pytest.fixture
+def song_factory():
+    """Fixture: That returns a function creating Saavn song dicts for a media URL."""
+    cipher = des(b"38346591", ECB, b"\0\0\0\0\0\0\0\0", pad=None, padmode=PAD_PKCS5)
+
+    def make_song(song_id, media_url, **fields):
+        encrypted = cipher.encrypt(media_url.encode(), padmode=PAD_PKCS5)
+        song = {
+            "id": song_id,
+            "song": f"Song {song_id}",
+            "album": "Album",
+            "primary_artists": "Artist",
+            "encrypted_media_url": base64.b64encode(encrypted).decode(),
+            "320kbps": "false",
+            "image": "",
+        }
+        song.update(fields)
+        return song
+
+    return make_song
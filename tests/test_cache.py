@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""Collection of tests around the on-disk HTTP cache."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from musicDL.cache import HTTPCache
+from musicDL import handle_requests
+from musicDL.handle_requests import (
+    configure_cache,
+    http_get_cached,
+    http_head_exists,
+    http_iter_cached,
+)
+
+
+# Arrange
+@pytest.fixture
+def cache_dir(tmp_path):
+    """Fixture: That enables the HTTP cache in a temp directory."""
+    cache_dir = tmp_path.joinpath("http")
+    configure_cache(str(cache_dir), ttl=3600, max_size=1024 * 1024)
+    yield cache_dir
+    configure_cache(None, ttl=0, max_size=0)
+
+
+@pytest.fixture
+def album_page(local_server):
+    """Fixture: That serves an album page and returns its URL."""
+    local_server.routes["/album/a"] = b"<html>window.__INITIAL_DATA__ = {}</html>"
+    return local_server.url("/album/a")
+
+
+def test_http_get_cached_fresh(cache_dir, album_page, local_server):
+    """Test a fresh cached response costs no request."""
+    first = http_get_cached(album_page)
+    second = http_get_cached(album_page)
+
+    assert first == second == local_server.routes["/album/a"]
+    assert local_server.request_count == 1
+
+
+def test_http_get_cached_revalidate(cache_dir, album_page, local_server):
+    """Test an expired response is revalidated with one conditional request."""
+    configure_cache(str(cache_dir), ttl=0, max_size=1024 * 1024)
+
+    http_get_cached(album_page)
+    assert http_get_cached(album_page) == local_server.routes["/album/a"]
+
+    assert local_server.request_count == 2
+
+    # The page changed on the server
+    local_server.routes["/album/a"] = b"<html>new</html>"
+    assert http_get_cached(album_page) == b"<html>new</html>"
+
+
+def test_http_get_cached_force_revalidate(cache_dir, album_page, local_server):
+    """Test a fresh response is revalidated when asked, not downloaded again."""
+    http_get_cached(album_page)
+    assert http_get_cached(album_page, revalidate=True) == b"".join(
+        http_iter_cached(album_page, revalidate=True)
+    )
+    assert local_server.request_count == 3
+
+    # Tracks added on the server show up although the entry was still fresh
+    local_server.routes["/album/a"] = b"<html>new</html>"
+    assert http_get_cached(album_page) != b"<html>new</html>"
+    assert http_get_cached(album_page, revalidate=True) == b"<html>new</html>"
+
+
+def test_http_get_cached_disabled(album_page, local_server):
+    """Test every call is a request if the cache is disabled."""
+    configure_cache(None, ttl=0, max_size=0)
+
+    http_get_cached(album_page)
+    http_get_cached(album_page)
+
+    assert local_server.request_count == 2
+
+
+def test_cache_lru_eviction(tmp_path):
+    """Test the least recently used entries are evicted beyond the size limit."""
+    cache = HTTPCache(str(tmp_path), ttl=3600, max_size=350)
+
+    for last_used, url in enumerate(["/a", "/b", "/c"], start=1):
+        cache.put(url, b"x" * 100, {})
+        os.utime(cache._get_paths(url)[0], (last_used, last_used))
+
+    # Using "/a" makes "/b" the least recently used
+    assert cache.get("/a").body == b"x" * 100
+    cache.put("/d", b"x" * 100, {})
+
+    assert cache.get("/b") is None
+    assert cache.get("/a") is not None
+    assert cache.get("/c") is not None
+    assert cache.get("/d") is not None
+
+
+def test_cache_lru_index(tmp_path, mocker):
+    """Test the cache directory is scanned once, the order kept between runs."""
+    cache = HTTPCache(str(tmp_path), ttl=3600, max_size=350)
+    for last_used, url in enumerate(["/a", "/b", "/c"], start=1):
+        cache.put(url, b"x" * 100, {})
+        os.utime(cache._get_paths(url)[0], (last_used, last_used))
+
+    # A new run, "/a" is the least recently used on disk
+    cache = HTTPCache(str(tmp_path), ttl=3600, max_size=350)
+    glob = mocker.spy(Path, "glob")
+    cache.put("/d", b"x" * 100, {})
+    cache.put("/e", b"x" * 10, {})
+
+    assert cache.get("/a") is None
+    assert cache.get("/b") is not None
+    assert cache._size == 310
+    assert glob.call_count == 1
+    assert len(list(tmp_path.glob("*.json"))) == 4
+
+
+def test_http_head_exists_cached(cache_dir, album_page, local_server, monkeypatch):
+    """Test probes are answered from memory, then from the on-disk cache."""
+    missing = local_server.url("/album/b")
+
+    assert http_head_exists(album_page)
+    assert not http_head_exists(missing)
+    assert http_head_exists(album_page)
+
+    # A new run
+    monkeypatch.setattr(handle_requests, "_head_results", {})
+    assert http_head_exists(album_page)
+    assert not http_head_exists(missing)
+
+    assert local_server.head_requests == ["/album/a", "/album/b"]
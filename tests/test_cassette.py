@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's HTTP record/replay cassette."""
+
+import os
+import time
+
+import pytest
+import requests
+
+from musicDL import handle_requests
+from musicDL.cassette import Cassette, CassetteAdapter, CassetteError
+from musicDL.handle_requests import (
+    close_session,
+    configure_cassette,
+    configure_retries,
+    http_get,
+    mount_cassette,
+)
+
+
+# Arrange
+@pytest.fixture(autouse=True)
+def no_cassette():
+    """Fixture: That leaves the shared session without a cassette after a test."""
+    yield
+    configure_cassette(None)
+    configure_retries()
+    close_session()
+
+
+def _session(cassette):
+    session = requests.Session()
+    session.mount("http://", CassetteAdapter(cassette))
+    return session
+
+
+def test_record_and_replay(local_server, tmp_path):
+    """Test recorded responses are replayed without the server."""
+
+    # Arrange
+    path = tmp_path.joinpath("run.cassette")
+    local_server.routes["/api.php"] = b'{"songs": []}'
+    local_server.routes["/song.mp4"] = bytes(range(256)) * 100
+
+    recorder = Cassette(str(path), mode="record")
+    with _session(recorder) as session:
+        recorded = session.get(local_server.url("/api.php"))
+        recorded_range = session.get(
+            local_server.url("/song.mp4"), headers={"Range": "bytes=100-199"}
+        )
+        session.get(local_server.url("/song.mp4"))
+    recorder.close()
+    local_server.stop()
+
+    # Act
+    player = Cassette(str(path), mode="replay", speed=float("inf"))
+    with _session(player) as session:
+        replayed = session.get(local_server.url("/api.php"))
+        replayed_range = session.get(
+            local_server.url("/song.mp4"), headers={"Range": "bytes=100-199"}
+        )
+        replayed_other_range = session.get(
+            local_server.url("/song.mp4"), headers={"Range": "bytes=0-99"}
+        )
+        with pytest.raises(CassetteError):
+            session.get(local_server.url("/unknown"))
+    player.close()
+
+    # Assert
+    assert replayed.status_code == recorded.status_code == 200
+    assert replayed.content == recorded.content == b'{"songs": []}'
+    assert replayed.headers["ETag"] == recorded.headers["ETag"]
+    assert replayed_range.status_code == recorded_range.status_code == 206
+    assert replayed_range.content == bytes(range(100, 200))
+    # A Range that wasn't recorded gets the whole recorded body
+    assert replayed_other_range.status_code == 200
+    assert replayed_other_range.content == bytes(range(256)) * 100
+
+
+def test_record_writes_bodies_as_they_arrive(local_server, tmp_path):
+    """Test recorded bodies go to disk right away, not kept until saved."""
+
+    # Arrange
+    path = tmp_path.joinpath("run.cassette")
+    media = os.urandom(1024 * 1024)
+    local_server.routes["/song.mp4"] = media
+
+    # Act
+    with Cassette(str(path), mode="record") as recorder:
+        with _session(recorder) as session:
+            session.get(local_server.url("/song.mp4"))
+            session.get(local_server.url("/song.mp4"))
+
+        (recording,) = tmp_path.glob("run.cassette.*.tmp")
+        assert recording.stat().st_size >= len(media)
+        assert not path.exists()
+
+    # Assert
+    assert not recording.exists()
+    with Cassette(str(path), mode="replay", speed=float("inf")) as player:
+        with _session(player) as session:
+            assert session.get(local_server.url("/song.mp4")).content == media
+
+
+def test_replay_keeps_bandwidth(local_server, tmp_path):
+    """Test a body is replayed as slowly as it was recorded, or scaled."""
+
+    # Arrange
+    path = tmp_path.joinpath("run.cassette")
+    local_server.routes["/song.mp4"] = b"x" * 64 * 1024
+    local_server.delay = 0.4
+
+    recorder = Cassette(str(path), mode="record")
+    with _session(recorder) as session:
+        session.get(local_server.url("/song.mp4"))
+    recorder.close()
+
+    # Act
+    timings = []
+    for speed in (1.0, 4.0):
+        player = Cassette(str(path), mode="replay", speed=speed)
+        start = time.perf_counter()
+        with _session(player) as session:
+            content = session.get(local_server.url("/song.mp4"), stream=True).content
+        timings.append(time.perf_counter() - start)
+        player.close()
+
+    # Assert
+    assert content == b"x" * 64 * 1024
+    assert 0.3 <= timings[0] < 1.0
+    assert timings[1] < timings[0] / 2
+
+
+def test_http_get_replays_retries_in_order(local_server, tmp_path):
+    """Test the responses to a retried request are replayed in recorded order."""
+
+    # Arrange
+    path = str(tmp_path.joinpath("run.cassette"))
+    url = local_server.url("/api.php")
+    local_server.routes["/api.php"] = b"{}"
+    local_server.failures["/api.php"] = [503]
+    configure_retries(retries=1, backoff_factor=0)
+
+    configure_cassette(path, mode="record")
+    assert http_get(url) == b"{}"
+    handle_requests._cassette.close()
+    close_session()
+    local_server.stop()
+
+    # Act
+    configure_cassette(path, mode="replay", speed=float("inf"))
+    content = http_get(url)
+
+    # Assert
+    assert content == b"{}"
+    assert local_server.request_count == 2
+
+
+def test_mount_cassette(tmp_path):
+    """Test other sessions, like the Genius client's, go through the cassette."""
+
+    # Arrange
+    session = requests.Session()
+    configure_cassette(str(tmp_path.joinpath("run.cassette")), mode="record")
+
+    # Act
+    mount_cassette(session)
+
+    # Assert
+    assert isinstance(session.get_adapter("https://genius.com"), CassetteAdapter)
+    assert isinstance(
+        handle_requests.get_session().get_adapter("https://www.jiosaavn.com"),
+        CassetteAdapter,
+    )
@@ -5,6 +5,7 @@ import pytest
 from click.testing import CliRunner
 
 from musicDL.__main__ import main
+from musicDL.config import Config
 
 
 # Arrange
@@ -48,8 +49,8 @@ def mock_functions(mocker):
     """Fixture: That mocks the main functions"""
     mocker.patch("musicDL.main.get_json_data_from_website", return_value={})
     mocker.patch("musicDL.main.extract_saavn_api_url", return_value="")
-    mocker.patch("musicDL.main.get_json_data_from_api", return_value={})
-    mocker.patch("musicDL.main.SongObj.from_raw_dict", return_value=({}, ""))
+    mocker.patch("musicDL.main.iter_json_data_from_api", return_value=iter(()))
+    mocker.patch("musicDL.main.SongObj.from_raw_stream", return_value=iter(()))
     mocker.patch(
         "musicDL.main.DownloadManager.resume_download_from_tracking_file",
         return_value="",
@@ -90,3 +91,94 @@ def test_cli_url_exception(cli_runner, test_entity):
 
     assert result.exit_code == 3
     assert result.output == "\nInvalid entity passed\n"
+
+
+def test_cli_batch(cli_runner, tmp_path, mocker):
+    """Test URLs from the arguments, a batch file and stdin share one download."""
+    download_songs = mocker.patch("musicDL.main.DownloadManager.download_songs")
+    batch_file = tmp_path.joinpath("batch.txt")
+    batch_file.write_text(
+        "# Albums\n\nhttps://www.jiosaavn.com/album/b\nhttps://www.jiosaavn.com/song/a\n"
+    )
+
+    result = cli_runner(
+        "https://www.jiosaavn.com/song/a",
+        "-",
+        "--batch-file",
+        str(batch_file),
+        input="https://www.jiosaavn.com/s/playlist/c\n",
+    )
+
+    assert result.exit_code == 0
+    assert result.output == (
+        "Fetching Song...\nFetching Playlist...\nFetching Album...\n\n"
+    )
+    assert download_songs.call_count == 1
+
+
+def test_cli_batch_duplicate_songs(cli_runner, mocker):
+    """Test a song on two albums is downloaded once."""
+    songs = {}
+    for song_id in "abc":
+        songs[song_id] = mocker.Mock()
+        songs[song_id].get_song_id_saavn.return_value = song_id
+    mocker.patch(
+        "musicDL.main.SongObj.from_raw_stream",
+        side_effect=[
+            iter([songs["a"], songs["b"]]),
+            iter([songs["b"], songs["c"]]),
+        ],
+    )
+    downloaded = []
+    mocker.patch(
+        "musicDL.main.DownloadManager.download_songs",
+        side_effect=lambda song_obj_iter, **kwargs: downloaded.extend(song_obj_iter),
+    )
+
+    result = cli_runner(
+        "https://www.jiosaavn.com/album/a", "https://www.jiosaavn.com/album/b"
+    )
+
+    assert result.exit_code == 0
+    assert downloaded == [songs["a"], songs["b"], songs["c"]]
+
+
+def test_cli_batch_invalid_entity(cli_runner, mocker):
+    """Test an invalid entity fails the batch before anything is downloaded."""
+    download_songs = mocker.patch("musicDL.main.DownloadManager.download_songs")
+
+    result = cli_runner("https://www.jiosaavn.com/song/a", "memories")
+
+    assert result.exit_code == 3
+    assert download_songs.call_count == 0
+
+
+def test_cli_serve(cli_runner, mocker):
+    """Test the serve command starts the job server with its own options."""
+    serve = mocker.patch("musicDL.cli.serve")
+    download = mocker.patch("musicDL.cli.musicDL")
+
+    result = cli_runner("serve", "--serve-port", "9000", "-q", "high")
+
+    assert result.exit_code == 0
+    assert serve.call_count == 1
+    assert download.call_count == 0
+    assert Config.get_config("serve-port") == 9000
+    assert Config.get_config("quality") == "high"
+
+    # Download options aren't serve options
+    assert cli_runner("serve", "--batch-file", "x").exit_code == 2
+    assert serve.call_count == 1
+
+
+def test_cli_failure_closes_session(cli_runner, mocker):
+    """Test the pooled HTTP session is closed when a download fails."""
+    close_session = mocker.patch("musicDL.main.close_session")
+    mocker.patch(
+        "musicDL.main.DownloadManager.download_songs", side_effect=RuntimeError("x")
+    )
+
+    result = cli_runner("https://www.jiosaavn.com/song/a")
+
+    assert result.exit_code == 3
+    assert close_session.call_count == 1
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Collection of tests around adaptive download concurrency."""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from musicDL.concurrency import AdaptiveLimiter, ConcurrencyController, TokenBucket
+
+
+def test_token_bucket_caps_rate():
+    """Test the bucket lets through no more than its rate after the burst."""
+    bucket = TokenBucket(rate=100 * 1024, burst=10 * 1024)
+
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.consume(10 * 1024)
+
+    # 60 KiB at 100 KiB/s, of which 10 KiB is the initial burst
+    assert time.perf_counter() - start == pytest.approx(0.5, abs=0.1)
+
+
+def _run_round(limiter, size=None, failed=False):
+    for _ in range(limiter.limit):
+        if failed:
+            limiter.record_failure()
+        else:
+            limiter.record_success(size)
+
+
+def test_adaptive_limiter_aimd(monkeypatch):
+    """Test the limit grows with throughput, steps back and halves on errors."""
+    clock = [0.0]
+    monkeypatch.setattr("musicDL.concurrency.time.monotonic", lambda: clock[0])
+    monkeypatch.setattr(
+        "musicDL.concurrency.asyncio.ensure_future", lambda coro: coro.close()
+    )
+    limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=6)
+
+    # Every round takes one second: throughput is the bytes of the round
+    for size, expected in [(100, 3), (100, 4), (100, 5), (50, 4), (200, 5)]:
+        clock[0] += 1
+        _run_round(limiter, size)
+        assert limiter.limit == expected
+
+    clock[0] += 1
+    _run_round(limiter, failed=True)
+    assert limiter.limit == 2
+
+
+def test_adaptive_limiter_limits_in_flight():
+    """Test no more tasks than the limit hold a slot at once."""
+    limiter = AdaptiveLimiter(initial=2)
+    in_flight = []
+
+    async def download():
+        async with limiter:
+            in_flight.append(limiter._in_flight)
+            await asyncio.sleep(0.01)
+
+    async def download_all():
+        await asyncio.gather(*[download() for _ in range(6)])
+
+    asyncio.run(download_all())
+
+    assert max(in_flight) == 2
+
+
+def test_concurrency_controller_saves_stats(tmp_path):
+    """Test each host starts from the concurrency saved by the last run."""
+    stats_path = tmp_path.joinpath("hosts.json")
+    controller = ConcurrencyController(str(stats_path), initial=4, maximum=8)
+
+    controller.get_limiter("aac.saavncdn.com").limit = 7
+    controller.save()
+
+    assert json.loads(stats_path.read_text())["aac.saavncdn.com"]["concurrency"] == 7
+
+    controller = ConcurrencyController(str(stats_path), initial=4, maximum=8)
+    assert controller.get_limiter("aac.saavncdn.com").limit == 7
+    assert controller.get_limiter("h.saavncdn.com").limit == 4
@@ -12,6 +12,10 @@ from musicDL.config import Config
 def test_get_default_config():
     config_path = Path(appdirs.user_config_dir(), "musicDL", "config.json")
     log_file_path = Path(appdirs.user_log_dir(), "musicDL", "main.log")
+    cache_path = Path(appdirs.user_cache_dir(), "musicDL", "http")
+    host_stats_path = Path(appdirs.user_data_dir(), "musicDL", "hosts.json")
+    jobs_path = Path(appdirs.user_data_dir(), "musicDL", "jobs.json")
+    library_path = Path(appdirs.user_data_dir(), "musicDL", "library.sqlite3")
     expected = {
         "quality": "HD",
         "output": ".",
@@ -29,6 +33,49 @@ def test_get_default_config():
         "debug-file": str(log_file_path),
         "config-file": str(config_path),
         "verbose": False,
+        "pool-connections": 10,
+        "pool-maxsize": 10,
+        "segments": 1,
+        "segment-min-size": 1024 * 1024,
+        "retries": 3,
+        "backoff-factor": 0.5,
+        "breaker-threshold": 5,
+        "breaker-cooldown": 30,
+        "no-cache": False,
+        "cache-dir": str(cache_path),
+        "cache-ttl": 3600,
+        "cache-size": 64 * 1024 * 1024,
+        "concurrency": 4,
+        "min-concurrency": 1,
+        "max-concurrency": 8,
+        "limit-rate": 0,
+        "host-stats-file": str(host_stats_path),
+        "lyrics-workers": 4,
+        "tag-workers": 2,
+        "find-workers": 4,
+        "retag-workers": 0,
+        "stage-queue-size": 8,
+        "transcode-jobs": 0,
+        "transcode-nice": 10,
+        "transcode-ionice": True,
+        "no-stream-transcode": False,
+        "no-format-negotiation": False,
+        "cassette": "",
+        "cassette-mode": "replay",
+        "cassette-speed": 1.0,
+        "serve-host": "127.0.0.1",
+        "serve-port": 8765,
+        "serve-token-file": "",
+        "jobs-file": str(jobs_path),
+        "library-file": str(library_path),
+        "no-library": False,
+        "sync": False,
+        "store-dir": "",
+        "store-link": "hardlink",
+        "preallocate": True,
+        "write-behind": 4,
+        "cover-cache-size": 16 * 1024 * 1024,
+        "no-cover-warm": False,
     }
 
     assert Config.get_default_config() == expected
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""Tests for the album art cache."""
+
+import concurrent.futures
+
+import pytest
+from requests.exceptions import RequestException
+
+from musicDL import cover_art
+from musicDL.cover_art import (
+    CoverArtCache,
+    configure_cover_cache,
+    shutdown_cover_warming,
+    warm_cover_cache,
+)
+from musicDL.SongObj import SongObj
+
+
+@pytest.fixture
+def cover_cache():
+    configure_cover_cache(1024 * 1024)
+    yield cover_art._cover_cache
+    configure_cover_cache(0)
+
+
+def test_concurrent_tracks_share_one_fetch(local_server):
+    local_server.routes["/cover_500x500.jpg"] = b"jpeg" * 1024
+    local_server.delay = 0.3
+    cache = CoverArtCache(1024 * 1024)
+    url = local_server.url("/cover_500x500.jpg")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        images = list(executor.map(cache.get, [url] * 8))
+
+    assert images == [b"jpeg" * 1024] * 8
+    assert local_server.request_count == 1
+    assert cache.fetches == 1
+
+    # Cached in memory from now on
+    assert cache.get(url) == b"jpeg" * 1024
+    assert local_server.request_count == 1
+
+
+def test_cache_lru_eviction(local_server):
+    for name in "abc":
+        local_server.routes[f"/{name}.jpg"] = name.encode() * 400
+    cache = CoverArtCache(1000)
+
+    cache.get(local_server.url("/a.jpg"))
+    cache.get(local_server.url("/b.jpg"))
+    # a is used again, b is the least recently used
+    cache.get(local_server.url("/a.jpg"))
+    cache.get(local_server.url("/c.jpg"))
+
+    assert cache.size == 800
+    assert cache.fetches == 3
+    cache.get(local_server.url("/a.jpg"))
+    assert cache.fetches == 3
+    cache.get(local_server.url("/b.jpg"))
+    assert cache.fetches == 4
+
+
+def test_errors_are_not_cached(local_server):
+    local_server.routes["/cover.jpg"] = b"jpeg"
+    local_server.failures["/cover.jpg"] = [404]
+    cache = CoverArtCache(1024)
+
+    with pytest.raises(RequestException):
+        cache.get(local_server.url("/cover.jpg"))
+
+    assert cache.get(local_server.url("/cover.jpg")) == b"jpeg"
+    assert cache.size == 4
+
+
+def test_song_cover_image_uses_cache(cover_cache, local_server, song_factory):
+    local_server.routes["/cover_500x500.jpg"] = b"jpeg"
+    image = local_server.url("/cover_150x150.jpg")
+    songs = [
+        SongObj(song_factory(str(n), "", image=image), n, 3, "hd") for n in range(3)
+    ]
+
+    assert [song.get_cover_image() for song in songs] == [b"jpeg"] * 3
+    assert local_server.request_count == 1
+
+
+def test_warm_cover_cache(cover_cache, local_server):
+    local_server.routes["/cover.jpg"] = b"jpeg"
+    url = local_server.url("/cover.jpg")
+
+    warm_cover_cache([url, url, ""])
+    cover_art._warm_executor.submit(lambda: None).result()
+
+    assert cover_cache.get(url) == b"jpeg"
+    assert cover_cache.fetches == 1
+    assert local_server.request_count == 1
+
+
+def test_shutdown_cover_warming(cover_cache, local_server):
+    local_server.routes["/cover.jpg"] = b"jpeg"
+    url = local_server.url("/cover.jpg")
+
+    warm_cover_cache([url])
+    executor = cover_art._warm_executor
+    shutdown_cover_warming()
+
+    assert cover_art._warm_executor is None
+    assert executor._shutdown
+    # Warming again starts a new executor
+    configure_cover_cache(1024)
+    warm_cover_cache([url])
+    assert cover_art._warm_executor not in (None, executor)
+    shutdown_cover_warming()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's download manager."""
+
+import logging
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from musicDL.config import Config
+from musicDL.downloader import DownloadManager
+from musicDL.library import LibraryIndex
+from musicDL.SongObj import SongObj
+
+
+# Arrange
+@pytest.fixture
+def slow_album(local_server, song_factory, download_config):
+    """Fixture: That serves an album whose songs each take 0.4 s to transfer."""
+    local_server.delay = 0.4
+    download_config(quality="low")
+
+    songs = []
+    for number in range(4):
+        path = f"/song{number}_96.mp4"
+        local_server.routes[path] = bytes([number]) * 64 * 1024
+        songs.append(song_factory(str(number), local_server.url(path)))
+
+    return {"title": "Slow Album", "songs": songs}
+
+
+def _download_album(raw_album, concurrency, download_config):
+    # Downloaded again from scratch, not skipped as indexed
+    download_config(
+        concurrency=concurrency,
+        min_concurrency=concurrency,
+        max_concurrency=concurrency,
+        no_library=True,
+    )
+    song_obj_list = SongObj.from_raw_dict(raw_album, "album")
+
+    start = time.perf_counter()
+    with DownloadManager() as downloader:
+        downloader.download_songs(song_obj_list)
+
+    return time.perf_counter() - start
+
+
+def test_download_songs_concurrently(slow_album, download_config, tmp_path):
+    """Test wall time goes down as the number of concurrent downloads goes up."""
+    sequential = _download_album(slow_album, 1, download_config)
+
+    for song in tmp_path.joinpath("output").iterdir():
+        song.unlink()
+
+    concurrent = _download_album(slow_album, 4, download_config)
+
+    # 4 songs of 0.4 s each: ~1.6 s one after another, ~0.4 s all at once
+    assert sequential >= 1.6
+    assert concurrent < sequential / 2
+
+    downloaded = sorted(path.name for path in tmp_path.joinpath("output").iterdir())
+    assert downloaded == [f"Song {number} - Album.m4a" for number in range(4)]
+
+
+def test_download_songs_while_listing(
+    slow_album, download_config, local_server, tmp_path
+):
+    """Test songs start downloading before the iterator listing them is done."""
+    download_config(concurrency=4)
+    requested_while_listing = []
+
+    def raw_album_items():
+        for song in slow_album["songs"][:2]:
+            yield "songs", song
+        yield "title", slow_album["title"]
+        # Give the first songs time to start
+        time.sleep(0.2)
+        requested_while_listing.append(local_server.request_count)
+        for song in slow_album["songs"][2:]:
+            yield "songs", song
+
+    song_obj_list = []
+
+    def song_obj_iter():
+        for song_obj in SongObj.from_raw_stream(raw_album_items(), "album"):
+            song_obj_list.append(song_obj)
+            yield song_obj
+
+    with DownloadManager() as downloader:
+        downloader.download_songs(song_obj_iter())
+
+    assert requested_while_listing == [2]
+    assert SongObj.get_tracking_file_path() == "slow-album"
+    assert [song_obj.get_track_number() for song_obj in song_obj_list] == [
+        "1/4",
+        "2/4",
+        "3/4",
+        "4/4",
+    ]
+
+    downloaded = sorted(path.name for path in tmp_path.joinpath("output").iterdir())
+    assert downloaded == [f"Song {number} - Album.m4a" for number in range(4)]
+
+
+def test_download_skips_indexed_songs(
+    slow_album, download_config, local_server, tmp_path, mocker
+):
+    """Test songs in the library index are skipped without a request."""
+    download_config(concurrency=4)
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+    requests = local_server.request_count
+
+    output = tmp_path.joinpath("output")
+
+    song_obj_list = SongObj.from_raw_dict(slow_album, "album")
+    decrypt = mocker.spy(SongObj, "_set_media_url")
+    with DownloadManager() as downloader:
+        downloader.download_songs(song_obj_list)
+
+    assert local_server.request_count == requests
+    assert decrypt.call_count == 0
+    assert len(list(output.iterdir())) == 4
+
+    # Indexed by quality, another quality is downloaded (the files of the same
+    # name aren't there to be taken for it)
+    for path in output.iterdir():
+        path.rename(output.joinpath(f"renamed {path.name}"))
+    download_config(quality="high")
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+
+    assert local_server.request_count == requests + 4
+
+
+def test_download_stream_looks_up_songs_in_batches(
+    slow_album, download_config, local_server, mocker
+):
+    """Test streamed songs are looked up in the library index by batch."""
+    download_config(concurrency=4)
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+    requests = local_server.request_count
+
+    get = mocker.spy(LibraryIndex, "get")
+    get_many = mocker.spy(LibraryIndex, "get_many")
+    with DownloadManager() as downloader:
+        downloader.download_songs(iter(SongObj.from_raw_dict(slow_album, "album")))
+
+    assert local_server.request_count == requests
+    assert get.call_count == 0
+    assert sorted(
+        song_id for call in get_many.call_args_list for song_id in call.args[1]
+    ) == ["0", "1", "2", "3"]
+
+
+def test_download_indexed_songs_again_if_gone(
+    slow_album, download_config, local_server, tmp_path
+):
+    """Test indexed songs deleted or in another directory are downloaded again."""
+    download_config(concurrency=4)
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+    requests = local_server.request_count
+
+    output = tmp_path.joinpath("output")
+    output.joinpath("Song 0 - Album.m4a").unlink()
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+
+    assert local_server.request_count == requests + 1
+    assert output.joinpath("Song 0 - Album.m4a").is_file()
+
+    other = tmp_path.joinpath("other")
+    other.mkdir()
+    download_config(output=str(other))
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+
+    assert local_server.request_count == requests + 5
+    downloaded = sorted(path.name for path in other.iterdir())
+    assert downloaded == [f"Song {number} - Album.m4a" for number in range(4)]
+
+
+def test_download_shared_songs_once(
+    slow_album, download_config, local_server, tmp_path
+):
+    """Test songs downloaded into one directory are linked into another."""
+    store_dir = tmp_path.joinpath("store")
+    download_config(concurrency=4, store_dir=str(store_dir))
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+    requests = local_server.request_count
+
+    playlist = tmp_path.joinpath("playlist")
+    playlist.mkdir()
+    download_config(output=str(playlist))
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+
+    assert local_server.request_count == requests
+    for number in range(4):
+        name = f"Song {number} - Album.m4a"
+        stored_path = store_dir.joinpath("low", f"{number}.m4a")
+        assert playlist.joinpath(name).stat().st_ino == stored_path.stat().st_ino
+        assert tmp_path.joinpath("output", name).samefile(stored_path)
+
+
+def test_retag_songs_concurrently(
+    slow_album, download_config, tmp_path, mocker, caplog
+):
+    """Test songs are retagged at the same time, missing ones are reported."""
+    download_config(concurrency=4)
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(slow_album, "album"))
+    tmp_path.joinpath("output", "Song 3 - Album.m4a").unlink()
+
+    def slow_set_tags(file_path, song_obj):
+        time.sleep(0.3)
+        return "skipped" if file_path.endswith("Song 0 - Album.m4a") else "updated"
+
+    set_tags = mocker.patch("musicDL.downloader.set_tags", side_effect=slow_set_tags)
+    download_config(no_tags=False, retag_workers=3)
+
+    start = time.perf_counter()
+    with caplog.at_level(logging.INFO, logger="musicDL.downloader"):
+        with DownloadManager() as downloader:
+            downloader.set_tags_for_songs(SongObj.from_raw_dict(slow_album, "album"))
+
+    # 3 songs of 0.3 s each: ~0.9 s one after another
+    assert time.perf_counter() - start < 0.6
+    assert sorted(call.args[0] for call in set_tags.call_args_list) == [
+        str(tmp_path.joinpath("output", f"Song {number} - Album.m4a"))
+        for number in range(3)
+    ]
+    assert "Retagged 4 songs" in caplog.text
+    assert "2 updated, 1 skipped, 1 failed" in caplog.text
+
+
+def test_retag_pipeline_workers(download_config):
+    download_config(find_workers=2, lyrics_workers=1, retag_workers=3)
+
+    with DownloadManager() as downloader:
+        pipeline = downloader._new_retag_pipeline()
+
+        assert [(stage.name, stage.workers) for stage in pipeline.stages] == [
+            ("find", 2),
+            ("lyrics", 1),
+            ("tag", 3),
+        ]
+
+
+# Arrange
+@pytest.fixture
+def big_song(local_server, song_factory, download_config):
+    """Fixture: That serves one song of 100 KiB and returns its SongObj list."""
+    download_config(quality="low", segments=4, segment_min_size=16 * 1024)
+
+    media = bytes(range(256)) * 400
+    local_server.routes["/big_96.mp4"] = media
+    raw_album = {
+        "title": "Big",
+        "songs": [song_factory("big", local_server.url("/big_96.mp4"))],
+    }
+
+    return SongObj.from_raw_dict(raw_album, "album"), media
+
+
+def test_download_segmented(big_song, local_server, tmp_path):
+    """Test a song is fetched as parallel byte ranges and reassembled in order."""
+    song_obj_list, media = big_song
+
+    with DownloadManager() as downloader:
+        downloader.download_songs(song_obj_list)
+
+    output = tmp_path.joinpath("output", "Song big - Album.m4a")
+    assert output.read_bytes() == media
+    assert sorted(local_server.range_requests) == [
+        "bytes=0-0",
+        "bytes=0-25599",
+        "bytes=25600-51199",
+        "bytes=51200-76799",
+        "bytes=76800-102399",
+    ]
+
+
+def test_download_segmented_range_ignored(big_song, local_server, tmp_path):
+    """Test the whole file is downloaded at once if the server ignores Range."""
+    song_obj_list, media = big_song
+    local_server.accept_ranges = False
+
+    with DownloadManager() as downloader:
+        downloader.download_songs(song_obj_list)
+
+    output = tmp_path.joinpath("output", "Song big - Album.m4a")
+    assert output.read_bytes() == media
+    assert local_server.request_count == 1
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+@pytest.mark.parametrize("faststart", [True, False])
+def test_download_converted_while_streaming(
+    faststart, local_server, song_factory, download_config, tmp_path, caplog
+):
+    """Test a song converted on the way, or once saved if it can't be streamed."""
+    media_path = tmp_path.joinpath("media.m4a")
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=duration=1"]
+        + ["-c:a", "aac"]
+        + (["-movflags", "+faststart"] if faststart else [])
+        + [str(media_path)],
+        check=True,
+    )
+    local_server.routes["/song_96.mp4"] = media_path.read_bytes()
+    download_config(quality="low", output_format="mp3")
+    raw_album = {
+        "title": "Album",
+        "songs": [song_factory("1", local_server.url("/song_96.mp4"))],
+    }
+
+    caplog.set_level(logging.DEBUG, logger="musicDL.transfer")
+
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(raw_album, "album"))
+
+    downloaded = [path.name for path in tmp_path.joinpath("output").iterdir()]
+    assert downloaded == ["Song 1 - Album.mp3"]
+    assert ("can't be streamed" in caplog.text) is not faststart
+
+
+def test_download_variant_in_output_format(
+    local_server, song_factory, download_config, tmp_path
+):
+    """Test a copy in the output format is downloaded instead of converting."""
+    local_server.routes["/song_96.mp4"] = b"aac"
+    local_server.routes["/song.mp3"] = b"mp3"
+    download_config(quality="low", output_format="mp3")
+    raw_album = {
+        "title": "Album",
+        "songs": [song_factory("1", local_server.url("/song_96.mp4"))],
+    }
+
+    with DownloadManager() as downloader:
+        downloader.download_songs(SongObj.from_raw_dict(raw_album, "album"))
+
+    output = tmp_path.joinpath("output")
+    assert [path.name for path in output.iterdir()] == ["Song 1 - Album.mp3"]
+    assert output.joinpath("Song 1 - Album.mp3").read_bytes() == b"mp3"
+    assert local_server.head_requests == ["/song_96.mp3", "/song.mp3"]
+
+
+def test_job_options(download_config, tmp_path):
+    """Test a job's options are the download manager's, one job at a time."""
+    download_config(quality="low")
+    job_output = str(tmp_path.joinpath("job"))
+
+    with DownloadManager() as downloader:
+        output_dir = downloader.output_dir
+        with downloader.job_options({"quality": "hd", "output": job_output}):
+            assert downloader.quality == "hd"
+            assert downloader.output_dir == job_output
+            assert downloader.output_format == Config.get_config("output-format")
+            # The app's config is left as it is
+            assert Config.get_config("quality") == "low"
+
+            with pytest.raises(RuntimeError):
+                with downloader.job_options({}):
+                    pass
+
+        assert downloader.quality == "low"
+        assert downloader.output_dir == output_dir
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's ffmpeg conversions."""
+
+import asyncio
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from musicDL.services import ffmpeg
+from musicDL.services.ffmpeg import StreamTranscoder, TranscodeScheduler
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_scheduler_bounds_processes():
+    """Test no more conversions run at once than the scheduler's jobs."""
+
+    scheduler = TranscodeScheduler(jobs=2)
+    running = []
+    peak = []
+
+    async def transcode():
+        await scheduler.acquire()
+        try:
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+        finally:
+            scheduler.release()
+
+    async def run():
+        await asyncio.gather(*(transcode() for _ in range(8)))
+
+    _run(run())
+
+    assert max(peak) == 2
+    assert scheduler.running == 0
+    assert scheduler.get_waiting() == 0
+
+
+def test_scheduler_takes_turns():
+    """Test waiting conversions of different albums are served in turns."""
+
+    scheduler = TranscodeScheduler(jobs=1)
+    order = []
+
+    async def transcode(key, number):
+        await scheduler.acquire(key)
+        try:
+            order.append(f"{key}{number}")
+            await asyncio.sleep(0)
+        finally:
+            scheduler.release()
+
+    async def run():
+        # Everything queues up behind a running conversion
+        await scheduler.acquire()
+        conversions = asyncio.gather(
+            *(transcode("A", number) for number in range(1, 4)),
+            *(transcode("B", number) for number in range(1, 3)),
+        )
+        await asyncio.sleep(0)
+        scheduler.release()
+        await conversions
+
+    _run(run())
+
+    assert order == ["A1", "B1", "A2", "B2", "A3"]
+
+
+def test_scheduler_cancelled_waiter():
+    """Test a cancelled conversion gives up its place in the queue."""
+
+    scheduler = TranscodeScheduler(jobs=1)
+
+    async def run():
+        await scheduler.acquire()
+        waiter = asyncio.ensure_future(scheduler.acquire("A"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        scheduler.release()
+
+    _run(run())
+
+    assert scheduler.running == 0
+    assert scheduler.get_waiting() == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX priorities")
+def test_process_options():
+    """Test ffmpeg is started niced and, where available, under ionice."""
+
+    command, options = TranscodeScheduler(nice=10).get_process_options(["ffmpeg"])
+
+    assert options == {}
+    assert command[-1] == "ffmpeg"
+    if shutil.which("nice"):
+        assert command[1:3] == ["-n", "10"]
+    if sys.platform.startswith("linux") and shutil.which("ionice"):
+        assert command[4:8] == ["-c", "2", "-n", "7"]
+
+    command, options = TranscodeScheduler(nice=0, ionice=False).get_process_options(
+        ["ffmpeg"]
+    )
+
+    assert command == ["ffmpeg"]
+    assert options == {}
+
+
+def _make_m4a(path, *options):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=duration=1"]
+        + ["-c:a", "aac", *options, str(path)],
+        check=True,
+    )
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_is_streamable(tmp_path):
+    """Test an m4a is only streamed with its index before the audio."""
+    _make_m4a(tmp_path.joinpath("fast.m4a"), "-movflags", "+faststart")
+    _make_m4a(tmp_path.joinpath("slow.m4a"))
+
+    assert ffmpeg.is_streamable(tmp_path.joinpath("fast.m4a").read_bytes(), ".m4a")
+    assert not ffmpeg.is_streamable(tmp_path.joinpath("slow.m4a").read_bytes(), ".m4a")
+    assert ffmpeg.is_streamable(b"ID3", ".mp3")
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_stream_transcoder(tmp_path):
+    """Test media written to the transcoder ends up converted, in place once done."""
+    source = tmp_path.joinpath("source.m4a")
+    _make_m4a(source, "-movflags", "+faststart")
+    media = source.read_bytes()
+
+    transcoder = StreamTranscoder(
+        "mp3", tmp_path.joinpath("song.m4a"), 128000, "ffmpeg", TranscodeScheduler()
+    )
+    stream = transcoder.open(media[:1024])
+    for start in range(0, len(media), 4096):
+        stream.write(media[start : start + 4096])
+        assert not tmp_path.joinpath("song.mp3").exists()
+
+    assert transcoder.close() == tmp_path.joinpath("song.mp3")
+    assert tmp_path.joinpath("song.mp3").stat().st_size > 0
+    assert not transcoder.part_path.exists()
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_stream_transcoder_error(tmp_path):
+    """Test a failed conversion raises and leaves nothing behind."""
+    transcoder = StreamTranscoder(
+        "m4a", tmp_path.joinpath("song.mp3"), 0, "ffmpeg", TranscodeScheduler()
+    )
+    stream = transcoder.open(b"not an mp3")
+    try:
+        stream.write(b"not an mp3" * 100)
+    except BrokenPipeError:
+        pass
+
+    with pytest.raises(RuntimeError):
+        transcoder.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_convert(tmp_path):
+    """Test a song is converted through the scheduler and the source removed."""
+
+    source = tmp_path.joinpath("song $1.m4a")
+    _make_m4a(source)
+
+    scheduler = TranscodeScheduler(jobs=1)
+    output = _run(ffmpeg.convert("mp3", str(source), "ffmpeg", scheduler, "album"))
+
+    assert output == tmp_path.joinpath("song $1.mp3")
+    assert output.stat().st_size > 0
+    assert not source.exists()
+    assert scheduler.running == 0
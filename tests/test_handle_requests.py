@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's HTTP requests handling."""
+
+from pathlib import Path
+
+import pytest
+
+from musicDL import handle_requests
+from musicDL.handle_requests import (
+    close_session,
+    _extract_initial_data_with_soup,
+    configure_session,
+    extract_initial_data,
+    get_session,
+    http_get,
+)
+
+
+# Arrange
+@pytest.fixture(autouse=True)
+def fresh_session():
+    """Fixture: That makes sure every test starts with a new shared session."""
+    close_session()
+    yield
+    close_session()
+
+
+def test_get_session_is_shared():
+    """Test the same session is handed out until it is closed."""
+    session = get_session()
+
+    assert get_session() is session
+
+    close_session()
+
+    assert get_session() is not session
+
+
+def test_configure_session_pool_sizes():
+    """Test per-host pool sizes are applied to the mounted adapters."""
+    session = configure_session(pool_connections=3, pool_maxsize=7)
+
+    adapter = session.get_adapter("https://www.jiosaavn.com")
+
+    assert handle_requests.get_session() is session
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 7
+    assert session.headers["Connection"] == "keep-alive"
+
+
+def test_http_get_reuses_connection(local_server):
+    """Test repeated requests to one host go over a single kept-alive connection."""
+    local_server.routes["/api.php"] = b'{"songs": []}'
+
+    for _ in range(5):
+        assert http_get(local_server.url("/api.php")) == b'{"songs": []}'
+
+    assert local_server.request_count == 5
+    assert local_server.connection_count == 1
+
+
+def test_http_get_stream_releases_connection(local_server):
+    """Test a closed streaming response hands its connection back to the pool."""
+    local_server.routes["/song_96.mp4"] = b"\x00" * 4096
+
+    for _ in range(3):
+        with http_get(local_server.url("/song_96.mp4"), stream=True) as response:
+            assert len(b"".join(response.iter_content(1024))) == 4096
+
+    assert local_server.connection_count == 1
+
+
+TEST_PAGES = Path(__file__).parent.joinpath("test-pages")
+
+
+@pytest.mark.parametrize("page", ["album.html", "playlist.html"])
+def test_extract_initial_data_matches_soup(page):
+    """Test: The fast extractor returns the same data as BeautifulSoup."""
+
+    # Arrange
+    html_content = TEST_PAGES.joinpath(page).read_bytes()
+
+    # Act
+    json_data = extract_initial_data(html_content)
+
+    # Assert
+    assert json_data is not None
+    assert json_data == _extract_initial_data_with_soup(html_content)
+
+
+def test_extract_initial_data_replaces_js_isms():
+    """Test: ``new Date``, ``undefined`` and comments are replaced, not strings."""
+
+    # Arrange
+    html_content = b"""<script>window.__INITIAL_DATA__ = {
+    // Locale
+    "date": new Date(1603270800000), "missing": undefined, "empty": null,
+    "text": "new Date(1) or undefined // kept", "list": [undefined, 1]
+    };</script>"""
+
+    # Act
+    json_data = extract_initial_data(html_content)
+
+    # Assert
+    assert json_data == {
+        "date": "",
+        "missing": "",
+        "empty": "",
+        "text": "new Date(1) or undefined // kept",
+        "list": ["", 1],
+    }
+
+
+def test_extract_initial_data_without_marker():
+    """Test: Pages without the page data return None."""
+    assert extract_initial_data(b"<html><script>var a = 1;</script></html>") is None
+
+
+def test_get_json_data_from_website_falls_back_to_soup(mocker):
+    """Test: Pages the fast extractor can't read are parsed with BeautifulSoup."""
+
+    # Arrange
+    html_content = TEST_PAGES.joinpath("album.html").read_bytes()
+    mocker.patch.object(handle_requests, "http_get_cached", return_value=html_content)
+    mocker.patch.object(handle_requests, "extract_initial_data", return_value=None)
+    soup = mocker.spy(handle_requests, "_extract_initial_data_with_soup")
+
+    # Act
+    json_data = handle_requests.get_json_data_from_website("https://example.com")
+
+    # Assert
+    soup.assert_called_once_with(html_content)
+    assert json_data["albumView"]["album"]["title"] == "Fixture Album"
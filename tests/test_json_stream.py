@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's incremental JSON parsing."""
+
+import json
+
+import pytest
+
+from musicDL.json_stream import iter_json_object
+
+PLAYLIST = {
+    "listid": "1134543",
+    "list_count": "3",
+    "songs": [{"id": str(number), "song": f"Song {number} é"} for number in range(3)],
+    "image": "https://c.saavncdn.com/1134543.jpg",
+    "count": 12345,
+}
+
+
+def _chunked(content, size):
+    return [content[start : start + size] for start in range(0, len(content), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1024 * 1024])
+def test_iter_json_object_chunked(chunk_size):
+    """Test the members are the same however the bytes are split into chunks."""
+
+    # Arrange
+    content = b"\n  \n" + json.dumps(PLAYLIST, ensure_ascii=False).encode("utf-8")
+
+    # Act
+    members = list(iter_json_object(_chunked(content, chunk_size)))
+
+    # Assert
+    assert dict(members) == PLAYLIST
+
+
+def test_iter_json_object_stream_keys():
+    """Test the items of the selected arrays are yielded one at a time."""
+
+    # Arrange
+    content = json.dumps(PLAYLIST).encode("utf-8")
+
+    # Act
+    members = list(iter_json_object(_chunked(content, 16), stream_keys=("songs",)))
+
+    # Assert
+    assert members == [
+        ("listid", "1134543"),
+        ("list_count", "3"),
+        ("songs", PLAYLIST["songs"][0]),
+        ("songs", PLAYLIST["songs"][1]),
+        ("songs", PLAYLIST["songs"][2]),
+        ("image", PLAYLIST["image"]),
+        ("count", 12345),
+    ]
+
+
+def test_iter_json_object_is_lazy():
+    """Test members are yielded before the rest of the stream is read."""
+
+    # Arrange
+    def chunks():
+        yield b'{"songs": [{"id": "1"}, '
+        raise AssertionError("Read too far")
+
+    # Act
+    members = iter_json_object(chunks(), stream_keys=("songs",))
+
+    # Assert
+    assert next(members) == ("songs", {"id": "1"})
+
+
+@pytest.mark.parametrize(
+    "content", [b"", b"<html>Not found</html>", b'{"songs": [1, 2', b'{"a" 1}']
+)
+def test_iter_json_object_invalid(content):
+    """Test streams without a valid JSON object raise JSONDecodeError."""
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_object([content], stream_keys=("songs",)))
+
+
+def test_iter_json_object_decodes_large_values_once(mocker):
+    """Test a value split over many chunks is decoded once it is complete."""
+
+    # Arrange
+    songs = [{"id": str(number), "song": 'A "[{" \\ }]'} for number in range(500)]
+    content = json.dumps({"songs": songs, "count": 500}).encode("utf-8")
+    raw_decode = mocker.spy(json.JSONDecoder, "raw_decode")
+
+    # Act
+    members = list(iter_json_object(_chunked(content, 64)))
+
+    # Assert
+    assert members == [("songs", songs), ("count", 500)]
+    # The two keys, the two values and the number continued at the end
+    assert raw_decode.call_count <= 5
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's library index."""
+
+import hashlib
+
+from musicDL.library import LibraryIndex
+
+
+def test_library_index(tmp_path):
+    """Test downloads are recorded and looked up by song ID, quality and format."""
+    song = tmp_path.joinpath("song.mp3")
+    song.write_bytes(b"media")
+    index = LibraryIndex(str(tmp_path.joinpath("library.sqlite3")))
+
+    index.add("a", "HD", "mp3", song)
+
+    assert index.get("a", "hd", "mp3") == song.resolve()
+    assert index.get("a", "hd", "m4a") is None
+    assert index.get("a", "low", "mp3") is None
+    assert index.get_many(["a", "b", "a"], "hd", "mp3") == {"a": song.resolve()}
+
+    row = index._connection.execute("SELECT size, sha256 FROM songs").fetchone()
+    assert row == (5, hashlib.sha256(b"media").hexdigest())
+
+    index.remove("a", "hd", "mp3")
+    assert index.get("a", "hd", "mp3") is None
+    index.close()
+
+
+def test_library_index_persists(tmp_path):
+    """Test the index survives a restart and looks up more IDs than a query takes."""
+    song = tmp_path.joinpath("song.m4a")
+    song.write_bytes(b"media")
+    path = str(tmp_path.joinpath("library.sqlite3"))
+
+    index = LibraryIndex(path)
+    for number in range(1000):
+        index.add(str(number), "hd", "", song)
+    index.close()
+
+    index = LibraryIndex(path)
+    found = index.get_many([str(number) for number in range(2000)], "hd", "")
+    assert sorted(found, key=int) == [str(number) for number in range(1000)]
+    index.close()
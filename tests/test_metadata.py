@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Collection of tests around embedding metadata into songs."""
+
+import shutil
+import subprocess
+
+import pytest
+from mutagen.id3 import ID3
+from mutagen.mp4 import MP4
+
+from musicDL import metadata
+from musicDL.metadata import set_tags
+from musicDL.SongObj import SongObj
+
+CODECS = {"mp3": "libmp3lame", "m4a": "aac"}
+
+
+# Arrange
+@pytest.fixture(autouse=True)
+def no_album_tags():
+    """Fixture: That forgets the album templates of other tests."""
+    metadata._album_tags.clear()
+    yield
+    metadata._album_tags.clear()
+
+
+def _make_song_file(path):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=duration=1"]
+        + ["-c:a", CODECS[path.suffix[1:]], str(path)],
+        check=True,
+    )
+
+
+@pytest.fixture
+def song_obj(download_config, song_factory, mocker):
+    """Fixture: That returns a song with lyrics and a cover image."""
+    mocker.patch.object(SongObj, "get_cover_image", return_value=b"\xff\xd8cover")
+    mocker.patch("musicDL.SongObj.get_language_code", return_value="hin")
+    song = song_factory(
+        "abc", "https://aac.saavncdn.com/001/abc_320.mp4", music="Composer"
+    )
+    song_obj = SongObj(song, 3, 12, "hd")
+    song_obj.set_lyrics("La la la")
+    return song_obj
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+@pytest.mark.parametrize("output_format", ["mp3", "m4a"])
+def test_set_tags_single_save(song_obj, tmp_path, mocker, output_format):
+    """Test every tag is written with one save, and retagging happens in place."""
+    path = tmp_path.joinpath(f"song.{output_format}")
+    _make_song_file(path)
+    file_type = ID3 if output_format == "mp3" else MP4
+    save = mocker.spy(file_type, "save")
+
+    assert set_tags(str(path), song_obj)
+
+    assert save.call_count == 1
+    if output_format == "mp3":
+        tags = ID3(path)
+        assert str(tags["TIT2"]) == "Song abc"
+        assert str(tags["TRCK"]) == "3/12"
+        assert str(tags["TCOM"]) == "Composer"
+        assert tags["USLT:Lyrics:eng"].text == "La la la"
+        assert tags.getall("APIC")[0].data == b"\xff\xd8cover"
+    else:
+        tags = MP4(path).tags
+        assert tags["\xa9nam"] == ["Song abc"]
+        assert tags["trkn"] == [(3, 12)]
+        assert tags["\xa9wrt"] == ["Composer"]
+        assert tags["\xa9lyr"] == ["La la la"]
+        assert bytes(tags["covr"][0]) == b"\xff\xd8cover"
+
+    # A longer tag fits the padding left by the first save
+    size = path.stat().st_size
+    song_obj.set_lyrics("La la la " * 100)
+    assert set_tags(str(path), song_obj)
+    assert path.stat().st_size == size
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+@pytest.mark.parametrize("output_format", ["mp3", "m4a"])
+def test_album_tags_built_once(
+    download_config, song_factory, mocker, tmp_path, output_format
+):
+    """Test the tags shared by the tracks of an album are built once."""
+    get_cover_image = mocker.patch.object(
+        SongObj, "get_cover_image", return_value=b"\xff\xd8cover"
+    )
+    get_publisher = mocker.spy(SongObj, "get_publisher")
+    image = "https://c.saavncdn.com/album_150x150.jpg"
+    songs = [
+        SongObj(song_factory(str(n), "", image=image, label="Label"), n, 3, "hd")
+        for n in range(1, 4)
+    ]
+
+    paths = []
+    for song_obj in songs:
+        paths.append(tmp_path.joinpath(f"{song_obj.get_title()}.{output_format}"))
+        _make_song_file(paths[-1])
+        assert set_tags(str(paths[-1]), song_obj)
+
+    assert get_cover_image.call_count == 1
+    assert get_publisher.call_count == 1
+    for number, path in enumerate(paths, 1):
+        if output_format == "mp3":
+            tags = ID3(path)
+            assert str(tags["TIT2"]) == f"Song {number}"
+            assert str(tags["TRCK"]) == f"{number}/3"
+            assert str(tags["TPUB"]) == "Label"
+            assert tags.getall("APIC")[0].data == b"\xff\xd8cover"
+        else:
+            tags = MP4(path).tags
+            assert tags["\xa9nam"] == [f"Song {number}"]
+            assert tags["trkn"] == [(number, 3)]
+            assert bytes(tags["covr"][0]) == b"\xff\xd8cover"
+
+    # Another album gets its own
+    other = SongObj(song_factory("4", "", image=image, album="Other"), 1, 1, "hd")
+    assert set_tags(str(paths[0]), other)
+    assert get_cover_image.call_count == 2
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+@pytest.mark.parametrize("output_format", ["mp3", "m4a"])
+@pytest.mark.parametrize("update_tags", [False, True])
+def test_set_tags_skips_unchanged(
+    song_obj, download_config, tmp_path, mocker, output_format, update_tags
+):
+    """Test files whose tags match already aren't saved again."""
+    download_config(update_tags=update_tags)
+    path = tmp_path.joinpath(f"song.{output_format}")
+    _make_song_file(path)
+    assert set_tags(str(path), song_obj) == "updated"
+
+    save = mocker.spy(ID3 if output_format == "mp3" else MP4, "save")
+    mtime = path.stat().st_mtime_ns
+    assert set_tags(str(path), song_obj) == "skipped"
+    assert save.call_count == 0
+    assert path.stat().st_mtime_ns == mtime
+
+    # The lyrics changed
+    song_obj.set_lyrics("La la la la")
+    assert set_tags(str(path), song_obj) == "updated"
+    assert save.call_count == 1
+
+    # The cover changed
+    metadata._album_tags.clear()
+    mocker.patch.object(SongObj, "get_cover_image", return_value=b"\xff\xd8other")
+    assert set_tags(str(path), song_obj) == "updated"
+    assert set_tags(str(path), song_obj) == "skipped"
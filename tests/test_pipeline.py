@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's staged song pipeline."""
+
+import asyncio
+import time
+
+import pytest
+
+from musicDL.pipeline import Pipeline, Stage
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def _sleeping(seconds, done=None):
+    async def stage_func(item):
+        await asyncio.sleep(seconds)
+        if done is not None:
+            done.append(item)
+        return item
+
+    return stage_func
+
+
+def test_pipeline_overlaps_stages():
+    """Test song N+1 is downloaded while song N is converted and N-1 tagged."""
+    done = []
+
+    async def run():
+        pipeline = Pipeline(
+            [
+                Stage("download", _sleeping(0.1), workers=1, queue_size=8),
+                Stage("convert", _sleeping(0.1), workers=1, queue_size=8),
+                Stage("tag", _sleeping(0.1, done), workers=1, queue_size=8),
+            ]
+        )
+        await pipeline.run(range(5))
+        return pipeline
+
+    start = time.perf_counter()
+    pipeline = _run(run())
+    elapsed = time.perf_counter() - start
+
+    # One after another: 5 songs * 3 stages * 0.1 s, overlapped: (5 + 2) * 0.1 s
+    assert elapsed < 1.0
+    assert done == [0, 1, 2, 3, 4]
+    assert [metrics.processed for metrics in pipeline.get_metrics()] == [5, 5, 5]
+
+
+def test_pipeline_bounded_queue():
+    """Test a slow stage holds back the stages before it."""
+
+    async def run():
+        pipeline = Pipeline(
+            [
+                Stage("download", _sleeping(0), workers=4, queue_size=2),
+                Stage("convert", _sleeping(0.05), workers=1, queue_size=2),
+            ]
+        )
+        await pipeline.run(range(10))
+        return pipeline
+
+    download, convert = _run(run()).get_metrics()
+
+    assert convert.processed == 10
+    assert convert.max_depth == 2
+    assert convert.get_mean_depth() > 1
+    assert convert.get_utilization() > 0.8
+    assert download.processed == 10
+
+
+def test_pipeline_drops_failed_songs():
+    """Test songs failing or skipped in a stage don't reach the next ones."""
+    done = []
+
+    async def download(item):
+        if item == 1:
+            raise ValueError("Download failed")
+        if item == 2:
+            return None
+        return item
+
+    async def run():
+        pipeline = Pipeline(
+            [
+                Stage("download", download, workers=2, queue_size=1),
+                Stage("tag", _sleeping(0, done), workers=1, queue_size=1),
+            ]
+        )
+        await pipeline.run(range(4))
+        return pipeline
+
+    download_metrics, _ = _run(run()).get_metrics()
+
+    assert sorted(done) == [0, 3]
+    assert download_metrics.dropped == 2
+
+
+def test_pipeline_finishes_fed_songs_on_feeder_error():
+    """Test the songs fed before the feeder failed still go through."""
+    done = []
+
+    async def run():
+        pipeline = Pipeline([Stage("tag", _sleeping(0.01, done), 1, 8)])
+
+        async def feeder():
+            for item in range(3):
+                await pipeline.stages[0].put(item)
+            raise ValueError("Listing failed")
+
+        await pipeline.run_from(feeder())
+
+    with pytest.raises(ValueError, match="Listing failed"):
+        _run(run())
+
+    assert done == [0, 1, 2]
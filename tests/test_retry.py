@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Collection of tests around retrying failed requests."""
+
+import pytest
+from requests.exceptions import HTTPError
+
+from musicDL.handle_requests import close_session, configure_retries, http_get
+from musicDL.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+from musicDL.transfer import download_media
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+# Arrange
+@pytest.fixture(autouse=True)
+def fast_retries():
+    """Fixture: That makes retries back off for milliseconds only."""
+    close_session()
+    configure_retries(retries=3, backoff_factor=0.001, breaker_threshold=5)
+    yield
+    configure_retries()
+
+
+@pytest.mark.parametrize(
+    "attempt,status_code,expected",
+    [(0, None, True), (0, 503, True), (0, 429, True), (0, 404, False), (3, 503, False)],
+)
+def test_retry_policy_should_retry(attempt, status_code, expected):
+    """Test only transient failures are retried, and only a few times."""
+    assert RetryPolicy(retries=3).should_retry(attempt, status_code) is expected
+
+
+def test_retry_policy_backoff():
+    """Test the delay grows exponentially, with jitter, up to the maximum."""
+    policy = RetryPolicy(backoff_factor=1, backoff_max=5)
+
+    assert all(0 <= policy.get_delay(0) <= 1 for _ in range(100))
+    assert all(0 <= policy.get_delay(2) <= 4 for _ in range(100))
+    assert all(0 <= policy.get_delay(10) <= 5 for _ in range(100))
+
+
+@pytest.mark.parametrize(
+    "retry_after,expected",
+    [("7", 7), ("500", 120), ("Wed, 21 Oct 2015 07:28:00 GMT", 0)],
+)
+def test_retry_policy_retry_after(retry_after, expected):
+    """Test ``Retry-After`` replaces the backoff, within bounds."""
+    response = _Response({"retry-after": retry_after})
+
+    assert RetryPolicy().get_delay(0, response) == expected
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    """Test a failing host is short-circuited until its cooldown has passed."""
+    clock = [100.0]
+    monkeypatch.setattr("musicDL.retry.time.monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+
+    breaker.record_failure("aac.saavncdn.com")
+    breaker.before_request("aac.saavncdn.com")
+    breaker.record_failure("aac.saavncdn.com")
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("aac.saavncdn.com")
+    breaker.before_request("www.jiosaavn.com")
+
+    clock[0] += 31
+    breaker.before_request("aac.saavncdn.com")
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("aac.saavncdn.com")
+
+    breaker.record_success("aac.saavncdn.com")
+    breaker.before_request("aac.saavncdn.com")
+
+
+def test_http_get_retries_server_errors(local_server):
+    """Test transient server errors are retried until the request succeeds."""
+    local_server.routes["/api.php"] = b"{}"
+    local_server.failures["/api.php"] = [503, 502]
+
+    assert http_get(local_server.url("/api.php")) == b"{}"
+    assert local_server.request_count == 3
+
+
+def test_http_get_does_not_retry_client_errors(local_server):
+    """Test a missing page fails at once."""
+    with pytest.raises(HTTPError):
+        http_get(local_server.url("/missing"))
+
+    assert local_server.request_count == 1
+
+
+def test_http_get_fails_fast_on_outage(local_server):
+    """Test requests to a host that keeps failing stop reaching it."""
+    local_server.routes["/song_96.mp4"] = b"\x00"
+    local_server.failures["/song_96.mp4"] = [503] * 100
+
+    with pytest.raises(HTTPError):
+        http_get(local_server.url("/song_96.mp4"))
+    with pytest.raises(CircuitOpenError):
+        http_get(local_server.url("/song_96.mp4"))
+
+    assert local_server.request_count == 5
+
+
+def test_download_media_resumes_after_reset(local_server, tmp_path):
+    """Test a transfer cut off midway is retried from where it stopped."""
+    media = bytes(range(256)) * 12 * 1024
+    local_server.routes["/song_96.mp4"] = media
+    local_server.failures["/song_96.mp4"] = ["truncate"]
+    output_file_path = tmp_path.joinpath("Song - Album.m4a")
+
+    download_media(local_server.url("/song_96.mp4"), output_file_path)
+
+    assert output_file_path.read_bytes() == media
+    # Every byte received before the cut is kept
+    assert local_server.range_requests == [f"bytes={len(media) // 2}-"]
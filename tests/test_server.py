@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Collection of tests around musicDL's job server."""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from musicDL.server import JobError, JobServer, JobStore, load_token, validate_job
+
+ALBUM_URL = "https://www.jiosaavn.com/album/fixture/10496527"
+
+
+def _request(server, method, path, data=None, headers=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    headers = {"Content-Type": "application/json", **(headers or {})}
+    request = urllib.request.Request(
+        server.address + path, body, headers=headers, method=method
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+# Arrange
+@pytest.fixture(params=[""])
+def job_server(request, tmp_path):
+    """Fixture: That serves jobs run by a fake download until it is released."""
+    started = threading.Event()
+    release = threading.Event()
+    stopped = threading.Event()
+    ran = []
+
+    def run_job(job):
+        ran.append(job)
+        started.set()
+        release.wait(5)
+        if stopped.is_set():
+            raise KeyboardInterrupt
+        return {"completed": 3}
+
+    def cancel_job():
+        stopped.set()
+        release.set()
+
+    store = JobStore(str(tmp_path.joinpath("jobs.json")))
+    server = JobServer(store, run_job, cancel_job, port=0, token=request.param)
+    server.started, server.release, server.ran = started, release, ran
+
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    yield server
+    server.shutdown()
+    release.set()
+    thread.join(5)
+
+
+def test_validate_job(tmp_path):
+    """Test a job's options are checked and normalized."""
+    url, options = validate_job(
+        {"url": ALBUM_URL, "quality": "HIGH", "output": str(tmp_path)}
+    )
+
+    assert url == ALBUM_URL
+    assert options == {"quality": "high", "output": str(tmp_path)}
+
+    for request in (
+        {"url": "https://example.com/album"},
+        {"url": ALBUM_URL, "quality": "best"},
+        {"url": ALBUM_URL, "output": str(tmp_path.joinpath("missing"))},
+        {"url": ALBUM_URL, "segments": 4},
+        ["not", "an", "object"],
+    ):
+        with pytest.raises(JobError):
+            validate_job(request)
+
+
+def test_job_store_persists(tmp_path):
+    """Test the jobs survive a restart, an interrupted job is queued again."""
+    path = str(tmp_path.joinpath("jobs.json"))
+    store = JobStore(path)
+    first = store.submit(ALBUM_URL, {})
+    second = store.submit(ALBUM_URL, {"quality": "low"})
+    assert store.take_next(timeout=0)["id"] == first["id"]
+
+    store = JobStore(path)
+
+    assert [job["status"] for job in store.get_all()] == ["queued", "queued"]
+    assert store.get(second["id"])["options"] == {"quality": "low"}
+    assert store.take_next(timeout=0)["id"] == first["id"]
+
+
+def test_submit_and_query(job_server):
+    """Test a submitted job is run and its status and results are queried."""
+    status, job = _request(job_server, "POST", "/jobs", {"url": ALBUM_URL})
+    assert status == 201
+    assert job["status"] == "queued"
+
+    assert job_server.started.wait(5)
+    assert _request(job_server, "GET", f"/jobs/{job['id']}")[1]["status"] == "running"
+
+    job_server.release.set()
+    for _ in range(50):
+        status, result = _request(job_server, "GET", f"/jobs/{job['id']}")
+        if result["status"] == "done":
+            break
+        threading.Event().wait(0.1)
+
+    assert result["status"] == "done"
+    assert result["completed"] == 3
+    assert _request(job_server, "GET", "/jobs")[1]["jobs"] == [result]
+    assert _request(job_server, "GET", "/jobs/missing")[0] == 404
+
+
+def test_submit_invalid(job_server):
+    """Test invalid submissions are refused with a 400."""
+    request = urllib.request.Request(
+        job_server.address + "/jobs",
+        b"{not json",
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(request, timeout=5)
+    assert e.value.code == 400
+
+    status, error = _request(job_server, "POST", "/jobs", {"url": ALBUM_URL, "x": 1})
+    assert status == 400
+    assert "x" in error["error"]
+    assert job_server.store.get_all() == []
+
+
+def test_cancel_jobs(job_server):
+    """Test cancelling a queued job and stopping the running one."""
+    running = _request(job_server, "POST", "/jobs", {"url": ALBUM_URL})[1]
+    assert job_server.started.wait(5)
+    queued = _request(job_server, "POST", "/jobs", {"url": ALBUM_URL})[1]
+
+    status, job = _request(job_server, "DELETE", f"/jobs/{queued['id']}")
+    assert status == 200
+    assert job["status"] == "cancelled"
+
+    _request(job_server, "DELETE", f"/jobs/{running['id']}")
+    for _ in range(50):
+        job = job_server.store.get(running["id"])
+        if job["status"] == "cancelled":
+            break
+        threading.Event().wait(0.1)
+
+    assert job["status"] == "cancelled"
+    assert len(job_server.ran) == 1
+    assert _request(job_server, "DELETE", f"/jobs/{queued['id']}")[0] == 409
+    assert _request(job_server, "DELETE", "/jobs/missing")[0] == 404
+
+
+def test_submit_needs_json(job_server):
+    """Test submissions a web page could send to another origin are refused."""
+    for content_type in ("text/plain", "application/x-www-form-urlencoded"):
+        status, _ = _request(
+            job_server,
+            "POST",
+            "/jobs",
+            {"url": ALBUM_URL},
+            headers={"Content-Type": content_type},
+        )
+        assert status == 415
+
+    assert job_server.store.get_all() == []
+
+
+def test_requests_need_local_host(job_server):
+    """Test requests naming another host, such as after DNS rebinding, are refused."""
+    port = job_server.address.rsplit(":", 1)[1]
+
+    for host in ("evil.example.com", f"evil.example.com:{port}", "127.0.0.2"):
+        for method, data in (("GET", None), ("POST", {"url": ALBUM_URL})):
+            status, _ = _request(job_server, method, "/jobs", data, {"Host": host})
+            assert status == 403
+
+    for host in (f"localhost:{port}", f"127.0.0.1:{port}", "LOCALHOST"):
+        assert _request(job_server, "GET", "/jobs", headers={"Host": host})[0] == 200
+    assert job_server.store.get_all() == []
+
+
+@pytest.mark.parametrize("job_server", ["secret"], indirect=True)
+def test_requests_need_token(job_server):
+    """Test a server with a token refuses the requests without it."""
+    assert _request(job_server, "GET", "/jobs")[0] == 401
+    assert _request(job_server, "POST", "/jobs", {"url": ALBUM_URL})[0] == 401
+    wrong = {"Authorization": "Bearer wrong"}
+    assert _request(job_server, "GET", "/jobs", headers=wrong)[0] == 401
+
+    authorized = {"Authorization": "Bearer secret"}
+    status, job = _request(
+        job_server, "POST", "/jobs", {"url": ALBUM_URL}, headers=authorized
+    )
+    assert status == 201
+    assert (
+        _request(job_server, "GET", f"/jobs/{job['id']}", headers=authorized)[0] == 200
+    )
+
+
+def test_load_token(tmp_path):
+    """Test a token file is created once, readable by the user only."""
+    path = tmp_path.joinpath("api", "token")
+
+    token = load_token(str(path))
+
+    assert len(token) >= 32
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert load_token(str(path)) == token
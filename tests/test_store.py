@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Collection of tests around the content-addressed song store."""
+
+import errno
+import os
+
+import pytest
+
+from musicDL import store
+from musicDL.store import ContentStore, link_file
+
+
+def test_link_file_hardlink(tmp_path):
+    """Test a hardlinked file is the same file."""
+    source = tmp_path.joinpath("source.m4a")
+    source.write_bytes(b"media")
+    target = tmp_path.joinpath("target.m4a")
+    target.write_bytes(b"old")
+
+    assert link_file(source, target) == "hardlink"
+    assert target.stat().st_ino == source.stat().st_ino
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "source.m4a",
+        "target.m4a",
+    ]
+
+
+def test_link_file_falls_back_to_copy(tmp_path, monkeypatch):
+    """Test a file is copied across filesystems, where it can't be linked."""
+
+    def cross_device(source, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(
+        store,
+        "_LINKERS",
+        {"hardlink": cross_device, "reflink": cross_device, "copy": store._copy},
+    )
+
+    source = tmp_path.joinpath("source.m4a")
+    source.write_bytes(b"media")
+    target = tmp_path.joinpath("target.m4a")
+
+    assert link_file(source, target) == "copy"
+    assert target.read_bytes() == b"media"
+    assert target.stat().st_ino != source.stat().st_ino
+
+
+def test_link_file_missing_source(tmp_path):
+    """Test a missing file isn't looked for in every way."""
+    with pytest.raises(FileNotFoundError):
+        link_file(tmp_path.joinpath("missing.m4a"), tmp_path.joinpath("target.m4a"))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_content_store(tmp_path):
+    """Test songs are stored by ID, quality and format, once."""
+    content_store = ContentStore(str(tmp_path.joinpath("store")))
+    song = tmp_path.joinpath("Song - Album.m4a")
+    song.write_bytes(b"media")
+
+    stored_path = content_store.add("abc", "HD", song)
+
+    assert stored_path == tmp_path.joinpath("store", "hd", "abc.m4a")
+    assert stored_path.stat().st_ino == song.stat().st_ino
+    assert content_store.add("abc", "hd", tmp_path.joinpath("other.m4a")) == stored_path
+
+    target = tmp_path.joinpath("playlist", "Song - Album.m4a")
+    target.parent.mkdir()
+    assert content_store.materialise(stored_path, target) == "hardlink"
+    assert os.path.samefile(target, song)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Collection of tests around the album and playlist sync."""
+
+from musicDL import main
+from musicDL.library import LibraryIndex
+from musicDL.SongObj import SongObj
+from musicDL.sync import PlaylistSync
+
+
+def _song_objs(song_factory, song_ids):
+    return [
+        SongObj(
+            song_factory(song_id, f"https://aac.saavncdn.com/{song_id}.mp4"), 1, 1, "hd"
+        )
+        for song_id in song_ids
+    ]
+
+
+def test_sync_only_yields_added_songs(tmp_path, song_factory):
+    """Test a sync yields the new tracks and reports those that are gone."""
+    library = LibraryIndex(str(tmp_path.joinpath("library.sqlite3")))
+    assert library.get_synced_tracks("playlist/1") is None
+
+    sync = PlaylistSync(library)
+    first = list(sync.filter("playlist/1", _song_objs(song_factory, "abc")))
+    sync.save()
+
+    assert [song.get_song_id_saavn() for song in first] == ["a", "b", "c"]
+    assert library.get_synced_tracks("playlist/1") == [
+        ("a", "Song a"),
+        ("b", "Song b"),
+        ("c", "Song c"),
+    ]
+
+    sync = PlaylistSync(library)
+    second = list(sync.filter("playlist/1", _song_objs(song_factory, "bcde")))
+    sync.save(failed=["e"])
+
+    assert [song.get_song_id_saavn() for song in second] == ["d", "e"]
+    assert sync.added == 2
+    assert sync.removed == ["Song a"]
+
+    # The failed song is added again by the next sync
+    sync = PlaylistSync(library)
+    third = list(sync.filter("playlist/1", _song_objs(song_factory, "bcde")))
+
+    assert [song.get_song_id_saavn() for song in third] == ["e"]
+    assert sync.removed == []
+    library.close()
+
+
+def test_sync_empty_list(tmp_path):
+    """Test a list synced while empty is told apart from one never synced."""
+    library = LibraryIndex(str(tmp_path.joinpath("library.sqlite3")))
+    sync = PlaylistSync(library)
+    assert list(sync.filter("album/1", [])) == []
+    sync.save()
+
+    assert library.get_synced_tracks("album/1") == []
+    assert library.get_synced_tracks("album/2") is None
+    library.close()
+
+
+def test_sync_revalidates_listing(tmp_path, mocker):
+    """Test the synced album and playlist listings skip the cache's freshness."""
+    get_page = mocker.patch("musicDL.main.get_json_data_from_website", return_value={})
+    mocker.patch("musicDL.main.extract_saavn_api_url", return_value="api")
+    mocker.patch("musicDL.main.extract_saavn_list_id", return_value="playlist/1")
+    iter_api = mocker.patch("musicDL.main.iter_json_data_from_api")
+    mocker.patch("musicDL.main.SongObj.from_raw_stream", return_value=iter(()))
+    requests = [("https://www.jiosaavn.com/featured/a", "playlist"), ("s", "song")]
+
+    sync = PlaylistSync(LibraryIndex(str(tmp_path.joinpath("library.db"))))
+    list(main._iter_songs(requests, sync))
+    list(main._iter_songs(requests))
+
+    assert [call.kwargs["revalidate"] for call in get_page.call_args_list] == [
+        True,
+        False,
+        False,
+        False,
+    ]
+    assert [call.kwargs["revalidate"] for call in iter_api.call_args_list] == [
+        True,
+        False,
+        False,
+        False,
+    ]
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""Collection of tests around transferring media files."""
+
+import hashlib
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+from requests.exceptions import HTTPError
+
+from musicDL import transfer
+from musicDL.handle_requests import configure_retries
+from musicDL.transfer import download_media, get_part_path, stream_media
+
+MEDIA = bytes(range(256)) * 400
+ETAG = f'"{hashlib.md5(MEDIA).hexdigest()}"'
+
+
+# Arrange
+@pytest.fixture
+def media_url(local_server):
+    """Fixture: That serves a 100 KiB media file and returns its URL."""
+    local_server.routes["/song_320.mp4"] = MEDIA
+    return local_server.url("/song_320.mp4")
+
+
+@pytest.fixture
+def output_file_path(tmp_path):
+    """Fixture: That returns the path of the downloaded song."""
+    return tmp_path.joinpath("Song - Album.m4a")
+
+
+def _write_part(output_file_path, data, state):
+    part_path = get_part_path(output_file_path)
+    part_path.write_bytes(data)
+    part_path.with_name(part_path.name + ".json").write_text(json.dumps(state))
+    return part_path
+
+
+def test_download_media_into_part_file(media_url, output_file_path, monkeypatch):
+    """Test an interrupted download leaves no file that looks complete."""
+
+    reads = []
+
+    def interrupted(self, buffer):
+        if reads:
+            raise ConnectionError("Connection reset by peer")
+        reads.append(len(buffer))
+        buffer[:] = MEDIA[: len(buffer)]
+        return len(buffer)
+
+    monkeypatch.setattr("urllib3.HTTPResponse.readinto", interrupted)
+
+    with pytest.raises(ConnectionError):
+        download_media(media_url, output_file_path)
+
+    assert not output_file_path.exists()
+    assert get_part_path(output_file_path).is_file()
+
+
+def test_download_media_resume(media_url, output_file_path, local_server):
+    """Test an interrupted download only transfers the missing bytes."""
+    part_path = _write_part(
+        output_file_path, MEDIA[:30000], {"url": media_url, "validator": ETAG}
+    )
+
+    download_media(media_url, output_file_path)
+
+    assert output_file_path.read_bytes() == MEDIA
+    assert local_server.range_requests == ["bytes=30000-"]
+    assert not part_path.exists()
+    assert not part_path.with_name(part_path.name + ".json").exists()
+
+
+def test_download_media_preallocated_resume(media_url, output_file_path, monkeypatch):
+    """Test a preallocated download is resumed after the bytes really written."""
+
+    read_into = transfer._read_into
+    reads = []
+
+    def interrupted(response, view):
+        if reads:
+            raise ConnectionError("Connection reset by peer")
+        reads.append(view)
+        return read_into(response, view[:20000])
+
+    with monkeypatch.context() as patch:
+        patch.setattr(transfer, "_read_into", interrupted)
+        with pytest.raises(ConnectionError):
+            download_media(media_url, output_file_path, preallocate=True)
+
+    part_path = get_part_path(output_file_path)
+    state = json.loads(part_path.with_name(part_path.name + ".json").read_text())
+    assert state["done"] == [[0, 19999]]
+    if hasattr(os, "posix_fallocate"):
+        assert part_path.stat().st_size == len(MEDIA)
+
+    download_media(media_url, output_file_path, preallocate=True)
+
+    assert output_file_path.read_bytes() == MEDIA
+
+
+def test_download_media_preallocated_resume_after_kill(local_server, output_file_path):
+    """Test a preallocated download killed midway resumes from its checkpoint."""
+    media = os.urandom(2 * 1024 * 1024)
+    local_server.routes["/big_320.mp4"] = media
+    local_server.delay = 4.0
+    url = local_server.url("/big_320.mp4")
+
+    script = (
+        "import sys; from pathlib import Path; from musicDL import transfer;"
+        " transfer.CHECKPOINT_SIZE = 64 * 1024;"
+        " transfer.download_media(sys.argv[1], Path(sys.argv[2]), preallocate=True)"
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", script, url, str(output_file_path)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    # Killed once some of the file is recorded as written
+    part_path = get_part_path(output_file_path)
+    state_path = part_path.with_name(part_path.name + ".json")
+    deadline = time.monotonic() + 10
+    done = []
+    while not done and time.monotonic() < deadline:
+        time.sleep(0.05)
+        try:
+            done = json.loads(state_path.read_text()).get("done", [])
+        except (OSError, ValueError):
+            pass
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+
+    assert done and done[0][0] == 0
+    assert not output_file_path.exists()
+
+    local_server.delay = 0.0
+    download_media(url, output_file_path, preallocate=True)
+
+    assert output_file_path.read_bytes() == media
+    offset = int(local_server.range_requests[-1][len("bytes=") : -1])
+    assert offset > 0
+
+
+def test_download_media_reuses_buffers(media_url, output_file_path, local_server):
+    """Test chunks are read into a few reused buffers, written behind the transfer."""
+    allocated = transfer._buffers.allocated
+    for name in ("a", "b", "c"):
+        download_media(media_url, output_file_path.with_name(name), write_behind=2)
+        assert output_file_path.with_name(name).read_bytes() == MEDIA
+
+    # The transfer, the writer and the queued chunks hold a buffer each
+    assert transfer._buffers.allocated - allocated <= 4
+
+
+def test_write_behind_error(tmp_path):
+    """Test a failed write is raised by the transfer."""
+    with tmp_path.joinpath("song.m4a").open("wb") as output_file:
+        output_file.close()
+        writer = transfer._WriteBehind(output_file, 2)
+        writer.write(b"chunk")
+        with pytest.raises(ValueError):
+            writer.close()
+
+
+def test_chunk_sizer():
+    """Test the chunk size follows the throughput, within bounds."""
+    sizer = transfer._ChunkSizer()
+    for _ in range(20):
+        sizer.update(sizer.size, sizer.size / (64 * 1024 * 1024))
+    assert sizer.size == transfer.MAX_CHUNK_SIZE
+
+    for _ in range(20):
+        sizer.update(sizer.size, sizer.size / (200 * 1024))
+    assert sizer.size == transfer.MIN_CHUNK_SIZE
+
+    # Short reads at the end of a body are not a measure
+    sizer.update(1, 10.0)
+    assert sizer.size == transfer.MIN_CHUNK_SIZE
+
+
+def test_download_media_resume_changed(media_url, output_file_path, local_server):
+    """Test a partial download is discarded if the file changed on the server."""
+    _write_part(
+        output_file_path, b"\xff" * 30000, {"url": media_url, "validator": '"old"'}
+    )
+
+    download_media(media_url, output_file_path)
+
+    assert output_file_path.read_bytes() == MEDIA
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_download_media_retry_budget(
+    media_url, output_file_path, local_server, mocker, segments
+):
+    """Test a failing transfer is tried as often as the retry policy says, once."""
+    configure_retries(retries=2, backoff_factor=0, breaker_threshold=100)
+    local_server.failures["/song_320.mp4"] = [503] * 10
+    try:
+        with pytest.raises(HTTPError):
+            download_media(media_url, output_file_path, segments=segments)
+        assert local_server.request_count == 3
+
+        # Not even connecting
+        local_server.stop()
+        get = mocker.spy(requests.Session, "get")
+        with pytest.raises(requests.ConnectionError):
+            download_media(media_url, output_file_path, segments=segments)
+        assert get.call_count == 3
+    finally:
+        configure_retries()
+
+
+@pytest.mark.parametrize("extra", [b"", b"\xff" * 100], ids=["complete", "bigger"])
+def test_download_media_resume_nothing_left(
+    media_url, output_file_path, local_server, extra
+):
+    """Test a partial download as big as the media, or bigger, isn't stuck."""
+    part_path = _write_part(
+        output_file_path, MEDIA + extra, {"url": media_url, "validator": ETAG}
+    )
+
+    download_media(media_url, output_file_path)
+
+    assert output_file_path.read_bytes() == MEDIA
+    assert local_server.range_requests == [f"bytes={len(MEDIA + extra)}-"]
+    # Moved into place as it was, or downloaded again
+    assert local_server.request_count == (1 if not extra else 2)
+    assert not part_path.exists()
+
+
+def test_download_media_preallocated_crash(
+    media_url, output_file_path, local_server, monkeypatch
+):
+    """Test a crash right after preallocating isn't taken for a written file."""
+    preallocate = transfer._preallocate
+
+    def crash(output_file, offset, total):
+        preallocate(output_file, offset, total)
+        output_file.truncate(total)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(transfer, "_preallocate", crash)
+    with pytest.raises(KeyboardInterrupt):
+        download_media(media_url, output_file_path, preallocate=True)
+    assert get_part_path(output_file_path).stat().st_size == len(MEDIA)
+
+    monkeypatch.setattr(transfer, "_preallocate", preallocate)
+    download_media(media_url, output_file_path, preallocate=True)
+
+    assert output_file_path.read_bytes() == MEDIA
+    assert local_server.range_requests == []
+
+
+@pytest.mark.parametrize("segments,preallocate", [(1, False), (1, True), (4, True)])
+def test_download_media_short_body(
+    media_url, output_file_path, local_server, monkeypatch, segments, preallocate
+):
+    """Test a body ending early without an error is resumed, not taken as complete."""
+    read_into = transfer._read_into
+    cut = []
+
+    def short(response, view):
+        # The first body ends silently after 10000 bytes, as with urllib3 1.x
+        if not cut:
+            cut.append(response)
+        if response is not cut[0]:
+            return read_into(response, view)
+        left = 10000 - response.raw.tell()
+        return read_into(response, view[:left]) if left > 0 else 0
+
+    monkeypatch.setattr(transfer, "_read_into", short)
+
+    download_media(
+        media_url,
+        output_file_path,
+        segments=segments,
+        segment_min_size=len(MEDIA),
+        preallocate=preallocate,
+    )
+
+    assert output_file_path.read_bytes() == MEDIA
+    assert local_server.range_requests[-1] == (
+        "bytes=10000-" if segments == 1 else f"bytes=10000-{len(MEDIA) - 1}"
+    )
+
+
+def test_download_media_resume_segmented(media_url, output_file_path, local_server):
+    """Test a segmented download only fetches the segments not yet written."""
+    data = MEDIA[:25600] + b"\x00" * 25600 + MEDIA[51200:76800] + b"\x00" * 25600
+    state = {
+        "url": media_url,
+        "validator": ETAG,
+        "total": len(MEDIA),
+        "done": [[0, 25599], [51200, 76799]],
+    }
+    _write_part(output_file_path, data, state)
+
+    download_media(media_url, output_file_path, segments=4, segment_min_size=1024)
+
+    assert output_file_path.read_bytes() == MEDIA
+    assert sorted(local_server.range_requests) == [
+        "bytes=0-0",
+        "bytes=25600-38399",
+        "bytes=38400-51199",
+        "bytes=76800-89599",
+        "bytes=89600-102399",
+    ]
+
+
+def test_stream_media(media_url, output_file_path):
+    """Test a media is written into the stream opened with its first bytes."""
+    stream = io.BytesIO()
+    heads = []
+
+    def open_stream(head):
+        heads.append(head)
+        return stream
+
+    assert stream_media(media_url, open_stream, output_file_path)
+
+    assert stream.getvalue() == MEDIA
+    assert MEDIA.startswith(heads[0])
+    assert not output_file_path.exists()
+
+
+def test_stream_media_saved_instead(media_url, output_file_path):
+    """Test a media that can't be streamed is saved to the file."""
+    assert not stream_media(media_url, lambda head: None, output_file_path)
+
+    assert output_file_path.read_bytes() == MEDIA
+    assert not get_part_path(output_file_path).exists()
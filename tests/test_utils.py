@@ -1,3 +1,5 @@
+import pytest
+
 from musicDL import utils
 
 
@@ -34,3 +36,55 @@ def test_merge_configs():
     }
 
     assert utils.merge_dicts(DEFAULT_CONFIG, user_config) == expected_config
+
+
+@pytest.mark.parametrize(
+    "size,expected",
+    [(0, 0), ("", 0), (None, 0), (2048, 2048), ("512K", 524288), ("1.5m", 1572864)],
+)
+def test_parse_size(size, expected):
+    """Test sizes with and without a unit suffix are parsed into bytes."""
+    assert utils.parse_size(size) == expected
+
+
+@pytest.mark.parametrize(
+    "url,expected",
+    [
+        ("https://aac.saavncdn.com/123/abc_320.mp4", 320000),
+        ("https://aac.saavncdn.com/123/abc_160.mp4?x=1", 160000),
+        ("http://h.saavncdn.com/123/abc.mp3", 0),
+    ],
+)
+def test_get_bitrate_from_url(url, expected):
+    """Test the bitrate is read from the suffix of Saavn media URLs."""
+    assert utils.get_bitrate_from_url(url) == expected
+
+
+@pytest.mark.parametrize(
+    "url,output_format,expected",
+    [
+        (
+            "https://aac.saavncdn.com/123/abc_320.mp4",
+            "mp3",
+            ["http://h.saavncdn.com/123/abc_320.mp3"],
+        ),
+        (
+            "https://aac.saavncdn.com/123/abc_96.mp4",
+            "mp3",
+            [
+                "http://h.saavncdn.com/123/abc_96.mp3",
+                "http://h.saavncdn.com/123/abc.mp3",
+            ],
+        ),
+        (
+            "http://h.saavncdn.com/123/abc.mp3",
+            "m4a",
+            ["https://aac.saavncdn.com/123/abc_160.mp4"],
+        ),
+        ("https://aac.saavncdn.com/123/abc_320.mp4", "m4a", []),
+        ("https://aac.saavncdn.com/123/abc_320.mp4", "aac", []),
+    ],
+)
+def test_get_media_url_variants(url, output_format, expected):
+    """Test copies in the output format are offered, of no lower bitrate."""
+    assert utils.get_media_url_variants(url, output_format) == expected